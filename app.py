@@ -1,19 +1,22 @@
-from src import StationsGetter, StationTimetableGetter, config
-from src.TrainPageGetter import get_train, get_real_train_data
-from flask import Flask, jsonify, request
+from src import StationsGetter, StationRegistry, StationSearch, StationSnapshot, StationTimetableGetter, StationLiveTimetableGetter, StationSlugs, PlannedTimetable, BoardPrecompute, TimetableDiff, GtfsExport, JourneyPlanner, DelayProjection, BoardIndex, LiveUpdates, TrainSnapshots, PayloadFormats
+from src.TrainPageGetter import get_train, get_real_train_data, peek_train
+from src.PersistentCache import normalize_date
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
 from flask_compress import Compress
 from datetime import datetime, timedelta
-from dateutil import tz, parser
+import gzip
 import logging
 import json
 import sqlite3
 import os
 import random
 import threading
+import time
 import re
 import requests
 import requests.exceptions as req_exc
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 app = Flask(__name__)
 CORS(app)
@@ -23,6 +26,22 @@ Compress(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upstream poll intervals for the SSE streams, aligned with the scraper caches
+TRAIN_STREAM_INTERVAL = 30
+STATION_STREAM_INTERVAL = 45
+
+# /api/boards fan-out: concurrent scrapes, stations per request and the
+# default / maximum seconds to wait for one station's board
+BOARD_FANOUT_WORKERS = int(os.environ.get('CFR_BOARD_FANOUT_WORKERS', '6'))
+BOARD_FANOUT_MAX_STATIONS = 12
+BOARD_FANOUT_TIMEOUT = 8
+BOARD_FANOUT_MAX_TIMEOUT = 20
+
+board_fanout_pool = ThreadPoolExecutor(max_workers=BOARD_FANOUT_WORKERS, thread_name_prefix='board-fanout')
+
+# Drop cached boards and train pages made stale by a timetable update
+PlannedTimetable.on_change(TimetableDiff.on_timetable_change)
+
 # Initialize passenger reports database
 def init_passenger_db():
     """Initialize SQLite database for passenger reports and interactions"""
@@ -79,10 +98,6 @@ def init_passenger_db():
 # Initialize the database
 init_passenger_db()
 
-# Generate the station lookup table with error handling
-config.global_station_list = {}
-stations: list[dict] = []
-
 def get_demo_stations():
     """Comprehensive station list for Romanian Railway Network"""
     return [
@@ -243,30 +258,75 @@ def get_demo_stations():
         {"name": "Jibou", "station_id": "10150"}
     ]
 
-# Initialize with demo stations immediately to prevent blocking
-stations = get_demo_stations()
-for station in stations:
-    config.global_station_list[station["name"]] = station["station_id"]
-logger.info(f"Initially loaded {len(stations)} demo stations")
+# Background refresh of the station list from CFR: '1' always, '0' never,
+# 'auto' only when no local snapshot was found
+STATION_REFRESH = os.environ.get('CFR_STATION_REFRESH', 'auto')
+
+# Boot from the local station snapshot, else the imported timetable's
+# stations; the demo list is the last resort
+snapshot_stations, snapshot_meta = StationSnapshot.load_snapshot()
+timetable_at_boot = None if snapshot_stations else PlannedTimetable.current()
+if snapshot_stations:
+    registry = StationRegistry.install(snapshot_stations, source='snapshot', snapshot_version=snapshot_meta['version'])
+    logger.info(f"Loaded {len(registry)} stations from snapshot {snapshot_meta['version']} ({snapshot_meta['source']})")
+elif timetable_at_boot is not None and timetable_at_boot.index.station_count:
+    index = timetable_at_boot.index
+    registry = StationRegistry.install(
+        [{"name": name, "station_id": str(code)} for code, name in zip(index.station_codes, index.station_names)],
+        source='timetable', snapshot_version=timetable_at_boot.version)
+    logger.info(f"No station snapshot found, loaded {len(registry)} stations from the timetable store")
+else:
+    registry = StationRegistry.install(get_demo_stations(), source='demo')
+    logger.info(f"No station snapshot found, initially loaded {len(registry)} demo stations")
+StationSearch.index_for(registry)
+
+
+def refresh_stations_from_cfr():
+    """Diff CFR's station list against the loaded one and swap in changes.
+
+    A demo list is replaced outright.  A snapshot only takes additions and
+    renames, because CFR's list is partial and must not shrink it.  The
+    result is written back as the new snapshot.  Returns the registry in use
+    afterwards; raises when CFR's list cannot be fetched.
+    """
+    real_stations = StationsGetter.get_real_stations()
+    if not real_stations or len(real_stations) <= 20:
+        raise Exception("CFR returned too few stations")
+
+    current = StationRegistry.current()
+    if current.source == 'demo':
+        merged = real_stations
+    else:
+        changes = StationSnapshot.diff(current.stations, real_stations)
+        if not changes["added"] and not changes["renamed"]:
+            logger.info(f"Station list unchanged ({len(changes['removed'])} snapshot-only stations kept)")
+            return current
+        fresh = {str(s["station_id"]): s for s in real_stations}
+        kept = [fresh.get(str(s["station_id"]), s) for s in current.stations]
+        merged = kept + [fresh[station_id] for station_id in changes["added"]]
+        logger.info(f"{len(changes['added'])} stations added, {len(changes['renamed'])} renamed")
+
+    # Built here, then swapped in for all readers at once
+    registry = StationRegistry.install(merged, source='cfr')
+    StationSearch.index_for(registry)
+    try:
+        StationSnapshot.write_snapshot(merged, source='cfr')
+    except OSError as e:
+        logger.error(f"Could not write station snapshot: {e}")
+    return registry
+
 
 def background_load_stations():
-    global stations
     try:
         logger.info("Background: Fetching real stations from external API...")
-        real_stations = StationsGetter.get_stations()
-        if real_stations and len(real_stations) > 20:
-            stations = real_stations
-            # Rebuild lookup table
-            new_lookup = {}
-            for s in stations:
-                new_lookup[s["name"]] = s["station_id"]
-            config.global_station_list = new_lookup
-            logger.info(f"Background: Successfully updated with {len(stations)} real stations")
+        registry = refresh_stations_from_cfr()
+        logger.info(f"Background: {len(registry)} stations loaded")
     except Exception as e:
         logger.error(f"Background station fetch failed: {e}")
 
 # Start background fetch to avoid blocking the main thread/worker
-threading.Thread(target=background_load_stations, daemon=True).start()
+if STATION_REFRESH == '1' or (STATION_REFRESH == 'auto' and registry.source == 'demo'):
+    threading.Thread(target=background_load_stations, daemon=True).start()
 
 
 @app.route('/api')
@@ -275,7 +335,10 @@ def api_status():
         "status": "CFR Train Tracker API - Running",
         "version": "2.0",
         "mode": "Enhanced Demo Mode with Real CFR Integration",
-        "stations_loaded": len(stations),
+        "stations_loaded": len(StationRegistry.current()),
+        "live_streams": LiveUpdates.get_stats(),
+        "station_slugs": StationSlugs.get_stats(),
+        "timetable_cache": StationTimetableGetter.get_cache_stats(),
         "timestamp": datetime.now().isoformat(),
         "features": {
             "real_cfr_connectivity": True,
@@ -286,6 +349,18 @@ def api_status():
     })
 
 
+@app.route('/api/metrics')
+def api_metrics():
+    """Cache, prefetch and streaming counters for this worker process."""
+    return jsonify({
+        "timetable_cache": StationTimetableGetter.get_cache_stats(),
+        "board_prefetcher": StationTimetableGetter.get_prefetch_stats(),
+        "station_slugs": StationSlugs.get_stats(),
+        "live_streams": LiveUpdates.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
 @app.route('/api/cfr-status')
 def cfr_connectivity_status():
     """Check real-time connectivity to CFR Călători website"""
@@ -330,7 +405,7 @@ def data_sources_info():
     return jsonify({
         "stations": {
             "source": "Comprehensive Romanian Railway Network Database",
-            "count": len(stations),
+            "count": len(StationRegistry.current()),
             "coverage": "143 stations covering all major cities, regional centers, mountain destinations, and border crossings",
             "real_time_checks": True
         },
@@ -348,6 +423,96 @@ def data_sources_info():
     })
 
 
+def projection_args():
+    """Read the ``?fields=`` / ``?exclude=`` projection from the current request."""
+    return (PayloadFormats.parse_field_list(request.args.get('fields')),
+            PayloadFormats.parse_field_list(request.args.get('exclude')))
+
+
+def shape_timetable(timetable):
+    """Apply the request's field projection (and ``?format=columnar``) to timetable rows before encoding."""
+    fields, exclude = projection_args()
+    if request.args.get('format') == 'columnar':
+        return PayloadFormats.encode_board_columnar(timetable, fields, exclude)
+    return PayloadFormats.project_rows(timetable, fields, exclude)
+
+
+def train_cache_key(train_id, service_date=None):
+    """Normalise a train ID so 'IR 1621' and 'ir1621' share snapshots and pollers.
+
+    Runs on other days than today get their own key so their versions never
+    mix with the live ones.
+    """
+    key = train_id.upper().replace(' ', '')
+    if service_date:
+        service_date = normalize_date(service_date)
+        if service_date != normalize_date():
+            key = f"{key}@{service_date}"
+    return key
+
+
+def fetch_live_train(train_id, service_date=None):
+    """Scraped train data as ``/api/train/<id>`` and its stream send it, or None when not found.
+
+    :func:`get_train` has already replaced carried-forward delays with
+    projected ones.
+    """
+    train_data = get_train(train_id, service_date)
+    if not train_data or 'stations_data' not in train_data:
+        return None
+    return train_data
+
+
+def observe_cached_train(planned, train, service_date):
+    """Last delay shown for a planned train in an already cached scrape of its page, or None."""
+    number, category, _ = planned.train_label(train)
+    for train_id in (number, f"{category}{number}"):
+        cached = peek_train(train_id, service_date)
+        if cached and cached.get('stations_data'):
+            return DelayProjection.observe(planned, train, cached['stations_data'])
+    return None
+
+
+def build_train_response(train_id, train_data, service_date=None):
+    """Shape scraped train data into the ``/api/train/<id>`` JSON payload."""
+    source = train_data.get('data_source', 'unknown')
+    stations_list = train_data['stations_data']
+    branches = train_data.get('branches', [{'label': 'Rută', 'stations_data': stations_list}])
+
+    response = {
+        "train_number": train_id,
+        "stations": stations_list,
+        "stops": stations_list,
+        "branches": branches,
+        "operator": train_data.get('operator', 'CFR Călători'),
+        "category": train_data.get('category', ''),
+        "alerts": train_data.get('alerts', []),
+        "data_source": {
+            "type": source,
+            "timestamp": datetime.now().isoformat()
+        }
+    }
+
+    # include CFR-specific extras if present
+    if 'services' in train_data:
+        response['services'] = train_data['services']
+    if 'composition_html' in train_data:
+        response['composition_html'] = train_data['composition_html']
+    if 'coach_order' in train_data:
+        response['coach_order'] = train_data['coach_order']
+    if 'coach_classes' in train_data:
+        response['coach_classes'] = train_data['coach_classes']
+    if 'station_options' in train_data:
+        response['station_options'] = train_data['station_options']
+    if 'all_coaches' in train_data:
+        response['all_coaches'] = train_data['all_coaches']
+
+    # Version cursor for delta polling (?since=<version>)
+    response['version'] = TrainSnapshots.record(train_cache_key(train_id, service_date), response)
+
+    return response
+
+
 @app.route('/api/train/<string:train_id>')
 @app.route('/train/<string:train_id>')
 def get_train_enhanced(train_id):
@@ -356,48 +521,49 @@ def get_train_enhanced(train_id):
     The implementation now calls :func:`get_train` which prefers the CFR
     Călători ticketing site and falls back to Infofer.  Additional keys such
     as ``services`` and ``composition_html`` are preserved when available.
+
+    ``?fields=``/``?exclude=`` select top-level keys and ``?compact=1`` sends
+    each stop once, with branches referring to stops by index.
+
+    Every payload carries a ``version``.  Passing ``?since=<version>`` returns
+    only the stop fields changed since then (``status: delta``), or
+    ``status: unchanged``, or the full payload with ``status: resync`` when
+    that version is no longer known.
     """
     try:
         search_date = request.args.get('date')
         filter_stops = request.args.get('filter_stops', 'false').lower() == 'true'
+        since = request.args.get('since', type=int)
 
-        logger.info(f"Fetching real-time train data for {train_id}")
-        train_data = get_train(train_id)
-        if train_data and 'stations_data' in train_data:
-            source = train_data.get('data_source', 'unknown')
-            logger.info(f"✅ Got data from {source} for train {train_id}")
-            stations_list = train_data['stations_data']
-            branches = train_data.get('branches', [{'label': 'Rută', 'stations_data': stations_list}])
-
-            response = {
-                "train_number": train_id,
-                "stations": stations_list,
-                "stops": stations_list,
-                "branches": branches,
-                "operator": train_data.get('operator', 'CFR Călători'),
-                "category": train_data.get('category', ''),
-                "alerts": train_data.get('alerts', []),
-                "data_source": {
-                    "type": source,
-                    "timestamp": datetime.now().isoformat()
-                }
-            }
+        if runs_on_date(train_id, search_date) is False:
+            return jsonify({
+                "error": f"Train {train_id} does not run on {normalize_date(search_date)}",
+                "error_code": "not_running",
+                "message": "The train is in the timetable but does not run on this date.",
+                "data_source": "planned_timetable"
+            }), 404
 
-            # include CFR-specific extras if present
-            if 'services' in train_data:
-                response['services'] = train_data['services']
-            if 'composition_html' in train_data:
-                response['composition_html'] = train_data['composition_html']
-            if 'coach_order' in train_data:
-                response['coach_order'] = train_data['coach_order']
-            if 'coach_classes' in train_data:
-                response['coach_classes'] = train_data['coach_classes']
-            if 'station_options' in train_data:
-                response['station_options'] = train_data['station_options']
-            if 'all_coaches' in train_data:
-                response['all_coaches'] = train_data['all_coaches']
-
-            return jsonify(response)
+        # Other days than today: a cached scrape, else the planned route
+        train_data = None
+        planned = planned_for(search_date)
+        if planned:
+            train_data = peek_train(train_id, search_date) or planned.train(train_id, normalize_date(search_date))
+        if train_data is None:
+            logger.info(f"Fetching real-time train data for {train_id}")
+            train_data = fetch_live_train(train_id, search_date)
+        if train_data and 'stations_data' in train_data:
+            logger.info(f"✅ Got data from {train_data.get('data_source', 'unknown')} for train {train_id}")
+            response = build_train_response(train_id, train_data, search_date)
+            if since is not None:
+                response = TrainSnapshots.build_delta(
+                    train_cache_key(train_id, search_date), since, response, response['version'])
+            # Deltas only carry changed stops; there is nothing to de-duplicate
+            if (request.args.get('compact', '0').lower() in ('1', 'true')
+                    and response.get('status') not in ('delta', 'unchanged')):
+                response = PayloadFormats.compact_train_payload(response)
+            fields, exclude = projection_args()
+            return jsonify(PayloadFormats.project(response, fields, exclude,
+                                                  always=PayloadFormats.TRAIN_ALWAYS_KEYS))
         else:
             return jsonify({
                 "error": f"Train {train_id} not found",
@@ -432,6 +598,27 @@ def get_train_enhanced(train_id):
         }), 500
 
 
+@app.route('/api/train/<string:train_id>/stream')
+def stream_train_updates(train_id):
+    """Server-Sent Events stream of live data for one train.
+
+    All viewers of the same train share one upstream poller; an ``update``
+    event is pushed only when the parsed stops change, and idle connections
+    receive heartbeat comments.
+    """
+    def fetch():
+        train_data = fetch_live_train(train_id)
+        if train_data is None:
+            raise Exception(f"Train {train_id} not found")
+        return build_train_response(train_id, train_data)
+
+    key = f"train:{train_cache_key(train_id)}"
+    stream = LiveUpdates.event_stream(key, fetch, TRAIN_STREAM_INTERVAL,
+                                      extract=lambda payload: payload['branches'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 def get_data_validity_info():
     """Return basic information about when data was last refreshed."""
     return {
@@ -454,6 +641,46 @@ def get_data_validity():
             "details": str(e)
         }), 500
 
+# Known Romanian rail categories, longest first to avoid partial matches
+TRAIN_CATEGORY_PREFIXES = ["IRN", "R-E", "IC", "IR", "RE", "EN", "EC", "R", "P", "D", "A"]
+
+
+def parse_train_query(query):
+    """Split an upper-cased train search query into ``(category_prefix, number)``.
+
+    Either part may be None, e.g. ``("IC", "534")`` for "IC534" and
+    ``(None, "534")`` for a bare number.
+    """
+    detected_prefix = None
+    numeric_part = None
+
+    # 1. "PREFIX NUMBER" with space  (e.g. "IC 534")
+    if ' ' in query:
+        parts = query.split(' ', 1)
+        if parts[0] in TRAIN_CATEGORY_PREFIXES and parts[1].isdigit():
+            detected_prefix = parts[0]
+            numeric_part = parts[1]
+
+    # 2. "PREFIXNUMBER" without space  (e.g. "IC534")
+    if detected_prefix is None:
+        m = re.match(r'^([A-Z][A-Z-]*)(\d+)$', query)
+        if m and m.group(1) in TRAIN_CATEGORY_PREFIXES:
+            detected_prefix = m.group(1)
+            numeric_part = m.group(2)
+
+    # 3. Pure number  (e.g. "534")
+    if detected_prefix is None and query.isdigit():
+        numeric_part = query
+
+    # 4. Last-resort: strip non-digits
+    if numeric_part is None:
+        stripped = re.sub(r'\D', '', query)
+        if stripped:
+            numeric_part = stripped
+
+    return detected_prefix, numeric_part
+
+
 @app.route('/api/search/trains')
 def search_trains_with_date():
     """Search for trains by number.
@@ -463,47 +690,37 @@ def search_trains_with_date():
     - If the query is a bare number (e.g. "534"), actually fetch the train from
       CFR/Infofer to discover its real category, then return that single real result.
       If the train is not found the result list is empty — no phantom suggestions.
+    - Trains in the imported timetable are answered from it, for ``?date=``
+      (default today); a train that does not run that day gives no results.
     """
     try:
         query = request.args.get('q', '').upper().strip()
+        search_date = request.args.get('date')
         if not query:
             return jsonify({"results": []})
 
-        # Known Romanian rail categories, longest first to avoid partial matches
-        KNOWN_PREFIXES = ["IRN", "R-E", "IC", "IR", "RE", "EN", "EC", "R", "P", "D", "A"]
-
-        detected_prefix = None
-        numeric_part = None
-
-        # 1. "PREFIX NUMBER" with space  (e.g. "IC 534")
-        if ' ' in query:
-            parts = query.split(' ', 1)
-            if parts[0] in KNOWN_PREFIXES and parts[1].isdigit():
-                detected_prefix = parts[0]
-                numeric_part = parts[1]
-
-        # 2. "PREFIXNUMBER" without space  (e.g. "IC534")
-        if detected_prefix is None:
-            m = re.match(r'^([A-Z][A-Z-]*)(\d+)$', query)
-            if m and m.group(1) in KNOWN_PREFIXES:
-                detected_prefix = m.group(1)
-                numeric_part = m.group(2)
-
-        # 3. Pure number  (e.g. "534")
-        if detected_prefix is None and query.isdigit():
-            numeric_part = query
-
-        # 4. Last-resort: strip non-digits
-        if numeric_part is None:
-            stripped = re.sub(r'\D', '', query)
-            if stripped:
-                numeric_part = stripped
+        detected_prefix, numeric_part = parse_train_query(query)
 
         if not numeric_part:
             return jsonify({"query": query, "results": [], "count": 0,
                             "data_source": "normalized_search"})
 
-        if detected_prefix:
+        planned = PlannedTimetable.current()
+        runs = planned.train_runs(numeric_part, normalize_date(search_date)) if planned else None
+        if runs is not None:
+            results = []
+            train_data = planned.train(numeric_part, normalize_date(search_date)) if runs else None
+            if train_data:
+                canonical = f"{train_data['category']} {numeric_part}"
+                stops = train_data['stations_data']
+                results = [{
+                    "train_number": canonical,
+                    "route": f"{stops[0]['station_name']} → {stops[-1]['station_name']}",
+                    "operator": train_data['operator'],
+                    "id": canonical.replace(' ', '')
+                }]
+            data_source = "planned_timetable"
+        elif detected_prefix:
             # User already specified a prefix — return the one canonical form
             canonical = f"{detected_prefix} {numeric_part}"
             results = [{
@@ -596,24 +813,41 @@ def generate_realistic_composition(train_id):
     return compositions.get(train_type, compositions['IR'])  # Default to IR composition
 
 
+_stations_body = (None, b'')
+
+
+def stations_response_body(registry):
+    """``/get-stations/`` JSON bytes, encoded once per registry version."""
+    global _stations_body
+    version, body = _stations_body
+    if version != registry.version:
+        body = app.json.dumps({
+            "stations": list(registry.stations),
+            "fallback_mode": registry.source == 'demo',
+            "message": f"Loaded {len(registry)} stations",
+            "version": registry.snapshot_version,
+            "timestamp": registry.loaded_at.isoformat()
+        }).encode('utf-8')
+        _stations_body = (registry.version, body)
+    return body
+
+
 @app.route('/get-stations/')
 def get_stations():
-    """Get stations list with caching for faster response"""
-    global stations
-    
-    if not stations:
+    """Get stations list, served from bytes precomputed per station snapshot"""
+    registry = StationRegistry.current()
+
+    if not registry.stations:
         # Return demo stations when external API is down
-        stations = get_demo_stations()
+        registry = StationRegistry.install(get_demo_stations(), source='demo')
         logger.info("Loaded demo stations as fallback")
-    
-    # Add caching headers for better performance
-    response = jsonify({
-        "stations": stations,
-        "fallback_mode": False,
-        "message": f"Loaded {len(stations)} stations",
-        "timestamp": datetime.now().isoformat()
-    })
-    
+
+    if registry.snapshot_version in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(stations_response_body(registry), mimetype='application/json')
+    response.set_etag(registry.snapshot_version)
+
     # Cache for 5 minutes
     response.headers['Cache-Control'] = 'public, max-age=300'
     return response
@@ -624,7 +858,7 @@ def api_get_stations():
     """API endpoint for stations list - uses scraped data only"""
     try:
         # Return whatever we have (demo or real) without blocking
-        return jsonify(stations or [])
+        return jsonify(list(StationRegistry.current().stations))
     except Exception as e:
         logger.error(f"Error getting stations: {e}")
         return jsonify({
@@ -635,53 +869,175 @@ def api_get_stations():
 
 @app.route('/reload-stations/')
 def reload_stations():
-    global stations
     try:
-        stations = StationsGetter.get_stations()
-        config.global_station_list.clear()
-        for station in stations:
-            config.global_station_list[station["name"]] = station["station_id"]
-        logger.info(f"Successfully reloaded {len(stations)} stations from external API")
+        registry = refresh_stations_from_cfr()
+        logger.info(f"Successfully reloaded {len(registry)} stations from external API")
         return jsonify({
             "success": True,
-            "message": f"Successfully loaded {len(stations)} stations from external API",
-            "stations_count": len(stations),
+            "message": f"Successfully loaded {len(registry)} stations from external API",
+            "stations_count": len(registry),
             "fallback_mode": False
         })
     except Exception as e:
         logger.error(f"Failed to reload stations from external API: {e}")
-        # Fallback to demo stations
-        logger.info("Loading demo stations as fallback")
-        stations = get_demo_stations()
-        config.global_station_list.clear()
-        for station in stations:
-            config.global_station_list[station["name"]] = station["station_id"]
+        # Keep the snapshot; fall back to demo stations only when nothing is loaded
+        registry = StationRegistry.current()
+        if not registry.stations:
+            logger.info("Loading demo stations as fallback")
+            registry = StationRegistry.install(get_demo_stations(), source='demo')
+            StationSearch.index_for(registry)
         return jsonify({
             "success": True,
-            "message": f"External API unavailable, loaded {len(stations)} demo stations",
-            "stations_count": len(stations),
-            "fallback_mode": True
+            "message": f"External API unavailable, kept {len(registry)} {registry.source} stations",
+            "stations_count": len(registry),
+            "fallback_mode": registry.source == 'demo'
         })
 
+def lookup_station_name(station_id):
+    """Name of a known station by ID, or None when the ID is not in the station list."""
+    station = StationRegistry.current().get(station_id)
+    return station.get("name") if station else None
+
+
+def find_station_id_by_name(station_name):
+    """Resolve a URL-friendly station name (e.g. 'bucuresti-nord') to its station ID.
+
+    Returns ``(station_id, proper_name)``; ``station_id`` is None when no
+    station matches exactly or partially.
+    """
+    # Convert URL-friendly station name back to proper format
+    proper_name = station_name.replace('-', ' ').title()
+
+    # Handle specific cases
+    name_mappings = {
+        'Bucuresti Nord': 'București Nord',
+        'Timisoara Nord': 'Timișoara Nord',
+        'Cluj Napoca': 'Cluj-Napoca',
+        'Targu Mures': 'Târgu Mureș',
+        'Baia Mare': 'Baia Mare',
+        'Satu Mare': 'Satu Mare'
+    }
+
+    if proper_name in name_mappings:
+        proper_name = name_mappings[proper_name]
+
+    # Find station ID from name, falling back to a partial match
+    registry = StationRegistry.current()
+    station = registry.find_by_name(proper_name) or registry.find_partial(proper_name)
+    if station is None:
+        return None, proper_name
+
+    raw_id = station.get("station_id", "")
+    try:
+        station_id = int(raw_id)
+    except (ValueError, TypeError):
+        station_id = raw_id  # keep slug as-is
+    return station_id, proper_name
+
+
+def resolve_station_name(station_id):
+    """Map a numeric or slug station ID to the name the Infofer scraper expects."""
+    station_name = lookup_station_name(station_id)
+
+    if not station_name:
+        # Check if station_id itself is a known station name or slug
+        station = StationRegistry.current().find_by_name(station_id)
+        if station:
+            station_name = station["name"]
+        else:
+            # If not in our list, try using the ID as a slug directly
+            station_name = str(station_id).replace('-', ' ').title()
+            logger.info(f"Station ID {station_id} not in global list, trying as name: {station_name}")
+
+    return station_name
+
+
+def planned_for(date_str):
+    """Planned timetable when it should answer for this service date, else None.
+
+    Today's boards and trains are delay-sensitive and always come from live
+    sources; other dates are served from the imported timetable when there
+    is one.
+    """
+    if normalize_date(date_str) == normalize_date():
+        return None
+    return PlannedTimetable.current()
+
+
+def runs_on_date(train_id, date_str=None):
+    """False when the imported timetable knows the train and it does not run on the date.
+
+    True when it runs, None when there is no timetable or it does not know
+    the number; callers go upstream only for True and None.
+    """
+    planned = PlannedTimetable.current()
+    return planned.train_runs(train_id, normalize_date(date_str)) if planned else None
+
+
+def station_board(station_id, station_name, date_str=None):
+    """Board rows and where they came from: ``live``, ``planned`` or ``planned+live``.
+
+    Planned rows get delays and platforms from a cached scrape of the same
+    board when one exists; nothing is scraped for them.  Rows carrying live
+    data have ``is_live`` set.
+    """
+    planned = planned_for(date_str)
+    rows = planned.board(station_id, station_name, normalize_date(date_str)) if planned else None
+    if rows is None:
+        timetable = StationTimetableGetter.get_timetable(station_id, station_name, date_str)
+        return [{**item, 'is_live': True} for item in timetable], 'live'
+
+    cached = StationTimetableGetter.peek_timetable(station_id, station_name, date_str)
+    if not cached:
+        return rows, 'planned'
+    rows, matched = StationLiveTimetableGetter.apply_live_delays(rows, cached, source='infofer_live')
+    rows = [{**row, 'is_live': True} if row.get('delay_source') else row for row in rows]
+    return rows, 'planned+live' if matched else 'planned'
+
+
+def precomputed_board(station_id, station_name, date_str=None):
+    """Response sending the nightly precomputed board as stored, when nothing fresher is at hand; else None.
+
+    Only requests without projection or ``?format=`` qualify.  Today's board
+    is sent only when the station has not been scraped recently, and is then
+    scraped in the background for the requests that follow.
+    """
+    if any(request.args.get(arg) for arg in ('fields', 'exclude', 'format')):
+        return None
+    planned = PlannedTimetable.current()
+    if planned is None or not StationTimetableGetter.is_cold(station_id, station_name, date_str):
+        return None
+    service_date = normalize_date(date_str)
+    blob = BoardPrecompute.lookup(planned, station_id, station_name, service_date)
+    if blob is None:
+        return None
+    if service_date == normalize_date():
+        StationTimetableGetter.fetch_in_background(station_id, station_name)
+
+    if request.accept_encodings.quality('gzip') > 0:
+        response = Response(blob, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(blob), mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Data-Source'] = 'planned'
+    return response
+
+
 @app.route('/station/<station_id>')
 def get_timetable(station_id):
-    """Get station timetable ONLY from live Infofer scraper"""
+    """Get station timetable; live for today, planned for other ``?date=`` values"""
     try:
         # 1. Resolve Name: Map numeric or slug ID to the real station name
-        station_name = next((s.get("name") for s in stations if str(s.get("station_id")) == str(station_id)), None)
-        
-        if not station_name:
-            # Check if station_id itself is a known name in config
-            if str(station_id) in config.global_station_list:
-                station_name = str(station_id)
-            else:
-                # If not in our list, try using the ID as a slug directly
-                station_name = str(station_id).replace('-', ' ').title()
-                logger.info(f"Station ID {station_id} not in global list, trying as name: {station_name}")
-
-        # 2. Fetch from Scraper
-        logger.info(f"Fetching timetable for {station_name} (ID: {station_id}) from Infofer live")
-        timetable = StationTimetableGetter.get_timetable(station_id, station_name)
+        station_name = resolve_station_name(station_id)
+        date_str = request.args.get('date')
+
+        # 2. Fetch from Scraper or the planned timetable
+        logger.info(f"Fetching timetable for {station_name} (ID: {station_id}), date: {date_str}")
+        precomputed = precomputed_board(station_id, station_name, date_str)
+        if precomputed is not None:
+            return precomputed
+        timetable, source = station_board(station_id, station_name, date_str)
         
         if not timetable:
             return jsonify({
@@ -690,10 +1046,9 @@ def get_timetable(station_id):
                 "station_id": station_id
             }), 404
 
-        for item in timetable:
-            item['is_live'] = True
-            
-        return jsonify(timetable)
+        response = jsonify(shape_timetable(timetable))
+        response.headers['X-Data-Source'] = source
+        return response
             
     except Exception as e:
         logger.error(f"Failed to get timetable for station {station_id}: {e}")
@@ -703,6 +1058,26 @@ def get_timetable(station_id):
         }), 500
 
 
+@app.route('/station/<station_id>/stream')
+def stream_station_updates(station_id):
+    """Server-Sent Events stream of the live board for one station.
+
+    Shares a single upstream poller per station; the board is pushed again
+    only when its rows change.
+    """
+    station_name = resolve_station_name(station_id)
+
+    def fetch():
+        timetable = StationTimetableGetter.get_timetable(station_id, station_name)
+        return [{**item, 'is_live': True} for item in timetable]
+
+    station_key, _ = StationTimetableGetter.canonical_station(station_id, station_name)
+    key = f"station:{station_key}"
+    stream = LiveUpdates.event_stream(key, fetch, STATION_STREAM_INTERVAL)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 def timetable_departures_filter(timetable):
     departures_timetable = []
 
@@ -723,60 +1098,20 @@ def timetable_arrivals_filter(timetable):
     return departures_timetable
 
 
-def timestamp_current_filter(timetable):
-    """Filter timetable for trains within -1h to +3h window, handling naive/aware datetimes."""
-    current_timetable = []
-    timezone = tz.gettz('Europe/Bucharest')
-    now_aware = datetime.now(tz=timezone)
-    now_naive = datetime.now()
-    
-    beginning_aware = now_aware - timedelta(hours=1)
-    end_aware = now_aware + timedelta(hours=3)
-    beginning_naive = now_naive - timedelta(hours=1)
-    end_naive = now_naive + timedelta(hours=3)
-
-    for item in timetable:
-        # Check both arrival and departure
-        found = False
-        for key in ['arrival_timestamp', 'departure_timestamp']:
-            if item.get(key):
-                try:
-                    ts = parser.isoparse(item[key])
-                    
-                    # Determine which bounds to use based on offset awareness
-                    if ts.tzinfo is not None and ts.tzinfo.utcoffset(ts) is not None:
-                        low, high = beginning_aware, end_aware
-                    else:
-                        low, high = beginning_naive, end_naive
-                        
-                    if low <= ts <= high:
-                        found = True
-                        break
-                    
-                    # Also check with delay
-                    delay = item.get('delay', 0)
-                    if delay:
-                        ts_delayed = ts + timedelta(minutes=delay)
-                        if low <= ts_delayed <= high:
-                            found = True
-                            break
-                except Exception as e:
-                    logger.error(f"Error parsing timestamp {item[key]}: {e}")
-                    continue
-        
-        if found:
-            current_timetable.append(item)
-
-    return current_timetable
+def window_args():
+    """``(past, ahead)`` minutes for the /current endpoints from ``?past=`` / ``?ahead=``."""
+    past = request.args.get('past', BoardIndex.DEFAULT_PAST_MINUTES, type=int)
+    ahead = request.args.get('ahead', BoardIndex.DEFAULT_AHEAD_MINUTES, type=int)
+    return past, ahead
 
 @app.route('/station/<int:station_id>/departures')
 def get_departures_timetable(station_id):
     try:
         # Resolve station name for Infofer scraper
-        station_name = next((s.get("name") for s in stations if str(s.get("station_id")) == str(station_id)), None)
+        station_name = lookup_station_name(station_id)
         timetable = StationTimetableGetter.get_timetable(station_id, station_name=station_name)
         timetable = timetable_departures_filter(timetable)
-        return jsonify(timetable)
+        return jsonify(shape_timetable(timetable))
     except Exception as e:
         logger.error(f"Failed to get departures timetable for station {station_id}: {e}")
         return jsonify({
@@ -788,21 +1123,25 @@ def get_departures_timetable(station_id):
 
 @app.route('/station/<int:station_id>/departures/current')
 def get_current_departures_timetable(station_id):
-    """Get current departures (within -1/+3 hour window) from real scraper"""
+    """Get current departures from real scraper
+
+    The window defaults to 1 hour back and 3 hours ahead; ``?past=`` and
+    ``?ahead=`` change it (minutes).
+    """
     try:
         # Resolve station name for Infofer scraper
-        station_name = next((s.get("name") for s in stations if str(s.get("station_id")) == str(station_id)), None)
+        station_name = lookup_station_name(station_id)
         logger.info(f"Fetching real-time current departures for {station_name or station_id}")
         
         timetable = StationTimetableGetter.get_timetable(station_id, station_name=station_name)
         if not timetable:
             return jsonify([])
             
-        # Filter for departures and time window
-        timetable = timetable_departures_filter(timetable)
-        timetable = timestamp_current_filter(timetable)
+        # Departures in the time window, from the board's sorted time index
+        start, end = BoardIndex.current_window(*window_args())
+        timetable = BoardIndex.for_board(timetable).departures(start, end)
         
-        return jsonify(timetable)
+        return jsonify(shape_timetable(timetable))
     except Exception as e:
         logger.error(f"Failed to get current departures for station {station_id}: {e}")
         # Only fallback if absolutely necessary, but preferably return empty list or error
@@ -816,43 +1155,7 @@ def get_current_departures_timetable(station_id):
 def get_current_departures_by_name(station_name):
     """Get current departures by station name (converted from URL-friendly format)"""
     try:
-        # Convert URL-friendly station name back to proper format
-        proper_name = station_name.replace('-', ' ').title()
-        
-        # Handle specific cases
-        name_mappings = {
-            'Bucuresti Nord': 'București Nord',
-            'Timisoara Nord': 'Timișoara Nord',
-            'Cluj Napoca': 'Cluj-Napoca',
-            'Targu Mures': 'Târgu Mureș',
-            'Baia Mare': 'Baia Mare',
-            'Satu Mare': 'Satu Mare'
-        }
-        
-        if proper_name in name_mappings:
-            proper_name = name_mappings[proper_name]
-            
-        # Find station ID from name
-        station_id = None
-        for station in stations:
-            if str(station.get("name", "")).lower() == proper_name.lower():
-                raw_id = station.get("station_id", "")
-                try:
-                    station_id = int(raw_id)
-                except (ValueError, TypeError):
-                    station_id = raw_id  # keep slug as-is
-                break
-
-        if station_id is None:
-            # Try to find partial match
-            for station in stations:
-                if proper_name.lower() in str(station.get("name", "")).lower():
-                    raw_id = station.get("station_id", "")
-                    try:
-                        station_id = int(raw_id)
-                    except (ValueError, TypeError):
-                        station_id = raw_id
-                    break
+        station_id, proper_name = find_station_id_by_name(station_name)
 
         if station_id is None:
             logger.warning(f"Station not found: {proper_name}, returning empty list")
@@ -872,10 +1175,10 @@ def get_current_departures_by_name(station_name):
 def get_arrivals_timetable(station_id):
     try:
         # Resolve station name for Infofer scraper
-        station_name = next((s.get("name") for s in stations if str(s.get("station_id")) == str(station_id)), None)
+        station_name = lookup_station_name(station_id)
         timetable = StationTimetableGetter.get_timetable(station_id, station_name=station_name)
         timetable = timetable_arrivals_filter(timetable)
-        return jsonify(timetable)
+        return jsonify(shape_timetable(timetable))
     except Exception as e:
         logger.error(f"Failed to get arrivals timetable for station {station_id}: {e}")
         return jsonify({
@@ -887,21 +1190,25 @@ def get_arrivals_timetable(station_id):
 
 @app.route('/station/<int:station_id>/arrivals/current')
 def get_current_arrivals_timetable(station_id):
-    """Get current arrivals (within -1/+3 hour window) from real scraper"""
+    """Get current arrivals from real scraper
+
+    The window defaults to 1 hour back and 3 hours ahead; ``?past=`` and
+    ``?ahead=`` change it (minutes).
+    """
     try:
         # Resolve station name for Infofer scraper
-        station_name = next((s.get("name") for s in stations if str(s.get("station_id")) == str(station_id)), None)
+        station_name = lookup_station_name(station_id)
         logger.info(f"Fetching real-time current arrivals for {station_name or station_id}")
         
         timetable = StationTimetableGetter.get_timetable(station_id, station_name=station_name)
         if not timetable:
             return jsonify([])
             
-        # Filter for arrivals and time window
-        timetable = timetable_arrivals_filter(timetable)
-        timetable = timestamp_current_filter(timetable)
+        # Arrivals in the time window, from the board's sorted time index
+        start, end = BoardIndex.current_window(*window_args())
+        timetable = BoardIndex.for_board(timetable).arrivals(start, end)
         
-        return jsonify(timetable)
+        return jsonify(shape_timetable(timetable))
     except Exception as e:
         logger.error(f"Failed to get current arrivals for station {station_id}: {e}")
         return jsonify({
@@ -914,43 +1221,7 @@ def get_current_arrivals_timetable(station_id):
 def get_current_arrivals_by_name(station_name):
     """Get current arrivals by station name (converted from URL-friendly format)"""
     try:
-        # Convert URL-friendly station name back to proper format
-        proper_name = station_name.replace('-', ' ').title()
-        
-        # Handle specific cases
-        name_mappings = {
-            'Bucuresti Nord': 'București Nord',
-            'Timisoara Nord': 'Timișoara Nord',
-            'Cluj Napoca': 'Cluj-Napoca',
-            'Targu Mures': 'Târgu Mureș',
-            'Baia Mare': 'Baia Mare',
-            'Satu Mare': 'Satu Mare'
-        }
-        
-        if proper_name in name_mappings:
-            proper_name = name_mappings[proper_name]
-            
-        # Find station ID from name
-        station_id = None
-        for station in stations:
-            if str(station.get("name", "")).lower() == proper_name.lower():
-                raw_id = station.get("station_id", "")
-                try:
-                    station_id = int(raw_id)
-                except (ValueError, TypeError):
-                    station_id = raw_id
-                break
-
-        if station_id is None:
-            # Try to find partial match
-            for station in stations:
-                if proper_name.lower() in str(station.get("name", "")).lower():
-                    raw_id = station.get("station_id", "")
-                    try:
-                        station_id = int(raw_id)
-                    except (ValueError, TypeError):
-                        station_id = raw_id
-                    break
+        station_id, proper_name = find_station_id_by_name(station_name)
 
         if station_id is None:
             logger.warning(f"Station not found: {proper_name}, returning empty list")
@@ -1511,37 +1782,10 @@ def search_stations(query):
         return jsonify([])
     
     try:
-        import unicodedata
-        def normalize_str(s):
-            return unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore').decode('utf-8').lower()
-            
-        matching_stations: list[dict] = []
-        query_norm = normalize_str(query)
-        
-        # Point 'bucuresti nord' queries to 'bucuresti nord gr.a'
-        if query_norm == "bucuresti nord":
-            query_norm = "bucuresti nord gr.a"
-        
-        for station in stations:
-            station_name_norm = normalize_str(str(station.get("name", "")))
-            if query_norm in station_name_norm:
-                # Calculate relevance score
-                score = 100
-                if station_name_norm.startswith(query_norm):
-                    score = 200  # Higher score for starts with
-                if station_name_norm == query_norm:
-                    score = 300  # Highest score for exact match
-                
-                matching_stations.append({
-                    **station,
-                    "score": score
-                })
-        
-        # Sort by relevance
-        matching_stations.sort(key=lambda x: x["score"], reverse=True)
-        
-        return jsonify(matching_stations[:10])  # Limit to 10 results
-        
+        # Index is built once per station registry version
+        index = StationSearch.index_for(StationRegistry.current())
+        return jsonify([{**station, "score": score} for score, station in index.search(query, limit=10)])
+
     except Exception as e:
         logger.error(f"Failed to search stations for '{query}': {e}")
         return jsonify([])
@@ -1883,6 +2127,290 @@ def add_train_report(train_id):
         logger.error(f"Error adding report: {e}")
         return jsonify({"error": str(e)}), 500
 
+def parse_board_stations(stations_arg):
+    """Resolve ``?stations=`` (IDs or names, comma separated) to unique ``(station_id, station_name)`` pairs."""
+    resolved, seen = [], set()
+    for ref in (stations_arg or '').split(','):
+        ref = ref.strip()
+        if not ref:
+            continue
+        station_name = resolve_station_name(ref)
+        station = StationRegistry.current().find_by_name(station_name)
+        station_id = ref if ref.isdigit() or not station else station["station_id"]
+        station_key, _ = StationTimetableGetter.canonical_station(station_id, station_name)
+        if station_key not in seen:
+            seen.add(station_key)
+            resolved.append((station_id, station_name))
+    return resolved
+
+
+def parse_board_window(window_arg):
+    """``?window=current`` or ``?window=<past>,<ahead>`` (minutes) to ``(past, ahead)``; None for the whole day."""
+    if not window_arg:
+        return None
+    if window_arg == 'current':
+        return BoardIndex.DEFAULT_PAST_MINUTES, BoardIndex.DEFAULT_AHEAD_MINUTES
+    past, _, ahead = window_arg.partition(',')
+    return int(past), int(ahead or BoardIndex.DEFAULT_AHEAD_MINUTES)
+
+
+def fetch_boards(station_refs, date_str, timeout):
+    """Boards for several stations: cache hits at once, the others fetched concurrently.
+
+    Returns one result dict per station with ``status`` ``cached``,
+    ``fetched``, ``timeout`` or ``error`` and, for boards, their ``source``
+    as in :func:`station_board`.  Each station gets ``timeout`` seconds from
+    when a worker picks it up, so stations queued behind others are not cut
+    short.  Scrapes that time out keep running and fill the cache for the
+    next request.
+    """
+    results, pending, started = [], {}, {}
+
+    def fetch(result):
+        started[id(result)] = time.monotonic()
+        return station_board(result["station_id"], result["station"], date_str)
+
+    planned = planned_for(date_str)
+    for station_id, station_name in station_refs:
+        result = {"station_id": station_id, "station": station_name}
+        # Planned boards are merged with any cached scrape by station_board itself
+        board = StationTimetableGetter.peek_timetable(station_id, station_name, date_str) if planned is None else None
+        if board is not None:
+            result.update(status="cached", source="live", board=[{**row, 'is_live': True} for row in board])
+        else:
+            pending[board_fanout_pool.submit(fetch, result)] = result
+        results.append(result)
+
+    # Stations still queued when every worker could have served them once are given up on
+    rounds = -(-len(pending) // BOARD_FANOUT_WORKERS)
+    give_up_at = time.monotonic() + timeout * rounds
+    while pending:
+        now = time.monotonic()
+        deadlines = [started[id(result)] + timeout for result in pending.values() if id(result) in started]
+        next_deadline = min(deadlines + [give_up_at])
+        done, _ = wait(pending, timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            result = pending.pop(future)
+            try:
+                board, source = future.result()
+                result.update(status="fetched", source=source, board=board)
+            except Exception as e:
+                logger.error(f"Board fan-out failed for {result['station']}: {e}")
+                result.update(status="error", error=str(e))
+        now = time.monotonic()
+        for future, result in list(pending.items()):
+            if now >= give_up_at or (id(result) in started and now - started[id(result)] >= timeout):
+                del pending[future]
+                result.update(status="timeout", error=f"No answer from Infofer within {timeout:g}s")
+    return results
+
+
+def select_board_rows(board, kind, window):
+    """Rows of one board for ``kind`` (departures/arrivals/all), limited to ``window`` when given."""
+    if window:
+        start, end = BoardIndex.current_window(*window)
+        index = BoardIndex.for_board(board)
+        if kind == 'departures':
+            return index.departures(start, end)
+        if kind == 'arrivals':
+            return index.arrivals(start, end)
+        return index.window(start, end)
+    if kind == 'departures':
+        return timetable_departures_filter(board)
+    if kind == 'arrivals':
+        return timetable_arrivals_filter(board)
+    return board
+
+
+@app.route('/api/boards')
+def get_multiple_boards():
+    """
+    Boards for several stations in one request.
+
+    Query params:
+      ?stations=10017,Brașov,...   station IDs or names (required)
+      ?kind=departures|arrivals|all  (default all)
+      ?window=current | <past>,<ahead>  minutes around now; whole day if omitted
+      ?group=merged|station        one time-sorted feed (default) or one list per station
+      ?timeout=<seconds>           wait per station, default 8
+      ?date=DD.MM.YYYY             service date, default today
+
+    Cached boards are served at once and the others are scraped in parallel.
+    Stations that fail or time out are reported in ``stations`` and the
+    response is marked ``partial`` instead of failing as a whole.
+    """
+    try:
+        station_refs = parse_board_stations(request.args.get('stations'))
+        kind = request.args.get('kind', 'all')
+        group = request.args.get('group', 'merged')
+        window = parse_board_window(request.args.get('window'))
+        timeout = min(max(request.args.get('timeout', BOARD_FANOUT_TIMEOUT, type=float), 1), BOARD_FANOUT_MAX_TIMEOUT)
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid parameters",
+            "error_code": "bad_request",
+            "message": "window must be 'current' or '<past>,<ahead>' in minutes",
+            "details": str(e)
+        }), 400
+
+    if not station_refs or len(station_refs) > BOARD_FANOUT_MAX_STATIONS or \
+            kind not in ('departures', 'arrivals', 'all') or group not in ('merged', 'station'):
+        return jsonify({
+            "error": "Invalid parameters",
+            "error_code": "bad_request",
+            "message": f"Pass 1 to {BOARD_FANOUT_MAX_STATIONS} stations, kind=departures|arrivals|all "
+                       f"and group=merged|station"
+        }), 400
+
+    results = fetch_boards(station_refs, request.args.get('date'), timeout)
+
+    time_keys = ('arrival_timestamp', 'departure_timestamp') if kind == 'arrivals' \
+        else ('departure_timestamp', 'arrival_timestamp')
+    stations_out, merged = [], []
+    for result in results:
+        board = result.pop('board', None)
+        if board is None:
+            stations_out.append(result)
+            continue
+        rows = [{**row, "source_station": result["station"], "source_station_id": result["station_id"]}
+                for row in select_board_rows(board, kind, window)]
+        result["count"] = len(rows)
+        if group == 'station':
+            result["rows"] = shape_timetable(rows)
+        else:
+            merged.extend(rows)
+        stations_out.append(result)
+
+    if all(r["status"] in ("error", "timeout") for r in stations_out):
+        return jsonify({
+            "error": "Timetable data unavailable",
+            "error_code": "service_down",
+            "message": "None of the requested station boards could be fetched from Infofer.",
+            "stations": stations_out
+        }), 503
+
+    response = {
+        "kind": kind,
+        "partial": any(r["status"] in ("error", "timeout") for r in stations_out),
+        "stations": stations_out,
+        "timestamp": datetime.now().isoformat()
+    }
+    if group == 'merged':
+        merged.sort(key=lambda row: row.get(time_keys[0]) or row.get(time_keys[1]) or '')
+        response["rows"] = shape_timetable(merged)
+    return jsonify(response)
+
+
+def parse_clock(clock):
+    """Seconds after midnight for 'HH:MM'; raises ValueError."""
+    hours, minutes = clock.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"invalid time {clock}")
+    return hours * 3600 + minutes * 60
+
+
+@app.route('/api/gtfs.zip')
+def get_gtfs_feed():
+    """GTFS static feed of the planned timetable, re-exported when the dataset changes"""
+    planned = PlannedTimetable.current()
+    if planned is None:
+        return jsonify({
+            "error": "Timetable not imported",
+            "error_code": "no_timetable",
+            "message": "The GTFS feed needs the timetable store; run import_timetable.py first."
+        }), 503
+    try:
+        path = GtfsExport.ensure(planned.version)
+    except Exception as e:
+        logger.error(f"GTFS export failed: {e}")
+        return jsonify({
+            "error": "GTFS feed unavailable",
+            "error_code": "server_error",
+            "message": "The timetable could not be exported as GTFS.",
+            "details": str(e)
+        }), 500
+    response = send_file(os.path.abspath(path), mimetype='application/zip', as_attachment=True,
+                         download_name=f"cfr-gtfs-{planned.version}.zip", etag=planned.version)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@app.route('/api/journeys')
+def get_journeys():
+    """Journeys between two stations from the planned timetable.
+
+    ``?from=&to=`` take station names or numeric codes, ``?date=`` the
+    service date (default today), ``?depart_after=HH:MM`` the earliest
+    departure (default now for today, else midnight) and
+    ``?max_transfers=`` the most changes of train (default 4).  Returns the
+    Pareto set over arrival time and changes, fewest changes first.
+    Planned times, plus projected delays for today's legs on trains whose
+    page is already cached; no upstream calls.
+    """
+    from_ref, to_ref = request.args.get('from', '').strip(), request.args.get('to', '').strip()
+    date_str = request.args.get('date')
+    service_date = normalize_date(date_str)
+    try:
+        datetime.strptime(service_date, "%d.%m.%Y")
+        depart_after = request.args.get('depart_after')
+        if depart_after:
+            depart_after = parse_clock(depart_after)
+        elif service_date == normalize_date():
+            now = datetime.now()
+            depart_after = now.hour * 3600 + now.minute * 60
+        else:
+            depart_after = 0
+        max_transfers = min(max(request.args.get('max_transfers', JourneyPlanner.MAX_TRANSFERS, type=int), 0),
+                            JourneyPlanner.MAX_TRANSFERS)
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid parameters",
+            "error_code": "bad_request",
+            "message": "date must be a date and depart_after HH:MM",
+            "details": str(e)
+        }), 400
+    if not from_ref or not to_ref:
+        return jsonify({
+            "error": "Invalid parameters",
+            "error_code": "bad_request",
+            "message": "Pass both from and to stations"
+        }), 400
+
+    planned = PlannedTimetable.current()
+    if planned is None:
+        return jsonify({
+            "error": "Timetable not imported",
+            "error_code": "no_timetable",
+            "message": "Journey planning needs the timetable store; run import_timetable.py first."
+        }), 503
+
+    stations = {}
+    for label, ref in (("from", from_ref), ("to", to_ref)):
+        stations[label] = planned.find_station(ref, ref)
+        if stations[label] is None:
+            return jsonify({
+                "error": f"Station {ref} not found",
+                "error_code": "not_found",
+                "message": f"'{ref}' is not a station in the timetable."
+            }), 404
+
+    # Today's legs get delays projected from train pages already scraped
+    observe = None
+    if service_date == normalize_date():
+        def observe(train):
+            return observe_cached_train(planned, train, service_date)
+    journeys = JourneyPlanner.plan(planned, stations["from"], stations["to"], service_date, depart_after,
+                                   max_transfers, observe)
+    return jsonify({
+        "from": planned.station_name(stations["from"]),
+        "to": planned.station_name(stations["to"]),
+        "date": service_date,
+        "journeys": journeys,
+        "data_source": "planned"
+    })
+
+
 @app.route('/api/station-by-name/<path:station_name>')
 def get_station_timetable_by_name(station_name):
     """
@@ -1900,20 +2428,19 @@ def get_station_timetable_by_name(station_name):
         date_str = request.args.get('date')  # e.g. "01.03.2026"
         logger.info(f"Fetching timetable by name: '{decoded_name}', date: {date_str}")
 
-        timetable = StationTimetableGetter.get_timetable(
+        precomputed = precomputed_board(decoded_name, decoded_name, date_str)
+        if precomputed is not None:
+            return precomputed
+        timetable, source = station_board(
             station_id=decoded_name,   # used as fallback key only
             station_name=decoded_name, # this drives the actual Infofer slug
-            date_str=date_str          # None falls back to today inside the scraper
+            date_str=date_str          # normalised by the scraper; None means today
         )
 
-        if not timetable:
-            # Return an empty list so the app can show "no trains" instead of an error
-            return jsonify([])
-
-        for item in timetable:
-            item['is_live'] = True
-
-        return jsonify(timetable)
+        # An empty list lets the app show "no trains" instead of an error
+        response = jsonify(shape_timetable(timetable) if timetable else [])
+        response.headers['X-Data-Source'] = source
+        return response
 
     except req_exc.ConnectionError as e:
         logger.error(f"Service unreachable while fetching station '{station_name}': {e}")
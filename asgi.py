@@ -0,0 +1,191 @@
+"""
+ASGI serving mode for the Flask app
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Every request is still answered by the Flask views, which run on the WSGI
+bridge's thread pool.  For the routes that scrape upstream, an async handler
+first awaits the scraper on the upstream pool (see ``src/AsyncScrapers.py``)
+and only then hands the request to Flask, which finds the data in the
+scraper cache.  Bridge threads therefore never wait on Infofer and cache hits
+do not queue behind slow scrapes.
+
+Environment:
+  CFR_WSGI_WORKERS      bridge threads running Flask views (default 10);
+                        each open SSE stream holds one
+  CFR_UPSTREAM_WORKERS  concurrent upstream scrapes (default 32)
+"""
+
+import asyncio
+import json
+import os
+import re
+from urllib.parse import parse_qs, unquote
+
+import requests.exceptions as req_exc
+from a2wsgi import WSGIMiddleware
+
+import app as flask_app
+from src import AsyncScrapers
+
+WSGI_WORKERS = int(os.environ.get('CFR_WSGI_WORKERS', '10'))
+
+wsgi_bridge = WSGIMiddleware(flask_app.app, workers=WSGI_WORKERS)
+
+
+def _query(scope):
+    return parse_qs(scope.get('query_string', b'').decode('latin-1'))
+
+
+# Each prefetch resolves the station the way the matching Flask view does;
+# the scraper caches on the canonical station and service date, so the view
+# then hits the entry the prefetch just filled.  Requests the view answers
+# from the planned timetable skip the prefetch.
+
+def _planned_station(date_str, station_id, station_name):
+    """Whether the view will answer this board from the planned timetable."""
+    planned = flask_app.planned_for(date_str)
+    return planned is not None and planned.find_station(station_id, station_name) is not None
+
+
+async def prefetch_train(scope, train_id):
+    date_str = _query(scope).get('date', [None])[0]
+    planned = flask_app.planned_for(date_str)
+    if planned is not None and planned.train(train_id, flask_app.normalize_date(date_str)) is not None:
+        return
+    await AsyncScrapers.get_train(train_id, date_str)
+
+
+async def prefetch_station(scope, station_id):
+    station_name = flask_app.resolve_station_name(station_id)
+    date_str = _query(scope).get('date', [None])[0]
+    if _planned_station(date_str, station_id, station_name):
+        return
+    await AsyncScrapers.get_timetable(station_id, station_name, date_str)
+
+
+async def prefetch_station_board(scope, station_id):
+    station_id = int(station_id)
+    await AsyncScrapers.get_timetable(station_id, station_name=flask_app.lookup_station_name(station_id))
+
+
+async def prefetch_station_board_by_name(scope, station_name):
+    station_id, _ = flask_app.find_station_id_by_name(station_name)
+    if station_id is not None:
+        await AsyncScrapers.get_timetable(station_id, station_name=flask_app.lookup_station_name(station_id))
+
+
+async def prefetch_station_by_name(scope, station_name):
+    decoded_name = unquote(station_name)
+    date_str = _query(scope).get('date', [None])[0]
+    if _planned_station(date_str, decoded_name, decoded_name):
+        return
+    await AsyncScrapers.get_timetable(station_id=decoded_name, station_name=decoded_name, date_str=date_str)
+
+
+async def prefetch_train_search(scope):
+    query = _query(scope).get('q', [''])[0].upper().strip()
+    detected_prefix, numeric_part = flask_app.parse_train_query(query)
+    if query and numeric_part and not detected_prefix:
+        await AsyncScrapers.get_train(numeric_part)
+
+
+async def prefetch_boards(scope):
+    query = _query(scope)
+    try:
+        station_refs = flask_app.parse_board_stations(query.get('stations', [''])[0])
+        timeout = float(query.get('timeout', [flask_app.BOARD_FANOUT_TIMEOUT])[0])
+    except ValueError:
+        return  # the Flask view answers with 400
+    timeout = min(max(timeout, 1), flask_app.BOARD_FANOUT_MAX_TIMEOUT)
+    date_str = query.get('date', [None])[0]
+    tasks = [asyncio.ensure_future(AsyncScrapers.get_timetable(station_id, station_name, date_str))
+             for station_id, station_name in station_refs[:flask_app.BOARD_FANOUT_MAX_STATIONS]]
+    for task in tasks:
+        # Failures are reported per station by the view, not here
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
+
+
+UPSTREAM_ROUTES = [
+    (re.compile(r'^/(?:api/)?train/(?P<train_id>[^/]+)$'), prefetch_train),
+    (re.compile(r'^/station/(?P<station_id>\d+)/(?:departures|arrivals)(?:/current)?$'), prefetch_station_board),
+    (re.compile(r'^/station/(?P<station_name>[^/]+)/(?:departures|arrivals)/current$'), prefetch_station_board_by_name),
+    (re.compile(r'^/station/(?P<station_id>[^/]+)$'), prefetch_station),
+    (re.compile(r'^/api/station-by-name/(?P<station_name>.+)$'), prefetch_station_by_name),
+    (re.compile(r'^/api/search/trains$'), prefetch_train_search),
+    (re.compile(r'^/api/boards$'), prefetch_boards),
+]
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'access-control-allow-origin', b'*')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def upstream_error(send, scope, e):
+    """Answer an unreachable or slow upstream directly instead of letting Flask retry the scrape.
+
+    Returns False for any other failure (train not found, unparseable page,
+    ...): the Flask view then answers it, so both serving modes give the
+    same status codes.
+    """
+    flask_app.logger.error(f"Upstream request failed for {scope['path']}: {e}")
+    if scope['path'] == '/api/search/trains':
+        # The Flask view reports failed live lookups as an empty result
+        query = _query(scope).get('q', [''])[0].upper().strip()
+        await send_json(send, 200, {"query": query, "results": [], "count": 0, "data_source": "live_lookup"})
+    elif isinstance(e, req_exc.ConnectionError):
+        await send_json(send, 503, {
+            "error": "Data source unreachable",
+            "error_code": "service_down",
+            "message": "The CFR / Infofer data source is currently unreachable. The service may be down for maintenance.",
+            "details": str(e)
+        })
+    elif isinstance(e, req_exc.Timeout):
+        await send_json(send, 504, {
+            "error": "Request timed out",
+            "error_code": "timeout",
+            "message": "The request to the CFR / Infofer server timed out. The server may be under heavy load.",
+            "details": str(e)
+        })
+    else:
+        return False
+    return True
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        for pattern, prefetch in UPSTREAM_ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                try:
+                    await prefetch(scope, **match.groupdict())
+                except Exception as e:
+                    if await upstream_error(send, scope, e):
+                        return
+                break
+
+    await wsgi_bridge(scope, receive, send)
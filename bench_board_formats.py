@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: plain vs columnar station board encodings
+
+Builds synthetic boards shaped like ``parse_infofer_html`` output and reports
+JSON size (raw and gzip) and encode time for both formats.
+"""
+
+import gzip
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from src.PayloadFormats import encode_board_columnar
+
+RANKS = ["R", "R", "R", "IR", "IR", "IC", "R-E", "IRN"]
+OPERATORS = ["CFR Călători", "CFR Călători", "CFR Călători", "Regio Călători",
+             "Astra Trans Carpatic", "Softrans", "Transferoviar Călători", "Interregional Călători"]
+PLACES = ["Brașov", "Constanța", "Cluj-Napoca", "Timișoara Nord", "Iași", "Craiova", "Ploiești Vest",
+          "Ploiești Sud", "Pitești", "Suceava", "Galați", "Buzău", "Videle", "Giurgiu Nord",
+          "Aeroport Henri Coandă", "Oltenița", "Fetești", "Mangalia", "Sinaia", "Câmpina"]
+
+
+def synthetic_board(size, station="București Nord", seed=1):
+    rng = random.Random(seed)
+    midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for _ in range(size):
+        rank = rng.choice(RANKS)
+        number = rng.randint(1000, 19999)
+        kind = rng.choice(("origin", "stop", "destination"))
+        arrival = departure = None
+        if kind in ("stop", "destination"):
+            arrival = midnight + timedelta(minutes=rng.randint(0, 1439))
+        if kind in ("stop", "origin"):
+            departure = (arrival or midnight + timedelta(minutes=rng.randint(0, 1439))) + timedelta(minutes=rng.randint(1, 10))
+        other = rng.choice(PLACES)
+        rows.append({
+            "rank": rank,
+            "train_id": f"{rank}{number}",
+            "train_number": f"{rank} {number}",
+            "operator": rng.choice(OPERATORS),
+            "origin": other if kind == "destination" else station,
+            "destination": station if kind == "destination" else other,
+            "is_origin": kind == "origin",
+            "is_stop": kind == "stop",
+            "is_destination": kind == "destination",
+            "delay": rng.choice([0, 0, 0, 0, 5, 10, 25]),
+            "arrival_time": arrival.strftime("%H:%M") if arrival else "",
+            "departure_time": departure.strftime("%H:%M") if departure else "",
+            "arrival_timestamp": arrival.isoformat() if arrival else None,
+            "departure_timestamp": departure.isoformat() if departure else None,
+            "platform": str(rng.randint(1, 14)),
+            "real_data": True,
+            "is_live": True,
+        })
+    rows.sort(key=lambda x: x.get('departure_timestamp') or x.get('arrival_timestamp') or '')
+    return rows
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 200, 600]
+    print(f"{'rows':>6} {'format':>9} {'bytes':>9} {'gzip':>8} {'encode ms':>10}")
+    for size in sizes:
+        rows = synthetic_board(size)
+        plain, plain_t = timed(lambda: json.dumps(rows).encode(), 20)
+        columnar, col_t = timed(lambda: json.dumps(encode_board_columnar(rows)).encode(), 20)
+        for name, body, seconds in (("list", plain, plain_t), ("columnar", columnar, col_t)):
+            print(f"{size:>6} {name:>9} {len(body):>9} {len(gzip.compress(body)):>8} {seconds * 1000:>10.2f}")
+        print(f"{'':>6} {'ratio':>9} {len(columnar) / len(plain):>9.2f} "
+              f"{len(gzip.compress(columnar)) / len(gzip.compress(plain)):>8.2f} {col_t / plain_t:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: journey planner queries over a full-size synthetic network
+
+Imports a synthetic SNTFC-shaped feed (see ``bench_timetable_import.py``)
+into a temporary store, then reports the time to load the planned
+timetable, to build one service day's connections, and the latency of
+random station-to-station queries across the whole network.
+
+Usage:
+    python bench_journey_planner.py [--trains 6000] [--segments 45] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from bench_timetable_import import write_synthetic_xml
+from src import JourneyPlanner, PlannedTimetable, TimetableImporter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trains', type=int, default=6000)
+    parser.add_argument('--segments', type=int, default=45, help="mean route segments per train")
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_journeys_')
+    xml_path = os.path.join(workdir, 'synthetic_sntfc.xml')
+    db_path = os.path.join(workdir, 'timetable.db')
+    print(f"Building a {args.trains}-train synthetic network...")
+    write_synthetic_xml(xml_path, args.trains, args.segments)
+    TimetableImporter.import_timetable(xml_path, db_path, progress_every=0)
+
+    started = time.perf_counter()
+    planned = PlannedTimetable.load(db_path)
+    load_seconds = time.perf_counter() - started
+
+    service_day = date.today() + timedelta(days=1)
+    started = time.perf_counter()
+    day = JourneyPlanner.connections_for(planned, service_day)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(7)
+    stations = [s for s in range(planned.index.station_count) if planned.index.calls(s)]
+    service_date = service_day.strftime("%d.%m.%Y")
+    latencies, found, changes = [], 0, []
+    for _ in range(args.queries):
+        origin, target = rng.sample(stations, 2)
+        depart_after = rng.randrange(4 * 3600, 20 * 3600)
+        started = time.perf_counter()
+        journeys = JourneyPlanner.plan(planned, origin, target, service_date, depart_after)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if journeys:
+            found += 1
+            changes.append(len(journeys))
+
+    latencies.sort()
+    print(f"\nStations: {len(stations)}, connections on {service_day}: {len(day)}")
+    print(f"Load planned timetable: {load_seconds:.2f}s")
+    print(f"Build day connections:  {build_seconds:.2f}s (once per service day)")
+    print(f"Queries: {args.queries}, with a journey: {found}, "
+          f"mean Pareto options: {statistics.mean(changes) if changes else 0:.1f}")
+    print(f"Latency ms: p50 {latencies[len(latencies) // 2]:.1f}  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f}  max {latencies[-1]:.1f}")
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
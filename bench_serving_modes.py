@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark: WSGI (gunicorn gthread) vs ASGI (uvicorn + asgi.py) serving modes
+
+Both servers run one process with the same total thread budget, so they use
+comparable memory (the measured RSS is printed next to the results).  The
+scrapers are replaced with fakes that sleep like a slow Infofer response.  The
+load mixes clients requesting uncached trains (always slow) with clients
+hitting a cached train and the cheap ``/api`` route, and reports latency of
+the cheap requests, which is what a blocked worker pool hurts.
+
+Usage:
+    python bench_serving_modes.py [--threads 16] [--slow-clients 24] [--duration 10]
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+SLOW_UPSTREAM_SECONDS = float(os.environ.get('BENCH_UPSTREAM_SECONDS', '2.0'))
+HOT_TRAIN = 'HOT1621'
+
+
+def install_fake_upstream():
+    """Replace the train scraper with a sleeping, caching fake before the app imports it."""
+    from src import TrainPageGetter
+
+    cache = {}
+    lock = threading.Lock()
+
+    def fake_get_train(train_id):
+        with lock:
+            if train_id in cache:
+                return cache[train_id]
+        time.sleep(SLOW_UPSTREAM_SECONDS)
+        data = {
+            'train_number': train_id,
+            'stations_data': [{'station_name': f'Stația {i}', 'arrival_time': '10:00',
+                               'departure_time': '10:02', 'delay': 0} for i in range(20)],
+            'data_source': 'bench',
+        }
+        with lock:
+            cache[train_id] = data
+        return data
+
+    TrainPageGetter.get_train = fake_get_train
+
+
+def make_wsgi_app():
+    install_fake_upstream()
+    import app
+    return app.app
+
+
+def make_asgi_app():
+    install_fake_upstream()
+    import asgi
+    return asgi.application
+
+
+def rss_kb(pid):
+    """RSS of a process and its direct children, in kB."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api')
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def get(port, path, timeout=60):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    start = time.perf_counter()
+    conn.request('GET', path)
+    resp = conn.getresponse()
+    resp.read()
+    conn.close()
+    return resp.status, time.perf_counter() - start
+
+
+def run_load(port, slow_clients, fast_clients, duration):
+    stop = time.time() + duration
+    fast_latencies, slow_done, errors = [], [0], [0]
+    lock = threading.Lock()
+
+    def slow_loop():
+        while time.time() < stop:
+            try:
+                status, _ = get(port, f'/api/train/{uuid.uuid4().hex[:8]}')
+                with lock:
+                    slow_done[0] += status == 200
+            except OSError:
+                with lock:
+                    errors[0] += 1
+
+    def fast_loop(path):
+        while time.time() < stop:
+            try:
+                _, seconds = get(port, path)
+                with lock:
+                    fast_latencies.append(seconds)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=slow_loop) for _ in range(slow_clients)]
+    threads += [threading.Thread(target=fast_loop, args=(p,))
+                for i in range(fast_clients) for p in [('/api', f'/api/train/{HOT_TRAIN}')[i % 2]]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return fast_latencies, slow_done[0], errors[0]
+
+
+def bench_mode(name, command, env, port, args):
+    proc = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port):
+            print(f"{name}: server did not start")
+            return
+        get(port, f'/api/train/{HOT_TRAIN}')  # warm the cached train
+        fast, slow_done, errors = run_load(port, args.slow_clients, args.fast_clients, args.duration)
+        fast.sort()
+        p95 = fast[int(len(fast) * 0.95) - 1] if fast else float('nan')
+        print(f"{name:>5}  rss={rss_kb(proc.pid) / 1024:7.1f} MB  cheap requests={len(fast):5d}  "
+              f"p50={statistics.median(fast) * 1000 if fast else float('nan'):8.1f} ms  "
+              f"p95={p95 * 1000:8.1f} ms  max={max(fast, default=float('nan')) * 1000:8.1f} ms  "
+              f"slow scrapes={slow_done:4d}  errors={errors}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='total request+upstream threads per mode')
+    parser.add_argument('--bridge-threads', type=int, default=4, help='ASGI mode: threads running Flask views')
+    parser.add_argument('--slow-clients', type=int, default=24)
+    parser.add_argument('--fast-clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5081)
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': here}
+    print(f"upstream latency {SLOW_UPSTREAM_SECONDS}s, {args.threads} threads per mode, "
+          f"{args.slow_clients} slow + {args.fast_clients} cheap clients, {args.duration}s")
+
+    bench_mode('wsgi', [sys.executable, '-m', 'gunicorn', '-k', 'gthread', '-w', '1',
+                        '--threads', str(args.threads), '-b', f'127.0.0.1:{args.port}',
+                        'bench_serving_modes:make_wsgi_app()'],
+               env, args.port, args)
+
+    asgi_env = {**env,
+                'CFR_WSGI_WORKERS': str(args.bridge_threads),
+                'CFR_UPSTREAM_WORKERS': str(args.threads - args.bridge_threads)}
+    bench_mode('asgi', [sys.executable, '-m', 'uvicorn', '--factory', '--ws', 'none', '--port', str(args.port + 1),
+                        '--log-level', 'warning', 'bench_serving_modes:make_asgi_app'],
+               asgi_env, args.port + 1, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming timetable import vs reading the whole XML
+
+Writes a synthetic SNTFC-shaped XML (same elements and attributes as the
+data.gov.ro file, default size close to the real one), then runs in separate
+processes:
+
+* ``read``   - the old approach: ``f.read()`` the file and regex-scan it
+* ``import`` - ``TimetableImporter.import_timetable`` into SQLite
+
+and reports wall time, throughput and peak RSS of each.
+
+Usage:
+    python bench_timetable_import.py [--trains 6000] [--segments 45] [--keep]
+"""
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+CATEGORIES = ["R", "R", "R", "R", "IR", "IR", "IC", "R-E", "IRN"]
+OPERATORS = ["1335", "1335", "1335", "1183", "1266", "1512", "1617"]
+
+READ_SCRIPT = '''
+import re, sys
+with open(sys.argv[1], 'r', encoding='utf-8') as f:
+    text = f.read()
+print(len(set(re.findall(r'CodStaOrigine="(\\\\d+)" DenStaOrigine="([^"]+)"', text))))
+'''
+
+IMPORT_SCRIPT = '''
+import sys
+from src import TimetableImporter
+TimetableImporter.import_timetable(sys.argv[1], sys.argv[2], progress_every=0)
+'''
+
+
+def synthetic_lines(stations, count, rng):
+    """Station sequences of ``count`` lines wandering over a square grid of stations, so lines cross."""
+    side = int(stations ** 0.5)
+    lines = []
+    for _ in range(count):
+        x, y = rng.randrange(side), rng.randrange(side)
+        dx, dy = rng.choice(((1, 0), (0, 1), (1, 1), (1, -1)))
+        line = []
+        for _ in range(rng.randint(15, 70)):
+            line.append(y * side + x)
+            if rng.random() < 0.3:
+                dx, dy = rng.choice(((1, 0), (0, 1), (1, 1), (1, -1), (-1, 1)))
+            x, y = min(max(x + dx, 0), side - 1), min(max(y + dy, 0), side - 1)
+            if line[-1] == y * side + x:
+                break
+        if len(line) > 2:
+            lines.append(line)
+    return lines
+
+
+def write_synthetic_xml(path, trains, segments, stations=1200, seed=1):
+    """Trains run both ways over parts of 300 lines; ``segments`` is the mean run length."""
+    rng = random.Random(seed)
+    names = [f"Stația {i} h." for i in range(stations)]
+    lines = synthetic_lines(stations, 300, rng)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<XmlIf><XmlMts><Mt><Trenuri>\n')
+        for number in range(trains):
+            f.write(f'<Tren CategorieTren="{rng.choice(CATEGORIES)}" KmCum="0" Lungime="120" Numar="{1000 + number}" '
+                    f'Operator="{rng.choice(OPERATORS)}" Proprietar="CFR" Putere="1" Rang="1" Servicii="1" Tonaj="300">\n'
+                    f'<Trase><Trasa CodStatieInitiala="1" CodStatieFinala="2" Id="{number}" Tip="1">\n')
+            line = rng.choice(lines)
+            if rng.random() < 0.5:
+                line = line[::-1]
+            count = min(len(line) - 1, max(2, int(rng.gauss(segments, segments / 3))))
+            first = rng.randrange(len(line) - count)
+            route = line[first:first + count + 1]
+            clock = rng.randint(0, 86399)
+            for seq, (station, following) in enumerate(zip(route, route[1:]), 1):
+                running = rng.randint(120, 900)
+                dwell = rng.choice([0, 60, 60, 120])
+                f.write(f'<ElementTrasa Ajustari="0" CodStaDest="{10000 + following}" CodStaOrigine="{10000 + station}" '
+                        f'DenStaDestinatie="{names[following]}" DenStaOrigine="{names[station]}" Km="{rng.randint(1000, 20000)}" '
+                        f'Lungime="120" OraP="{clock % 86400}" OraS="{(clock + running) % 86400}" Rci="R" Rco="R" '
+                        f'Restrictie="0" Secventa="{seq}" StationareSecunde="{dwell}" TipOprire="N" Tonaj="300" '
+                        f'VitezaLivret="100"/>\n')
+                clock += running + dwell
+            f.write('</Trasa></Trase>\n<RestrictiiTren><CalendarTren DataStart="20251214" DataStop="20261212" '
+                    f'Zile="{"".join(rng.choice("1110") for _ in range(364))}"/></RestrictiiTren>\n</Tren>\n')
+        f.write('</Trenuri></Mt></XmlMts></XmlIf>\n')
+
+
+def run(script, *args):
+    started = time.time()
+    proc = subprocess.run([sys.executable, '-c', script, *args], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed = time.time() - started
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    return elapsed
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trains', type=int, default=6000)
+    parser.add_argument('--segments', type=int, default=45, help="mean route segments per train")
+    parser.add_argument('--keep', action='store_true', help="keep the generated files")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_timetable_')
+    xml_path = os.path.join(workdir, 'synthetic_sntfc.xml')
+    db_path = os.path.join(workdir, 'timetable.db')
+    print(f"Writing {args.trains} synthetic trains to {xml_path}...")
+    write_synthetic_xml(xml_path, args.trains, args.segments)
+    size_mb = os.path.getsize(xml_path) / 1e6
+    print(f"XML size: {size_mb:.0f} MB\n")
+
+    # ru_maxrss of children is a running maximum, so run the lighter one first
+    results = []
+    for label, script, extra in (("import", IMPORT_SCRIPT, [db_path]), ("read", READ_SCRIPT, [])):
+        elapsed = run(script, xml_path, *extra)
+        results.append((label, elapsed, peak_rss_mb()))
+
+    print(f"{'method':<8} {'seconds':>8} {'MB/s':>7} {'peak RSS MB':>12}")
+    for label, elapsed, rss in results:
+        print(f"{label:<8} {elapsed:>8.1f} {size_mb / elapsed:>7.1f} {rss:>12.0f}")
+    print(f"\nStore size: {os.path.getsize(db_path) / 1e6:.0f} MB")
+
+    if not args.keep:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
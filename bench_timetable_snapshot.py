@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: worker startup and memory, SQLite store vs memory-mapped snapshot
+
+Imports a synthetic SNTFC-shaped feed (see ``bench_timetable_import.py``),
+then starts ``--workers`` processes at once for each way of loading the
+planned timetable:
+
+* ``baseline`` - imports the modules only
+* ``store``    - copies the array index out of the SQLite store
+* ``snapshot`` - maps the binary snapshot
+
+Each worker then builds every station's board for one day, so the pages a
+real worker touches are resident, and waits.  While all of a mode's workers
+are alive their ``/proc/<pid>/smaps_rollup`` is read: ``Pss`` splits shared
+pages between the processes mapping them, so it is the memory each worker
+really costs.  Linux only.
+
+Usage:
+    python bench_timetable_snapshot.py [--trains 6000] [--segments 45] [--workers 4]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from bench_timetable_import import write_synthetic_xml
+from src import TimetableImporter
+
+WORKER_SCRIPT = '''
+import sys, time
+from src import PlannedTimetable, TimetableImporter, TimetableIndex, TimetableSnapshot
+mode, db_path, service_date = sys.argv[1:4]
+started = time.perf_counter()
+if mode == 'store':
+    conn = TimetableImporter.connect(db_path)
+    planned = PlannedTimetable.PlannedTimetable(TimetableIndex.load(conn))
+    conn.close()
+elif mode == 'snapshot':
+    planned = PlannedTimetable.PlannedTimetable(TimetableSnapshot.load(TimetableSnapshot.snapshot_path(db_path)))
+elapsed = time.perf_counter() - started
+if mode != 'baseline':
+    for code in planned.index.station_codes:
+        planned.board(str(code), None, service_date)
+print(elapsed, flush=True)
+sys.stdin.read()
+'''
+
+
+def smaps_rollup_mb(pid):
+    """``{field: MB}`` from a process's ``smaps_rollup``."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return fields
+
+
+def run_workers(mode, db_path, service_date, workers):
+    """Start ``workers`` processes in ``mode``; returns (mean load seconds, mean RSS MB, mean PSS MB)."""
+    procs = [subprocess.Popen([sys.executable, '-c', WORKER_SCRIPT, mode, db_path, service_date],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+             for _ in range(workers)]
+    try:
+        seconds = [float(proc.stdout.readline()) for proc in procs]
+        memory = [smaps_rollup_mb(proc.pid) for proc in procs]
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+    return (sum(seconds) / workers, sum(m['Rss'] for m in memory) / workers,
+            sum(m['Pss'] for m in memory) / workers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trains', type=int, default=6000)
+    parser.add_argument('--segments', type=int, default=45, help="mean route segments per train")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_snapshot_')
+    xml_path = os.path.join(workdir, 'synthetic_sntfc.xml')
+    db_path = os.path.join(workdir, 'timetable.db')
+    print(f"Building a {args.trains}-train synthetic network...")
+    write_synthetic_xml(xml_path, args.trains, args.segments)
+    TimetableImporter.import_timetable(xml_path, db_path, progress_every=0)
+    snapshot_mb = os.path.getsize(os.path.join(workdir, 'timetable.snapshot')) / 1e6
+    print(f"Snapshot size: {snapshot_mb:.1f} MB\n")
+
+    service_date = (date.today() + timedelta(days=1)).strftime("%d.%m.%Y")
+    results = {mode: run_workers(mode, db_path, service_date, args.workers)
+               for mode in ('baseline', 'store', 'snapshot')}
+    _, base_rss, base_pss = results['baseline']
+    print(f"{args.workers} workers each; memory above a worker that only imports the modules")
+    print(f"{'mode':<9} {'load s':>7} {'RSS MB':>7} {'PSS MB':>7}")
+    for mode in ('store', 'snapshot'):
+        seconds, rss, pss = results[mode]
+        print(f"{mode:<9} {seconds:>7.3f} {rss - base_rss:>7.1f} {pss - base_pss:>7.1f}")
+
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Compare a new SNTFC timetable XML with the imported store (or another XML) train by train.
+
+Usage:
+    python diff_timetable.py NEW.xml [--db timetable.db] [--apply]
+    python diff_timetable.py NEW.xml --against OLD.xml
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from src import TimetableDiff, TimetableImporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('xml_path')
+    parser.add_argument('--db', default=None, help=f"store path (default {TimetableImporter.TIMETABLE_DB_FILE})")
+    parser.add_argument('--against', default=None, help="compare with this XML instead of the store")
+    parser.add_argument('--apply', action='store_true',
+                        help="update the store with the differences and drop the affected cache entries")
+    parser.add_argument('--json', action='store_true', help="print the full result as JSON")
+    args = parser.parse_args()
+
+    for path in (args.xml_path, args.against):
+        if path and not os.path.exists(path):
+            print(f"XML not found at {path}")
+            return 1
+    if args.apply and args.against:
+        print("--apply updates the store; it cannot be combined with --against")
+        return 1
+
+    if args.apply:
+        result = TimetableDiff.apply(args.xml_path, args.db)
+    elif args.against:
+        result = TimetableDiff.diff(TimetableDiff.xml_train_hashes(args.against),
+                                    TimetableDiff.xml_train_hashes(args.xml_path))
+    else:
+        conn = TimetableImporter.connect(args.db)
+        try:
+            old = TimetableDiff.store_train_hashes(conn)
+        finally:
+            conn.close()
+        result = TimetableDiff.diff(old, TimetableDiff.xml_train_hashes(args.xml_path))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    for kind in ("added", "removed", "changed"):
+        numbers = result[kind]
+        print(f"{kind:<8} {len(numbers):>5}  {' '.join(numbers[:20])}{' ...' if len(numbers) > 20 else ''}")
+    if args.apply:
+        print(f"Dataset {result['from']} -> {result['to']}: {len(result['stations'])} stations affected, "
+              f"{result['dropped_cache_entries']} cache entries dropped, {result['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
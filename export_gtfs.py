@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Export the imported timetable as a GTFS static zip.
+
+Only rewrites the zip when the dataset changed since it was last written,
+so it can run after every import or from cron.
+
+Usage:
+    python export_gtfs.py [--db timetable.db] [--out timetable.gtfs.zip] [--force] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+from src import GtfsExport, PlannedTimetable, TimetableImporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=None, help=f"store path (default {TimetableImporter.TIMETABLE_DB_FILE})")
+    parser.add_argument('--out', default=None, help="zip path (default next to the store)")
+    parser.add_argument('--force', action='store_true', help="export even when the zip is up to date")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    db_path = args.db or TimetableImporter.TIMETABLE_DB_FILE
+    path = args.out or GtfsExport.gtfs_path(db_path)
+    version = PlannedTimetable.load(db_path).version
+    if not args.force and GtfsExport.feed_version(path) == version:
+        print(f"{path} is up to date with dataset {version}")
+        return 0
+
+    report = GtfsExport.export(db_path, path)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    for name, count in report["rows"].items():
+        print(f"{name:<20} {count:>10}")
+    print(f"Wrote {report['path']} for dataset {report['dataset']}: {report['bytes'] / 1e6:.1f} MB "
+          f"in {report['seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
-import json
 import re
 import os
 
+from src import StationSnapshot
+
 def extract_stations_text():
     xml_path = 'trenuri-2025-2026_sntfc.xml'
     if not os.path.exists(xml_path):
@@ -44,10 +45,8 @@ def extract_stations_text():
             
         stations_list.sort(key=lambda x: x['name'])
         
-        with open('src/station_mapping.json', 'w', encoding='utf-8') as f:
-            json.dump(stations_list, f, ensure_ascii=False, indent=2)
-            
-        print(f"Saved {len(stations_list)} stations to src/station_mapping.json")
+        version = StationSnapshot.write_snapshot(stations_list, source='sntfc-xml')
+        print(f"Saved {len(stations_list)} stations to {StationSnapshot.SNAPSHOT_FILE} (version {version})")
         
     except Exception as e:
         print(f"Error: {e}")
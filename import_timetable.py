@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Import the SNTFC timetable XML from data.gov.ro into the local timetable store.
+
+Usage:
+    python import_timetable.py [trenuri-2025-2026_sntfc.xml] [--db timetable.db]
+    python import_timetable.py --snapshot-only [--db timetable.db]
+"""
+
+import argparse
+import os
+import sys
+
+from src import TimetableImporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('xml_path', nargs='?', default=TimetableImporter.DEFAULT_XML_FILE)
+    parser.add_argument('--db', default=None, help=f"store path (default {TimetableImporter.TIMETABLE_DB_FILE})")
+    parser.add_argument('--progress-every', type=int, default=1000, help="trains between progress lines")
+    parser.add_argument('--snapshot-only', action='store_true',
+                        help="only rewrite the memory-mapped snapshot of an existing store")
+    args = parser.parse_args()
+
+    if args.snapshot_only:
+        version = TimetableImporter.write_snapshot(args.db)
+        print(f"Wrote snapshot of dataset {version}")
+        return 0
+
+    if not os.path.exists(args.xml_path):
+        print(f"XML not found at {args.xml_path}")
+        return 1
+    TimetableImporter.import_timetable(args.xml_path, args.db, args.progress_every)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Store every station's planned board for the next service day, ready to send.
+
+Meant to run nightly from cron, e.g. ``30 23 * * * python precompute_boards.py``.
+
+Usage:
+    python precompute_boards.py [--date DD.MM.YYYY] [--budget SECONDS] [--json]
+"""
+
+import argparse
+import json
+import sys
+
+from src import BoardPrecompute, PlannedTimetable
+from src.PersistentCache import normalize_date
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--date', default=None, help="service date (default tomorrow)")
+    parser.add_argument('--budget', type=float, default=BoardPrecompute.PRECOMPUTE_BUDGET,
+                        help="seconds the run may take (default %(default)s)")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    planned = PlannedTimetable.current()
+    if planned is None:
+        print("No timetable imported; run import_timetable.py first")
+        return 1
+    report = BoardPrecompute.precompute(planned, normalize_date(args.date) if args.date else None, args.budget)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['boards']} boards for {report['service_date']} (dataset {report['dataset']}) "
+              f"in {report['seconds']}s: {report['stored_bytes'] / 1e6:.1f} MB stored, "
+              f"{report['json_bytes'] / 1e6:.1f} MB as JSON; {report['empty']} stations without trains")
+        if not report["complete"]:
+            print(f"Budget of {args.budget:g}s spent; {report['not_reached']} quieter stations not reached")
+    return 0 if report["complete"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
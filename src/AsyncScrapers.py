@@ -0,0 +1,36 @@
+"""
+Async Scrapers - awaitable wrappers around the blocking scrapers
+
+The scrapers use ``requests`` and block for as long as Infofer / CFR take to
+answer.  In ASGI mode they run on a dedicated upstream thread pool and are
+awaited from the event loop, so slow upstream responses no longer occupy the
+threads that serve cache hits and cheap routes.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src import StationTimetableGetter, TrainPageGetter
+
+# Concurrent upstream scrapes per process
+UPSTREAM_WORKERS = int(os.environ.get('CFR_UPSTREAM_WORKERS', '32'))
+
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix='upstream')
+
+
+async def run_upstream(fn, *args, **kwargs):
+    """Run a blocking scraper call on the upstream pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def get_train(train_id, date_str=None):
+    """Awaitable :func:`TrainPageGetter.get_train`."""
+    return await run_upstream(TrainPageGetter.get_train, train_id, date_str)
+
+
+async def get_timetable(*args, **kwargs):
+    """Awaitable :func:`StationTimetableGetter.get_timetable` (same arguments)."""
+    return await run_upstream(StationTimetableGetter.get_timetable, *args, **kwargs)
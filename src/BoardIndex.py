@@ -0,0 +1,112 @@
+"""
+Board Index - time-window lookups over cached station boards
+
+The ``/current`` endpoints used to parse every row's ISO timestamps on every
+request.  An :class:`IndexedBoard` parses them once per cached board into
+epoch keys (scheduled and delay-adjusted), kept in sorted arrays per
+direction, so a window query is two bisects plus a gather.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from cachetools import LRUCache
+
+# Default /current window around now, in minutes
+DEFAULT_PAST_MINUTES = 60
+DEFAULT_AHEAD_MINUTES = 180
+
+# Largest window either side accepted from query params, in minutes
+MAX_WINDOW_MINUTES = 24 * 60
+
+_indexes = LRUCache(maxsize=256)
+_indexes_lock = threading.Lock()
+
+
+def _epoch(iso_timestamp):
+    """Epoch seconds of an ISO timestamp; naive values are local time."""
+    if not iso_timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(iso_timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class IndexedBoard:
+    """A station board with sorted epoch indexes for departures and arrivals.
+
+    A row is in a window when its arrival or departure time, scheduled or
+    shifted by its delay, falls inside it; the same rule the old per-row
+    filter applied.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        departures, arrivals = [], []
+        for position, row in enumerate(rows):
+            keys = set()
+            try:
+                delay_seconds = int(row.get('delay') or 0) * 60
+            except (TypeError, ValueError):
+                delay_seconds = 0
+            for field in ('arrival_timestamp', 'departure_timestamp'):
+                epoch = _epoch(row.get(field))
+                if epoch is not None:
+                    keys.add(epoch)
+                    if delay_seconds:
+                        keys.add(epoch + delay_seconds)
+            pairs = [(key, position) for key in keys]
+            if row.get('is_origin') or row.get('is_stop'):
+                departures.extend(pairs)
+            if row.get('is_destination') or row.get('is_stop'):
+                arrivals.extend(pairs)
+        departures.sort()
+        arrivals.sort()
+        self.departure_keys = [key for key, _ in departures]
+        self.departure_rows = [position for _, position in departures]
+        self.arrival_keys = [key for key, _ in arrivals]
+        self.arrival_rows = [position for _, position in arrivals]
+
+    def _lookup(self, keys, positions, start, end):
+        lo = bisect_left(keys, start)
+        hi = bisect_right(keys, end)
+        # A row can match on several keys; keep each once, in board order
+        return [self.rows[p] for p in sorted(set(positions[lo:hi]))]
+
+    def window(self, start, end):
+        """Rows in either direction with a key in ``[start, end]`` epoch seconds."""
+        positions = set()
+        for keys, rows in ((self.departure_keys, self.departure_rows), (self.arrival_keys, self.arrival_rows)):
+            positions.update(rows[bisect_left(keys, start):bisect_right(keys, end)])
+        return [self.rows[p] for p in sorted(positions)]
+
+    def departures(self, start, end):
+        """Departing rows (origin or stop) with a key in ``[start, end]`` epoch seconds."""
+        return self._lookup(self.departure_keys, self.departure_rows, start, end)
+
+    def arrivals(self, start, end):
+        """Arriving rows (destination or stop) with a key in ``[start, end]`` epoch seconds."""
+        return self._lookup(self.arrival_keys, self.arrival_rows, start, end)
+
+
+def for_board(rows):
+    """Index for a board, built on first use and shared while the board is cached."""
+    with _indexes_lock:
+        index = _indexes.get(id(rows))
+        # The index holds the board, so its id cannot be reused while cached
+        if index is not None and index.rows is rows:
+            return index
+    index = IndexedBoard(rows)
+    with _indexes_lock:
+        _indexes[id(rows)] = index
+    return index
+
+
+def current_window(past_minutes=DEFAULT_PAST_MINUTES, ahead_minutes=DEFAULT_AHEAD_MINUTES, now=None):
+    """``(start, end)`` epoch seconds around now, clamped to ``MAX_WINDOW_MINUTES``."""
+    now = datetime.now().timestamp() if now is None else now
+    past_minutes = min(max(past_minutes, 0), MAX_WINDOW_MINUTES)
+    ahead_minutes = min(max(ahead_minutes, 0), MAX_WINDOW_MINUTES)
+    return now - past_minutes * 60, now + ahead_minutes * 60
@@ -0,0 +1,100 @@
+"""
+Board Precompute - next-day station boards stored ready to send
+
+The first request for a station's board in the morning finds nothing cached
+and waits for a full Infofer scrape.  ``precompute_boards.py`` runs nightly
+and builds every station's planned board for the next service day from the
+imported timetable (see ``PlannedTimetable``), with no upstream call.  Each
+board is stored in the persistent cache already encoded: compact JSON,
+gzipped, the rows ``/station/<ID>`` would send for it.
+
+Boards are keyed by dataset version, CFR station code and service date, so
+a timetable update makes the old ones unreachable, and they expire at the
+end of their service day.  Stations are built busiest first and the run
+stops once its wall-clock budget is spent, so a run cut short still covers
+the boards most requests ask for.
+
+``/station/<ID>`` sends a stored board as it is when there is nothing
+fresher: for other dates than today when no scrape of the board is cached,
+and for today when the station has not been scraped at all recently (it
+then scrapes in the background for the requests that follow).
+
+Environment:
+  CFR_PRECOMPUTE_BUDGET  seconds a precompute run may take (default 600)
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from src import PersistentCache
+
+PRECOMPUTE_BUDGET = float(os.environ.get('CFR_PRECOMPUTE_BUDGET', '600'))
+
+NAMESPACE = 'precomputed_board'
+
+# Boards written per transaction; a run cut short keeps what it wrote
+BATCH_SIZE = 200
+
+
+def blob_key(version, station_code, service_date):
+    return f"{version}|{station_code}|{service_date}"
+
+
+def next_service_date():
+    """Tomorrow as DD.MM.YYYY."""
+    return (datetime.now() + timedelta(days=1)).strftime("%d.%m.%Y")
+
+
+def precompute(planned, service_date=None, budget=PRECOMPUTE_BUDGET):
+    """Store every station's planned board for a DD.MM.YYYY date (default tomorrow); returns a report.
+
+    Stations without any train that day are skipped.  Boards stored for
+    other dataset versions are dropped at the end.
+    """
+    started = time.monotonic()
+    service_date = service_date or next_service_date()
+    day_end = datetime.strptime(service_date, "%d.%m.%Y") + timedelta(days=1)
+    index = planned.index
+    offsets = index.call_offsets
+    stations = sorted(range(index.station_count), key=lambda s: offsets[s] - offsets[s + 1])
+
+    report = {"service_date": service_date, "dataset": planned.version, "stations": len(stations),
+              "boards": 0, "empty": 0, "not_reached": 0, "json_bytes": 0, "stored_bytes": 0}
+    batch = []
+    for done, station in enumerate(stations):
+        if time.monotonic() - started > budget:
+            report["not_reached"] = len(stations) - done
+            break
+        code = index.station_codes[station]
+        rows = planned.board(str(code), None, service_date)
+        if not rows:
+            report["empty"] += 1
+            continue
+        body = json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        blob = gzip.compress(body, mtime=0)
+        report["json_bytes"] += len(body)
+        report["stored_bytes"] += len(blob)
+        batch.append((blob_key(planned.version, code, service_date), blob))
+        if len(batch) >= BATCH_SIZE:
+            report["boards"] += PersistentCache.store_blobs(NAMESPACE, batch, day_end.timestamp())
+            batch = []
+    if batch:
+        report["boards"] += PersistentCache.store_blobs(NAMESPACE, batch, day_end.timestamp())
+
+    prefix = f"{planned.version}|"
+    report["dropped_stale"] = PersistentCache.delete_matching(NAMESPACE, lambda key: not key.startswith(prefix))
+    report["complete"] = report["not_reached"] == 0
+    report["seconds"] = round(time.monotonic() - started, 2)
+    return report
+
+
+def lookup(planned, station_id, station_name, service_date):
+    """Stored gzipped board of a station for a DD.MM.YYYY date, or None."""
+    station = planned.find_station(station_id, station_name)
+    if station is None:
+        return None
+    code = planned.index.station_codes[station]
+    return PersistentCache.load_blob(NAMESPACE, blob_key(planned.version, code, service_date))
@@ -0,0 +1,150 @@
+"""
+Board Prefetcher - keeps the most requested station boards warm
+
+Every board lookup for today bumps a popularity score for its canonical
+station.  Scores decay exponentially (a decayed LFU), so a station that was
+busy this morning stops being prefetched in the evening.  A background thread
+refreshes the top stations shortly before their cache entries expire.
+Refreshes are limited by a token bucket so the prefetcher never spends more
+than its share of the upstream budget, and the thread sleeps when nobody has
+asked for a board for a while.
+
+Environment:
+  CFR_PREFETCH           set to 0 to disable prefetching
+  CFR_PREFETCH_TOP_N     stations kept warm (default 10)
+  CFR_PREFETCH_RATE      upstream refreshes allowed per minute (default 20)
+"""
+
+import os
+import threading
+import time
+
+PREFETCH_ENABLED = os.environ.get('CFR_PREFETCH', '1') != '0'
+PREFETCH_TOP_N = int(os.environ.get('CFR_PREFETCH_TOP_N', '10'))
+PREFETCH_RATE_PER_MINUTE = float(os.environ.get('CFR_PREFETCH_RATE', '20'))
+
+# Popularity halves after this many seconds without requests
+HALF_LIFE_SECONDS = 600
+
+# Decayed score a station needs before it is worth prefetching
+MIN_SCORE = 2.0
+
+# Stop refreshing after this long without any board request
+IDLE_SECONDS = 300
+
+# Seconds between scheduling passes
+TICK_SECONDS = 5
+
+# Stations tracked at most; the least popular are forgotten first
+MAX_TRACKED = 500
+
+
+class TokenBucket:
+    """Allows ``rate_per_minute`` operations per minute with bursts up to the same amount."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = max(rate_per_minute, 1.0)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class BoardPrefetcher:
+    """Decayed-LFU popularity tracking plus a budgeted refresh thread.
+
+    ``refresh(station_key, station_name, station_id)`` scrapes and stores one
+    board; ``needs_refresh(station_key)`` tells whether the cached board is
+    missing or about to expire.
+    """
+
+    def __init__(self, refresh, needs_refresh, top_n=PREFETCH_TOP_N,
+                 rate_per_minute=PREFETCH_RATE_PER_MINUTE, enabled=PREFETCH_ENABLED):
+        self.refresh = refresh
+        self.needs_refresh = needs_refresh
+        self.top_n = top_n
+        self.enabled = enabled
+        self.bucket = TokenBucket(rate_per_minute)
+        self.stations = {}  # station_key -> [score, last_request, station_name, station_id]
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.last_request = 0.0
+        self.thread = None
+        self.stats = {"refreshes": 0, "failures": 0, "throttled": 0, "idle_pauses": 0}
+
+    @staticmethod
+    def decayed(score, since, now):
+        return score * 0.5 ** ((now - since) / HALF_LIFE_SECONDS)
+
+    def record_request(self, station_key, station_name, station_id):
+        """Count one board request; starts the refresh thread on first use."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.stations.get(station_key)
+            if entry:
+                entry[0] = self.decayed(entry[0], entry[1], now) + 1
+                entry[1] = now
+            else:
+                if len(self.stations) >= MAX_TRACKED:
+                    coldest = min(self.stations, key=lambda k: self.decayed(*self.stations[k][:2], now))
+                    del self.stations[coldest]
+                self.stations[station_key] = [1.0, now, station_name, station_id]
+            self.last_request = now
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="board-prefetcher", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def hot_stations(self):
+        """Top stations by decayed score, most popular first."""
+        now = time.time()
+        with self.lock:
+            scored = [(self.decayed(score, since, now), key, name, station_id)
+                      for key, (score, since, name, station_id) in self.stations.items()]
+        scored = [s for s in scored if s[0] >= MIN_SCORE]
+        scored.sort(reverse=True, key=lambda s: s[0])
+        return scored[:self.top_n]
+
+    def run(self):
+        while True:
+            # Cleared before the idleness check, so a request arriving in
+            # between leaves the event set and the wait returns at once
+            self.wakeup.clear()
+            if time.time() - self.last_request > IDLE_SECONDS:
+                # Nobody is looking at boards; sleep until the next request
+                self.stats["idle_pauses"] += 1
+                self.wakeup.wait()
+                continue
+            for _, station_key, station_name, station_id in self.hot_stations():
+                if not self.needs_refresh(station_key):
+                    continue
+                if not self.bucket.take():
+                    self.stats["throttled"] += 1
+                    break
+                try:
+                    self.refresh(station_key, station_name, station_id)
+                    self.stats["refreshes"] += 1
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    print(f"Prefetch of {station_name} failed: {e}")
+            time.sleep(TICK_SECONDS)
+
+    def get_stats(self):
+        """Refresh counters and the current hot list for diagnostics."""
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "tracked_stations": len(self.stations),
+            "budget_per_minute": self.bucket.capacity,
+            "hot": [{"station": name, "score": round(score, 2)} for score, _, name, _ in self.hot_stations()],
+        }
@@ -0,0 +1,165 @@
+"""
+Delay Projection - planned-vs-live delay projection over the static timetable
+
+Scraped train pages show a delay only for the stops the train has reached;
+the parsers carry the last one forward unchanged, and ``get_train`` then
+replaces those carried values with the projections made here.  Planned
+timetables, though, contain recovery margins: running times are padded by a
+few percent and dwell times are longer than a train needs to stop.  A late train eats
+into those margins, so its delay shrinks along the route.
+
+Given the last observed delay of a train at one of its stops, the delay at
+each later stop is projected as::
+
+    arrival delay   = observed - recoverable slack up to the arrival
+    departure delay = arrival delay - recoverable dwell at the stop
+
+floored at zero (trains do not leave early).  Recoverable slack is
+``RUNNING_RECOVERY`` of each planned running time plus each dwell beyond
+``MIN_DWELL_SECONDS``.  Slack per stop is computed once per timetable index
+with NumPy straight from its typed arrays; projecting any number of trains
+is then one gather and one segmented cumulative sum over all their
+remaining stops.
+
+Environment:
+  CFR_RUNNING_RECOVERY_PERCENT  share of a planned running time a late train
+                                can make up (default 5)
+"""
+
+import os
+import threading
+
+import numpy as np
+from cachetools import LRUCache
+
+from src.StationSearch import fold
+
+RUNNING_RECOVERY = float(os.environ.get('CFR_RUNNING_RECOVERY_PERCENT', '5')) / 100
+
+# Shortest dwell a train needs at a stop
+MIN_DWELL_SECONDS = 60
+
+_slack = LRUCache(maxsize=2)
+_slack_lock = threading.Lock()
+
+
+def slack(index):
+    """``(running, dwell)`` recoverable seconds per stop position of ``index``.
+
+    ``running[i]`` is the slack on the way into stop ``i`` (zero at a
+    train's origin) and ``dwell[i]`` the slack while standing at it (zero at
+    the origin, the destination and passing points).
+    """
+    with _slack_lock:
+        cached = _slack.get(id(index))
+        # The entry holds the index, so its id cannot be reused while cached
+        if cached is not None and cached[0] is index:
+            return cached[1]
+
+    arrivals = np.frombuffer(index.stop_arrivals, dtype=np.int32).astype(np.float64)
+    departures = np.frombuffer(index.stop_departures, dtype=np.int32).astype(np.float64)
+    offsets = np.frombuffer(index.stop_offsets, dtype=np.uint32).astype(np.int64)
+    first = np.zeros(len(arrivals), dtype=bool)
+    last = np.zeros(len(arrivals), dtype=bool)
+    first[offsets[:-1][offsets[:-1] < offsets[1:]]] = True
+    last[offsets[1:][offsets[:-1] < offsets[1:]] - 1] = True
+
+    # Origins have no arrival and destinations no departure (NO_TIME).
+    # Whole seconds keep the cumulative sums exact.
+    running = np.zeros(len(arrivals))
+    running[1:] = np.maximum(np.floor(RUNNING_RECOVERY * (arrivals[1:] - departures[:-1])), 0)
+    running[first] = 0
+    dwell = np.maximum(departures - arrivals - MIN_DWELL_SECONDS, 0)
+    dwell[first | last] = 0
+
+    with _slack_lock:
+        _slack[id(index)] = (index, (running, dwell))
+    return running, dwell
+
+
+def project(index, observations):
+    """Projected delays after each observation, in one pass over all of them.
+
+    ``observations`` are ``(train, stop position, delay minutes)`` with the
+    delay observed on leaving that stop.  Returns, per observation, a pair
+    of integer arrays of whole minutes: arrival and departure delays at the
+    train's following stops, in route order.
+    """
+    if not observations:
+        return []
+    running, dwell = slack(index)
+    offsets = np.frombuffer(index.stop_offsets, dtype=np.uint32).astype(np.int64)
+    trains = np.array([o[0] for o in observations], dtype=np.int64)
+    starts = offsets[trains] + np.array([o[1] for o in observations], dtype=np.int64) + 1
+    lengths = np.maximum(offsets[trains + 1] - starts, 0)
+    delays = np.array([o[2] for o in observations], dtype=np.float64) * 60
+
+    # Stop positions of every remaining stop of every observed train, back to back
+    total = int(lengths.sum())
+    segment_starts = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - segment_starts, lengths) + np.arange(total)
+
+    # Slack used up by the departure from each stop, cumulated per train:
+    # a running total over everything minus the total before each train
+    step = running[positions] + dwell[positions]
+    used = np.cumsum(step)
+    before = np.concatenate(([0.0], used))[segment_starts]
+    used -= np.repeat(before, lengths)
+    observed = np.repeat(delays, lengths)
+    departure_delays = np.rint(np.maximum(observed - used, 0) / 60).astype(np.int64)
+    arrival_delays = np.rint(np.maximum(observed - used + dwell[positions], 0) / 60).astype(np.int64)
+
+    bounds = np.cumsum(lengths)[:-1]
+    return list(zip(np.split(arrival_delays, bounds), np.split(departure_delays, bounds)))
+
+
+def _route_positions(planned, train, stops):
+    """Position on the planned route of ``train`` of each scraped stop, matched by name in order; None if absent."""
+    index = planned.index
+    route = [fold(planned.station_name(index.stop_stations[stop])) for stop in index.stops(train)]
+    positions = []
+    position = 0
+    for stop in stops:
+        name = fold(stop.get('station_name', ''))
+        # Infofer drops suffixes such as "Gr.A" that the dataset keeps
+        found = next((p for p in range(position, len(route)) if name and
+                      (route[p] == name or route[p].startswith(name + ' ') or name.startswith(route[p] + ' '))),
+                     None)
+        positions.append(found)
+        if found is not None:
+            position = found
+    return positions, len(route)
+
+
+def observe(planned, train, stops):
+    """``(stop position, delay)`` of the last stop of scraped ``stops`` whose delay was shown, or None.
+
+    Stops without a ``delay_observed`` flag count as observed.
+    """
+    found = None
+    for stop, position in zip(stops, _route_positions(planned, train, stops)[0]):
+        if position is not None and stop.get('delay_observed', True) and stop.get('delay') is not None:
+            found = (position, int(stop['delay']))
+    return found
+
+
+def project_stops(planned, train, stops):
+    """Scraped ``stops`` with carried-forward delays replaced by projected ones.
+
+    Stops after the last observed delay get the projected departure delay
+    (arrival delay at the destination) and ``delay_source: projected``.
+    Returns a new list; ``stops`` is not modified.
+    """
+    observation = observe(planned, train, stops)
+    if observation is None:
+        return stops
+    observed_at, delay = observation
+    arrival_delays, departure_delays = project(planned.index, [(train, observed_at, delay)])[0]
+    positions, route_length = _route_positions(planned, train, stops)
+    projected = []
+    for stop, position in zip(stops, positions):
+        if position is not None and position > observed_at and not stop.get('delay_observed', True):
+            delays = arrival_delays if position == route_length - 1 else departure_delays
+            stop = {**stop, 'delay': int(delays[position - observed_at - 1]), 'delay_source': 'projected'}
+        projected.append(stop)
+    return projected
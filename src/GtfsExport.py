@@ -0,0 +1,278 @@
+"""
+GTFS Export - the imported timetable as a GTFS static feed
+
+Writes a zip with ``agency``, ``stops``, ``routes``, ``trips``,
+``stop_times``, ``calendar``, ``calendar_dates`` and ``feed_info``.  Every
+file is written as CSV rows from generators over SQLite cursors on the
+timetable store, straight into the zip, so memory does not grow with the
+network; ``stop_times`` pairs each train with its stops by walking trains
+and stops in id order side by side.
+
+Ids stay the same across imports of unchanged data:
+
+* ``stop_id``    - the CFR station code
+* ``agency_id``  - the dataset's operator code, named as on Infofer's boards
+* ``route_id``   - the train number (seasonal variants share a route)
+* ``trip_id``    - train number and the start of the train's content hash
+                   (see ``TimetableImporter.train_hash``), so a trip keeps its
+                   id until that train changes
+* ``service_id`` - a digest of the dates a train runs on
+
+Trains run on arbitrary days, not weekly patterns.  Each distinct set of
+running days (taken from ``TimetableIndex.running_days``) becomes one
+service whose ``calendar`` row has the weekdays it runs on most weeks, with
+``calendar_dates`` adding and removing the days that differ.  Trains that
+never run are left out.  Passing points are kept as stops with no pickup
+or drop-off.  The dataset has no coordinates, so ``stop_lat``/``stop_lon``
+are empty.
+
+The feed's ``feed_version`` is the dataset version, and ``ensure`` rewrites
+the zip only when the dataset has changed since it was written.
+"""
+
+import csv
+import functools
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from datetime import date
+
+import numpy as np
+
+from src import TimetableImporter, TimetableIndex
+
+TIMEZONE = 'Europe/Bucharest'
+AGENCY_URL = 'https://mersultrenurilor.infofer.ro'
+
+# GTFS route_type for rail
+ROUTE_TYPE_RAIL = 2
+
+_export_lock = threading.Lock()
+
+
+def gtfs_path(db_path):
+    """GTFS zip that belongs to a store."""
+    return os.path.splitext(db_path)[0] + '.gtfs.zip'
+
+
+@functools.lru_cache(maxsize=1024)
+def _gtfs_date(ordinal):
+    return date.fromordinal(ordinal).strftime('%Y%m%d')
+
+
+def _gtfs_time(seconds):
+    # Hours go past 24 for stops after midnight of the service day
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def services(index):
+    """``(service per train, services)`` from the index's running days.
+
+    ``service per train`` holds, per index train, a position in
+    ``services`` or -1 for trains that never run; each service is
+    ``(service_id, running day ordinals)``.
+    """
+    first_day, day_count = index.calendar_span[0], index.calendar_span[1]
+    service_of = np.full(index.train_count, -1, dtype=np.int64)
+    if not day_count or not index.train_count:
+        return service_of, []
+    days = np.frombuffer(index.running_days, dtype=np.uint8).reshape(day_count, index.train_bytes)
+    # One row of packed day bits per train
+    by_train = np.packbits(np.unpackbits(days, axis=1, bitorder='little')[:, :index.train_count].T,
+                           axis=1, bitorder='little')
+    patterns, inverse = np.unique(by_train, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    found = []
+    for position, pattern in enumerate(patterns):
+        running = np.flatnonzero(np.unpackbits(pattern, bitorder='little')[:day_count])
+        if not len(running):
+            continue
+        ordinals = running + first_day
+        digest = hashlib.sha1(np.asarray(ordinals, dtype='<i8').tobytes()).hexdigest()[:12]
+        service_of[inverse == position] = len(found)
+        found.append((f"s{digest}", ordinals))
+    return service_of, found
+
+
+def _calendar(ordinals):
+    """``(weekday flags, start, end, added, removed)`` for a set of running day ordinals.
+
+    A weekday is on when the service runs on more than half of those
+    weekdays between its first and last day.
+    """
+    start, end = int(ordinals[0]), int(ordinals[-1])
+    runs = np.zeros(end - start + 1, dtype=bool)
+    runs[ordinals - start] = True
+    weekdays = (np.arange(len(runs)) + date.fromordinal(start).weekday()) % 7
+    flags = np.bincount(weekdays[runs], minlength=7) * 2 > np.bincount(weekdays, minlength=7)
+    expected = flags[weekdays]
+    added = np.flatnonzero(runs & ~expected) + start
+    removed = np.flatnonzero(~runs & expected) + start
+    return flags, start, end, added, removed
+
+
+def _trips(conn, index, service_of):
+    """``(store train id, trip_id, route_id, service)`` of running trains, in id order.
+
+    Identical trains under one number (the same hash) are told apart by
+    their order in the store.
+    """
+    try:
+        rows = conn.execute('SELECT id, number, hash, ROW_NUMBER() OVER (PARTITION BY number, hash ORDER BY id) '
+                            'FROM trains ORDER BY id')
+    except sqlite3.OperationalError:
+        raise RuntimeError("The store predates per-train hashes; run a full import_timetable.py once")
+    for train, (train_id, number, train_hash, copy) in enumerate(rows):
+        if index.train_ids[train] != train_id:
+            raise RuntimeError("The store's timetable index is out of date; run a full import_timetable.py")
+        if service_of[train] < 0:
+            continue
+        trip_id = f"{number}-{train_hash[:10]}" + (f"-{copy}" if copy > 1 else "")
+        yield train_id, trip_id, number, int(service_of[train])
+
+
+def _agency_rows(conn):
+    for (operator,) in conn.execute('SELECT code FROM operators ORDER BY code'):
+        yield operator, TimetableIndex.operator_name(operator), AGENCY_URL, TIMEZONE, 'ro'
+
+
+def _stop_rows(conn):
+    """Every station a train stops at; stations the dataset gives no name are named by their code."""
+    for code, name in conn.execute('SELECT stops.station, stations.name FROM (SELECT DISTINCT station FROM stops) '
+                                   'AS stops LEFT JOIN stations ON stations.code = stops.station ORDER BY 1'):
+        yield code, name or str(code), '', ''
+
+
+def _route_rows(conn):
+    for number, category, operator in conn.execute(
+            'SELECT number, MIN(category), MIN(operator) FROM trains GROUP BY number ORDER BY number'):
+        yield number, operator, f"{category or ''} {number}".strip(), ROUTE_TYPE_RAIL
+
+
+def _trip_rows(conn, index, service_of, found):
+    for _, trip_id, route_id, service in _trips(conn, index, service_of):
+        yield route_id, found[service][0], trip_id
+
+
+def _stop_time_rows(conn, index, service_of):
+    """Stops of each running train, merged with the trains in id order."""
+    trips = _trips(conn, index, service_of)
+    trip = next(trips, None)
+    stops = conn.execute('SELECT train, seq, station, arrival, departure, distance FROM stops ORDER BY train, seq')
+    for train_id, seq, station, arrival, departure, distance in stops:
+        while trip is not None and trip[0] < train_id:
+            trip = next(trips, None)
+        if trip is None:
+            break
+        if trip[0] != train_id:
+            continue
+        # Passing points: no dwell, and not the origin or destination
+        passing = arrival == departure and arrival is not None
+        arrival = departure if arrival is None else arrival
+        departure = arrival if departure is None else departure
+        yield (trip[1], _gtfs_time(arrival), _gtfs_time(departure), station, seq,
+               1 if passing else 0, 1 if passing else 0, distance)
+
+
+def _calendar_rows(found):
+    for service_id, ordinals in found:
+        flags, start, end, _, _ = _calendar(ordinals)
+        yield (service_id, *flags.astype(int).tolist(), _gtfs_date(start), _gtfs_date(end))
+
+
+def _calendar_date_rows(found):
+    for service_id, ordinals in found:
+        _, _, _, added, removed = _calendar(ordinals)
+        for ordinal in added:
+            yield service_id, _gtfs_date(int(ordinal)), 1
+        for ordinal in removed:
+            yield service_id, _gtfs_date(int(ordinal)), 2
+
+
+def _write_csv(feed, name, header, rows):
+    """Write ``rows`` as ``name`` in the open zip ``feed``; returns how many."""
+    count = 0
+    with feed.open(name, 'w', force_zip64=True) as raw, \
+            io.TextIOWrapper(raw, encoding='utf-8', newline='') as text:
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def export(db_path=None, path=None):
+    """Write the store at ``db_path`` as a GTFS zip at ``path``, atomically replacing any older one.
+
+    Returns a report: the dataset version, rows per file, zip size and seconds taken.
+    """
+    db_path = db_path or TimetableImporter.TIMETABLE_DB_FILE
+    path = path or gtfs_path(db_path)
+    started = time.time()
+    conn = TimetableImporter.connect(db_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        index = TimetableIndex.load(conn) or TimetableIndex.build(conn)
+        service_of, found = services(index)
+        feed_start = min((int(ordinals[0]) for _, ordinals in found), default=None)
+        feed_end = max((int(ordinals[-1]) for _, ordinals in found), default=None)
+        files = [
+            ('agency.txt', ('agency_id', 'agency_name', 'agency_url', 'agency_timezone', 'agency_lang'),
+             _agency_rows(conn)),
+            ('stops.txt', ('stop_id', 'stop_name', 'stop_lat', 'stop_lon'), _stop_rows(conn)),
+            ('routes.txt', ('route_id', 'agency_id', 'route_short_name', 'route_type'), _route_rows(conn)),
+            ('trips.txt', ('route_id', 'service_id', 'trip_id'), _trip_rows(conn, index, service_of, found)),
+            ('stop_times.txt', ('trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence',
+                                'pickup_type', 'drop_off_type', 'shape_dist_traveled'),
+             _stop_time_rows(conn, index, service_of)),
+            ('calendar.txt', ('service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday',
+                              'sunday', 'start_date', 'end_date'), _calendar_rows(found)),
+            ('calendar_dates.txt', ('service_id', 'date', 'exception_type'), _calendar_date_rows(found)),
+            ('feed_info.txt', ('feed_publisher_name', 'feed_publisher_url', 'feed_lang', 'feed_start_date',
+                               'feed_end_date', 'feed_version'),
+             [('SNTFC timetable via data.gov.ro', AGENCY_URL, 'ro',
+               _gtfs_date(feed_start) if feed_start else '', _gtfs_date(feed_end) if feed_end else '',
+               index.version)]),
+        ]
+        rows = {}
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as feed:
+            for name, header, generator in files:
+                rows[name] = _write_csv(feed, name, header, generator)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+    return {"dataset": index.version, "path": path, "rows": rows, "bytes": os.path.getsize(path),
+            "seconds": round(time.time() - started, 2)}
+
+
+def feed_version(path):
+    """Dataset version a GTFS zip was written from, or None when there is no readable one."""
+    try:
+        with zipfile.ZipFile(path) as feed, feed.open('feed_info.txt') as raw:
+            return next(csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8')))['feed_version']
+    except (OSError, KeyError, StopIteration, zipfile.BadZipFile):
+        return None
+
+
+def ensure(version, db_path=None, path=None):
+    """Path of a GTFS zip of the current dataset ``version``, exporting first when the zip is older."""
+    db_path = db_path or TimetableImporter.TIMETABLE_DB_FILE
+    path = path or gtfs_path(db_path)
+    if feed_version(path) == version:
+        return path
+    with _export_lock:
+        if feed_version(path) != version:
+            report = export(db_path, path)
+            print(f"Exported GTFS feed of dataset {report['dataset']} in {report['seconds']}s "
+                  f"({report['bytes'] / 1e6:.1f} MB)")
+    return path
@@ -0,0 +1,290 @@
+"""
+Journey Planner - round-based connection scan over the planned timetable
+
+A connection is one train running between two consecutive stops.  For each
+service day the connections of every train running that day are built once
+into parallel arrays sorted by departure time, with per-station and per-trip
+indexes into them, and kept for a few days.
+
+A query works in rounds, as in RAPTOR: round ``k`` finds the earliest arrival
+at every station using at most ``k`` changes of train.  It boards trips only
+at stations that improved in round ``k - 1`` (found by bisecting that
+station's departures) and rides each boarded trip once from its earliest
+boarding point.  A round adds a journey to the result when it arrives
+strictly earlier than every journey with fewer changes, so the result is the
+Pareto set over arrival time and number of changes.  Nothing departing after
+the best arrival found so far is looked at.
+
+Changing trains needs ``MIN_TRANSFER_SECONDS`` at a station, or
+``HUB_TRANSFER_SECONDS`` at busy stations with long walks between
+platforms.  Staying on the same train needs no time.  Trains that started
+the day before and are still running after midnight are included;
+journeys can run past midnight on the trains of the service day, but never
+board a train of the next day.
+
+Given the last observed delay of trains (see ``DelayProjection``), legs also
+get projected departure and arrival delays; the search itself stays on
+planned times.
+
+Environment:
+  CFR_MIN_TRANSFER_MINUTES  minimum change time at a station (default 5)
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from cachetools import LRUCache
+
+from src import DelayProjection, TimetableIndex
+
+DAY = 86400
+
+MIN_TRANSFER_SECONDS = int(os.environ.get('CFR_MIN_TRANSFER_MINUTES', '5')) * 60
+HUB_TRANSFER_SECONDS = 10 * 60
+
+# Stations with at least this many train calls on the service day use the hub change time
+HUB_MIN_CALLS = 150
+
+# Most changes of train considered
+MAX_TRANSFERS = 4
+
+_days = LRUCache(maxsize=3)
+_days_lock = threading.Lock()
+
+
+class DayConnections:
+    """All connections of one service day, sorted by departure time."""
+
+    def __init__(self, planned, service_day):
+        index = planned.index
+        stations, arrivals, departures = index.stop_stations, index.stop_arrivals, index.stop_departures
+        connections = []
+        # Calls per station of the trains starting a run on this day
+        calls = [0] * index.station_count
+        for offset in (0, 1):
+            start_day = service_day - timedelta(days=offset)
+            shift = offset * DAY
+            for train in TimetableIndex.mask_members(index.trains_on(start_day)):
+                # Passing points are not stops: connect each stop to the next one
+                stops = index.stops(train)
+                stopping = [stop for stop in stops if index.is_call(stop, stops.start, stops.stop - 1)]
+                if not offset:
+                    for stop in stopping:
+                        calls[stations[stop]] += 1
+                # Yesterday's run of a train is a different trip than today's
+                trip = ~train if offset else train
+                for here, there in zip(stopping, stopping[1:]):
+                    departure = departures[here] - shift
+                    if departure < 0:
+                        continue
+                    connections.append((departure, arrivals[there] - shift, stations[here], stations[there], trip))
+        connections.sort()
+        self.service_day = service_day
+        self.departures = [c[0] for c in connections]
+        self.arrivals = [c[1] for c in connections]
+        self.from_stations = [c[2] for c in connections]
+        self.to_stations = [c[3] for c in connections]
+        # Trips: train ids, bitwise-inverted for runs that started the day before
+        self.trips = [c[4] for c in connections]
+        # Per trip, its connection indices in route order, and each
+        # connection's position in that list
+        self.trip_connections = {}
+        self.positions = []
+        for c, trip in enumerate(self.trips):
+            legs = self.trip_connections.setdefault(trip, [])
+            self.positions.append(len(legs))
+            legs.append(c)
+        # Per station, the connections leaving it in departure order
+        self.station_departures = {}
+        self.station_connections = {}
+        for c, station in enumerate(self.from_stations):
+            self.station_departures.setdefault(station, []).append(self.departures[c])
+            self.station_connections.setdefault(station, []).append(c)
+        self.transfer_seconds = [
+            HUB_TRANSFER_SECONDS if count >= HUB_MIN_CALLS else MIN_TRANSFER_SECONDS for count in calls
+        ]
+
+    def __len__(self):
+        return len(self.departures)
+
+
+def connections_for(planned, service_day):
+    """Connections for a ``date``, built once per planned timetable and day."""
+    key = (id(planned), service_day)
+    with _days_lock:
+        cached = _days.get(key)
+        # The entry holds the timetable, so its id cannot be reused while cached
+        if cached is not None and cached[0] is planned:
+            return cached[1]
+    day = DayConnections(planned, service_day)
+    with _days_lock:
+        _days[key] = (planned, day)
+    return day
+
+
+def _scan(day, origin, target, depart_after, max_transfers):
+    """Pareto journeys as ``(changes, legs)``; a leg is a (board, alight) connection index pair."""
+    departures, arrivals, to_stations, trips = day.departures, day.arrivals, day.to_stations, day.trips
+    positions, trip_connections = day.positions, day.trip_connections
+    never = float('inf')
+
+    # previous: earliest arrival per station with one change fewer than this
+    # round allows; pointers[k]: the leg reaching each station in round k - 1
+    previous = {origin: depart_after}
+    pointers = [{}]
+    # Trips boardable from stations that did not improve were already
+    # boarded a round earlier, so each round boards only at improved ones
+    improved = {origin: depart_after}
+    results = []
+    best = never
+    for changes in range(max_transfers + 1):
+        # Earliest boardable connection of every trip leaving an improved station
+        boarding = {}
+        for station, arrival in improved.items():
+            if station != origin:
+                arrival += day.transfer_seconds[station]
+            times = day.station_departures.get(station, ())
+            connections = day.station_connections.get(station, ())
+            for i in range(bisect_left(times, arrival), len(times)):
+                if times[i] >= best:
+                    break
+                c = connections[i]
+                trip = trips[c]
+                if trip not in boarding or positions[c] < positions[boarding[trip]]:
+                    boarding[trip] = c
+
+        # Ride each boarded trip onwards; no changes within a round, so the
+        # order trips are ridden in does not matter
+        reached = dict(previous)
+        pointer = dict(pointers[-1])
+        for trip, board in boarding.items():
+            legs = trip_connections[trip]
+            for c in legs[positions[board]:]:
+                if departures[c] >= best:
+                    break
+                station = to_stations[c]
+                if arrivals[c] < reached.get(station, never):
+                    reached[station] = arrivals[c]
+                    pointer[station] = (board, c)
+                    if station == target:
+                        best = arrivals[c]
+        pointers.append(pointer)
+
+        if reached.get(target, never) < previous.get(target, never):
+            results.append((changes, _legs(day, pointers, origin, target)))
+        improved = {station: arrival for station, arrival in reached.items()
+                    if arrival < previous.get(station, never) and arrival < best}
+        if not improved:
+            break
+        previous = reached
+    return results
+
+
+def _legs(day, pointers, origin, target):
+    legs = []
+    station = target
+    round_pointers = len(pointers) - 1
+    while station != origin:
+        board, alight = pointers[round_pointers][station]
+        legs.append((board, alight))
+        # The train was boarded from a station reached one round earlier
+        station = day.from_stations[board]
+        round_pointers -= 1
+    return legs[::-1]
+
+
+def plan(planned, origin, target, service_date, depart_after=0, max_transfers=MAX_TRANSFERS, observe=None):
+    """Journeys between two station ids of ``planned`` on a DD.MM.YYYY service date.
+
+    ``depart_after`` is seconds after midnight.  Returns the Pareto set,
+    fewest changes first; each later journey arrives earlier and changes
+    trains more often.  ``observe(train)`` may return the ``(stop position,
+    delay minutes)`` last seen for a train running that day; legs on such
+    trains get projected delays.
+    """
+    service_day = datetime.strptime(service_date, "%d.%m.%Y")
+    if origin == target:
+        return []
+    day = connections_for(planned, service_day.date())
+    results = _scan(day, origin, target, depart_after, max_transfers)
+    delays = _projected_delays(planned, day, results, observe) if observe else {}
+    return [_journey(planned, day, service_day, changes, legs, delays) for changes, legs in results]
+
+
+def _stop_position(index, train, station, seconds, times):
+    """Position in the route of ``train`` of its stop at ``station`` at ``seconds`` in ``times``."""
+    stops = index.stops(train)
+    for stop in stops:
+        if index.stop_stations[stop] == station and times[stop] == seconds:
+            return stop - stops.start
+    return None
+
+
+def _projected_delays(planned, day, results, observe):
+    """``{(board, alight): (departure delay, arrival delay)}`` for legs on observed trains.
+
+    Runs that started the day before are skipped, as are legs the train
+    has already left.  All observed trains are projected in one pass.
+    """
+    index = planned.index
+    legs = {leg for _, journey_legs in results for leg in journey_legs if day.trips[leg[0]] >= 0}
+    observations = {}
+    for train in {day.trips[board] for board, _ in legs}:
+        observation = observe(train)
+        if observation is not None:
+            observations[train] = observation
+    trains = list(observations)
+    projections = dict(zip(trains, DelayProjection.project(
+        index, [(train, *observations[train]) for train in trains])))
+
+    delays = {}
+    for board, alight in legs:
+        train = day.trips[board]
+        if train not in projections:
+            continue
+        observed_at, observed_delay = observations[train]
+        arrival_delays, departure_delays = projections[train]
+        board_at = _stop_position(index, train, day.from_stations[board], day.departures[board],
+                                  index.stop_departures)
+        alight_at = _stop_position(index, train, day.to_stations[alight], day.arrivals[alight],
+                                   index.stop_arrivals)
+        if board_at is None or alight_at is None or board_at < observed_at:
+            continue
+        departure = observed_delay if board_at == observed_at else int(departure_delays[board_at - observed_at - 1])
+        delays[(board, alight)] = (departure, int(arrival_delays[alight_at - observed_at - 1]))
+    return delays
+
+
+def _journey(planned, day, service_day, changes, legs, delays):
+    shaped = []
+    for board, alight in legs:
+        trip = day.trips[board]
+        number, category, operator = planned.train_label(trip if trip >= 0 else ~trip)
+        departure = service_day + timedelta(seconds=day.departures[board])
+        arrival = service_day + timedelta(seconds=day.arrivals[alight])
+        leg = {
+            "train_id": f"{category}{number}",
+            "train_number": f"{category} {number}",
+            "operator": operator,
+            "from": planned.station_name(day.from_stations[board]),
+            "to": planned.station_name(day.to_stations[alight]),
+            "departure_time": departure.strftime("%H:%M"),
+            "arrival_time": arrival.strftime("%H:%M"),
+            "departure_timestamp": departure.isoformat(),
+            "arrival_timestamp": arrival.isoformat(),
+        }
+        if (board, alight) in delays:
+            leg["departure_delay"], leg["arrival_delay"] = delays[(board, alight)]
+            leg["delay_source"] = "projected"
+        shaped.append(leg)
+    departure = datetime.fromisoformat(shaped[0]["departure_timestamp"])
+    arrival = datetime.fromisoformat(shaped[-1]["arrival_timestamp"])
+    return {
+        "changes": changes,
+        "departure_timestamp": shaped[0]["departure_timestamp"],
+        "arrival_timestamp": shaped[-1]["arrival_timestamp"],
+        "duration_minutes": int((arrival - departure).total_seconds() // 60),
+        "legs": shaped,
+    }
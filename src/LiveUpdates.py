@@ -0,0 +1,150 @@
+"""
+Live Updates - shared upstream pollers for Server-Sent Events streams
+
+Every SSE client watching the same key (a train number or a station board)
+subscribes to a single poller thread.  The poller fetches from upstream on a
+fixed interval, pushes an event only when the parsed data actually changed and
+stops as soon as its last subscriber disconnects, so upstream load scales with
+the number of watched keys instead of the number of viewers.
+"""
+
+import json
+import hashlib
+import queue
+import threading
+import time
+
+# Seconds between keep-alive comments sent to idle subscribers
+HEARTBEAT_SECONDS = 15
+
+# Events buffered per subscriber before the oldest one is dropped
+SUBSCRIBER_QUEUE_SIZE = 8
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def fingerprint(data):
+    """Stable hash of a JSON-serialisable value, used for change detection."""
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+class Poller:
+    """Polls one upstream key and fans changes out to its subscribers."""
+
+    def __init__(self, key, fetch, interval, extract=None):
+        self.key = key
+        self.fetch = fetch
+        self.interval = interval
+        # Part of the fetched payload that decides whether anything changed
+        self.extract = extract or (lambda payload: payload)
+        self.subscribers = set()
+        self.last_event = None
+        self.last_fingerprint = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"poller-{key}", daemon=True)
+
+    def broadcast(self, event):
+        # Request threads subscribe and unsubscribe while this runs
+        with _pollers_lock:
+            self.last_event = event
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow consumer: drop its oldest event, keep the newest state
+                try:
+                    q.get_nowait()
+                    q.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def poll_once(self):
+        try:
+            payload = self.fetch()
+        except Exception as e:
+            print(f"Poller {self.key} fetch failed: {e}")
+            # Report a failure streak once, not on every retry
+            if self.last_fingerprint != 'error':
+                self.last_fingerprint = 'error'
+                self.broadcast(('error', {"key": self.key, "message": str(e)}))
+            return
+
+        current = fingerprint(self.extract(payload))
+        if current != self.last_fingerprint:
+            self.last_fingerprint = current
+            self.broadcast(('update', payload))
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.poll_once()
+            if self.stopped.wait(self.interval):
+                break
+        print(f"Poller {self.key} stopped")
+
+
+def subscribe(key, fetch, interval, extract=None):
+    """Attach a new subscriber queue to the poller for ``key``.
+
+    The poller is created and started on the first subscription.  A late
+    subscriber immediately receives the last event the poller produced.
+    """
+    with _pollers_lock:
+        poller = _pollers.get(key)
+        if poller is None:
+            poller = Poller(key, fetch, interval, extract)
+            _pollers[key] = poller
+            poller.thread.start()
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        poller.subscribers.add(q)
+        if poller.last_event is not None:
+            q.put_nowait(poller.last_event)
+    return poller, q
+
+
+def unsubscribe(poller, q):
+    """Detach a subscriber; the poller stops once nobody is listening."""
+    with _pollers_lock:
+        poller.subscribers.discard(q)
+        if not poller.subscribers:
+            poller.stopped.set()
+            if _pollers.get(poller.key) is poller:
+                del _pollers[poller.key]
+
+
+def format_event(name, data):
+    """Serialise one SSE frame."""
+    body = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {name}\ndata: {body}\n\n"
+
+
+def event_stream(key, fetch, interval, extract=None):
+    """Generator producing the SSE body for one client.
+
+    Runs until the client disconnects, at which point the WSGI server closes
+    the generator and the subscription is released.
+    """
+    poller, q = subscribe(key, fetch, interval, extract)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                name, data = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield f": heartbeat {int(time.time())}\n\n"
+                continue
+            yield format_event(name, data)
+    finally:
+        unsubscribe(poller, q)
+
+
+def get_stats():
+    """Snapshot of active pollers for diagnostics."""
+    with _pollers_lock:
+        return {
+            "active_pollers": len(_pollers),
+            "subscribers": sum(len(p.subscribers) for p in _pollers.values()),
+            "keys": sorted(_pollers.keys())
+        }
@@ -0,0 +1,205 @@
+"""
+Payload Formats - response shaping for the train and timetable endpoints
+
+Helpers that trim payloads *before* they are handed to ``jsonify`` so the
+parts a client did not ask for are never encoded or sent:
+
+- ``?fields=a,b`` keeps only the listed keys, ``?exclude=a,b`` drops them
+- ``compact=1`` sends each train stop once and has branches refer to stops
+  by index instead of repeating them
+- ``?format=columnar`` turns a station board into parallel arrays
+"""
+
+from datetime import datetime
+
+# Keys kept on train payloads regardless of projection, so delta polling and
+# client-side bookkeeping keep working
+TRAIN_ALWAYS_KEYS = ('train_number', 'version', 'status', 'since')
+
+
+def parse_field_list(value):
+    """Parse a comma-separated query parameter into a set (None when absent)."""
+    if not value:
+        return None
+    fields = {part.strip() for part in value.split(',') if part.strip()}
+    return fields or None
+
+
+def project(payload, fields=None, exclude=None, always=()):
+    """Return a shallow copy of ``payload`` restricted to the requested keys."""
+    if fields is None and exclude is None:
+        return payload
+    return {
+        k: v for k, v in payload.items()
+        if k in always or ((fields is None or k in fields) and (exclude is None or k not in exclude))
+    }
+
+
+def project_rows(rows, fields=None, exclude=None):
+    """Apply :func:`project` to every row of a timetable list."""
+    if fields is None and exclude is None:
+        return rows
+    return [project(row, fields, exclude) for row in rows]
+
+
+def _stop_key(stop):
+    try:
+        return tuple(sorted(stop.items()))
+    except TypeError:
+        return repr(sorted(stop.items()))
+
+
+def compact_train_payload(payload):
+    """De-duplicate the stop lists of a train payload.
+
+    ``stations`` and ``stops`` carry the same list and every branch repeats
+    its stops in ``stations_data``.  The compact form keeps a single ``stops``
+    table (main route first, then any stops only found on other branches) and
+    replaces each branch's ``stations_data`` with ``stop_indexes`` into it.
+    """
+    if 'stops' not in payload:
+        return payload
+
+    stops = list(payload['stops'])
+    positions = {}
+    for i, stop in enumerate(stops):
+        positions.setdefault(_stop_key(stop), i)
+
+    branches = []
+    for branch in payload.get('branches', []):
+        indexes = []
+        for stop in branch.get('stations_data', []):
+            key = _stop_key(stop)
+            i = positions.get(key)
+            if i is None:
+                i = len(stops)
+                stops.append(stop)
+                positions[key] = i
+            indexes.append(i)
+        compact_branch = {k: v for k, v in branch.items() if k != 'stations_data'}
+        compact_branch['stop_indexes'] = indexes
+        branches.append(compact_branch)
+
+    compact = {k: v for k, v in payload.items() if k not in ('stations', 'stops', 'branches')}
+    compact['stops'] = stops
+    compact['branches'] = branches
+    compact['compact'] = True
+    return compact
+
+
+# Columnar station boards (?format=columnar); the layout is documented for
+# client authors in COLUMNAR_BOARDS.md
+COLUMNAR_VERSION = 1
+
+# Row flags packed into the 'flags' column
+FLAG_ORIGIN = 1
+FLAG_STOP = 2
+FLAG_DESTINATION = 4
+FLAG_REAL_DATA = 8
+FLAG_LIVE = 16
+_FLAG_KEYS = (('is_origin', FLAG_ORIGIN), ('is_stop', FLAG_STOP), ('is_destination', FLAG_DESTINATION),
+              ('real_data', FLAG_REAL_DATA), ('is_live', FLAG_LIVE))
+
+# Row keys that the columnar layout encodes or derives
+_COLUMNAR_KEYS = {'rank', 'train_id', 'train_number', 'operator', 'origin', 'destination', 'delay',
+                  'platform', 'arrival_time', 'departure_time', 'arrival_timestamp',
+                  'departure_timestamp'} | {key for key, _ in _FLAG_KEYS}
+
+
+class _Dictionary:
+    """Assigns small integer codes to repeated strings."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_board_columnar(rows, fields=None, exclude=None):
+    """Encode a station board as parallel arrays.
+
+    Ranks, operators and station names (origin and destination share one
+    dictionary) become integer codes, both timestamps become integer minutes
+    relative to ``base`` (midnight of the first timestamped row) and the five
+    boolean fields collapse into one ``flags`` bitmask.  ``train_id`` and the
+    formatted ``HH:MM`` times are derived by the decoder and not sent.  Keys
+    outside the known row layout are passed through as plain columns.
+
+    ``fields`` / ``exclude`` are row keys as for :func:`project`; the rows
+    are encoded whole and a column is kept when any key it decodes to is
+    selected, so derived keys such as ``departure_time`` still get their
+    source column.
+    """
+    present = set()
+    for row in rows:
+        present.update(row.keys())
+
+    def wanted(*keys):
+        return any((fields is None or key in fields) and (exclude is None or key not in exclude) for key in keys)
+
+    arrivals = [_parse_timestamp(row.get('arrival_timestamp')) for row in rows]
+    departures = [_parse_timestamp(row.get('departure_timestamp')) for row in rows]
+    first = next((ts for pair in zip(departures, arrivals) for ts in pair if ts is not None), None)
+    base = first.replace(hour=0, minute=0, second=0, microsecond=0) if first else None
+
+    def minutes(ts):
+        if ts is None or base is None:
+            return None
+        if (ts.tzinfo is None) != (base.tzinfo is None):
+            return None
+        return int((ts - base).total_seconds() // 60)
+
+    ranks, operators, places = _Dictionary(), _Dictionary(), _Dictionary()
+    columns = {}
+    if 'train_number' in present and wanted('train_number', 'train_id'):
+        columns['train_number'] = [row.get('train_number') for row in rows]
+    if 'rank' in present and wanted('rank'):
+        columns['rank'] = [ranks.encode(row.get('rank')) for row in rows]
+    if 'operator' in present and wanted('operator'):
+        columns['operator'] = [operators.encode(row.get('operator')) for row in rows]
+    if 'origin' in present and wanted('origin'):
+        columns['origin'] = [places.encode(row.get('origin')) for row in rows]
+    if 'destination' in present and wanted('destination'):
+        columns['destination'] = [places.encode(row.get('destination')) for row in rows]
+    if ('arrival_timestamp' in present or 'arrival_time' in present) and \
+            wanted('arrival_timestamp', 'arrival_time'):
+        columns['arrival'] = [minutes(ts) for ts in arrivals]
+    if ('departure_timestamp' in present or 'departure_time' in present) and \
+            wanted('departure_timestamp', 'departure_time'):
+        columns['departure'] = [minutes(ts) for ts in departures]
+    if 'delay' in present and wanted('delay'):
+        columns['delay'] = [row.get('delay') for row in rows]
+    if 'platform' in present and wanted('platform'):
+        columns['platform'] = [row.get('platform') for row in rows]
+    if any(key in present for key, _ in _FLAG_KEYS) and wanted(*(key for key, _ in _FLAG_KEYS)):
+        columns['flags'] = [sum(bit for key, bit in _FLAG_KEYS if row.get(key)) for row in rows]
+    for key in sorted(present - _COLUMNAR_KEYS):
+        if wanted(key):
+            columns[key] = [row.get(key) for row in rows]
+
+    return {
+        'format': 'columnar',
+        'version': COLUMNAR_VERSION,
+        'count': len(rows),
+        'base': base.isoformat() if base else None,
+        'dictionaries': {
+            'rank': ranks.values,
+            'operator': operators.values,
+            'station': places.values,
+        },
+        'columns': columns,
+    }
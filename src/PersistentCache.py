@@ -0,0 +1,313 @@
+"""
+Persistent Cache - service-date tiered caching backed by SQLite
+
+How long scraped data stays valid depends on the service date it describes:
+
+* today   - live delays and platforms; the caller's short TTL applies and
+            nothing is written to disk
+* future  - the planned schedule, which rarely changes; kept for hours in
+            memory and on disk
+* past    - history that never changes; kept permanently on disk
+
+Disk entries live in a small SQLite database so they survive restarts.
+
+Environment:
+  CFR_CACHE_DB  path of the SQLite file (default ``cfr_cache.db``)
+"""
+
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from cachetools import TLRUCache
+
+CACHE_DB_FILE = os.environ.get('CFR_CACHE_DB', 'cfr_cache.db')
+
+# Seconds a future-date entry stays valid
+FUTURE_TTL = 6 * 3600
+
+# Seconds a past-date entry is kept in memory; the disk copy never expires
+PAST_MEMORY_TTL = 24 * 3600
+
+# Date formats accepted for ?date=, normalised to Infofer's DD.MM.YYYY
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+
+_db_lock = threading.Lock()
+_db_ready = False
+
+
+def normalize_date(date_str=None):
+    """Service date as DD.MM.YYYY; None or blank means today.
+
+    Accepts unpadded (1.3.2026) and ISO (2026-03-01) dates.  Anything else is
+    passed through unchanged and left for Infofer to reject.
+    """
+    if not date_str or not str(date_str).strip():
+        return datetime.now().strftime("%d.%m.%Y")
+    date_str = str(date_str).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).strftime("%d.%m.%Y")
+        except ValueError:
+            continue
+    return date_str
+
+
+def service_date_tier(service_date):
+    """'today', 'future' or 'past' for a DD.MM.YYYY date; unparseable dates count as today."""
+    try:
+        day = datetime.strptime(service_date, "%d.%m.%Y").date()
+    except (TypeError, ValueError):
+        return 'today'
+    today = datetime.now().date()
+    if day > today:
+        return 'future'
+    if day < today:
+        return 'past'
+    return 'today'
+
+
+def tier_ttl(service_date, live_ttl):
+    """Seconds an entry for ``service_date`` stays valid; None means forever.
+
+    Future-date entries never outlive the start of their service day, when
+    the board turns live and falls back to ``live_ttl``.
+    """
+    tier = service_date_tier(service_date)
+    if tier == 'past':
+        return None
+    if tier == 'future':
+        day_start = datetime.strptime(service_date, "%d.%m.%Y")
+        return max(1, min(FUTURE_TTL, (day_start - datetime.now()).total_seconds()))
+    return live_ttl
+
+
+def _connect():
+    global _db_ready
+    conn = sqlite3.connect(CACHE_DB_FILE, timeout=10)
+    if not _db_ready:
+        with _db_lock:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            ''')
+            conn.commit()
+            _db_ready = True
+    return conn
+
+
+def load(namespace, key):
+    """Stored value, or None when missing or expired."""
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                (namespace, key)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Persistent cache read failed ({namespace}/{key}): {e}")
+        return None
+    if not row or (row[1] is not None and row[1] < time.time()):
+        return None
+    return json.loads(row[0])
+
+
+def store(namespace, key, value, ttl=None):
+    """Store a JSON-serialisable value; ``ttl=None`` keeps it forever."""
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (namespace, key, json.dumps(value, ensure_ascii=False), now, now + ttl if ttl else None))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Persistent cache write failed ({namespace}/{key}): {e}")
+
+
+def load_blob(namespace, key):
+    """Stored bytes from :func:`store_blobs`, or None when missing or expired."""
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                (namespace, key)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Persistent cache read failed ({namespace}/{key}): {e}")
+        return None
+    if not row or (row[1] is not None and row[1] < time.time()) or not isinstance(row[0], bytes):
+        return None
+    return row[0]
+
+
+def store_blobs(namespace, items, expires_at=None):
+    """Store ``(key, bytes)`` pairs as they are, in one transaction; ``expires_at`` is a Unix time.
+
+    For values serialised ahead of time and served without decoding.
+    Returns how many were stored.
+    """
+    now = time.time()
+    rows = [(namespace, key, sqlite3.Binary(blob), now, expires_at) for key, blob in items]
+    try:
+        conn = _connect()
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Persistent cache write failed ({namespace}): {e}")
+        return 0
+    return len(rows)
+
+
+def purge_expired():
+    """Delete expired future-date entries; returns how many were removed."""
+    try:
+        conn = _connect()
+        try:
+            cursor = conn.execute('DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at < ?',
+                                  (time.time(),))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Persistent cache purge failed: {e}")
+        return 0
+
+
+def delete_matching(namespace, match):
+    """Delete the ``namespace`` entries whose key satisfies ``match(key)``; returns how many."""
+    try:
+        conn = _connect()
+        try:
+            keys = [(namespace, key) for (key,) in
+                    conn.execute('SELECT key FROM cache_entries WHERE namespace = ?', (namespace,))
+                    if match(key)]
+            conn.executemany('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', keys)
+            conn.commit()
+            return len(keys)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Persistent cache delete failed ({namespace}): {e}")
+        return 0
+
+
+class DateTieredCache:
+    """In-memory cache whose lifetime depends on the entry's service date.
+
+    Keys are ``(key, service_date)`` with ``service_date`` as DD.MM.YYYY.
+    Today's entries expire after ``live_ttl`` and stay in memory only; other
+    dates are also written to the ``namespace`` on disk and read back from
+    there after a restart.
+    """
+
+    def __init__(self, namespace, live_ttl, maxsize=200):
+        self.namespace = namespace
+        self.live_ttl = live_ttl
+        self.memory = TLRUCache(maxsize=maxsize, ttu=self._expires_at, timer=time.time)
+        self.lock = threading.Lock()
+        self.stats = {"disk_hits": 0, "disk_writes": 0}
+
+    def _expires_at(self, cache_key, value, now):
+        ttl = tier_ttl(cache_key[1], self.live_ttl)
+        return now + (PAST_MEMORY_TTL if ttl is None else ttl)
+
+    @staticmethod
+    def _disk_key(cache_key):
+        return f"{cache_key[0]}|{cache_key[1]}"
+
+    def get(self, cache_key):
+        """Value from memory, else from disk for non-today dates, else None."""
+        with self.lock:
+            value = self.memory.get(cache_key)
+        if value is not None or service_date_tier(cache_key[1]) == 'today':
+            return value
+        value = load(self.namespace, self._disk_key(cache_key))
+        if value is not None:
+            with self.lock:
+                self.stats["disk_hits"] += 1
+                self.memory[cache_key] = value
+        return value
+
+    def put(self, cache_key, value, persist=True):
+        """Remember a value; non-today dates are also written to disk when ``persist``."""
+        with self.lock:
+            self.memory[cache_key] = value
+        if persist and service_date_tier(cache_key[1]) != 'today':
+            store(self.namespace, self._disk_key(cache_key), value,
+                  ttl=tier_ttl(cache_key[1], self.live_ttl))
+            with self.lock:
+                self.stats["disk_writes"] += 1
+
+    def invalidate(self, match, persist=True):
+        """Drop entries for today and later whose ``(key, service_date)`` satisfies ``match``.
+
+        Past entries are history and are kept.  With ``persist`` the disk
+        copies go too; returns how many entries were dropped.
+        """
+        def current(key, service_date):
+            return service_date_tier(service_date) != 'past' and match(key, service_date)
+
+        with self.lock:
+            stale = [cache_key for cache_key in list(self.memory.keys()) if current(*cache_key)]
+            for cache_key in stale:
+                self.memory.pop(cache_key, None)
+        dropped = len(stale)
+        if persist:
+            dropped += delete_matching(self.namespace, lambda key: '|' in key and current(*key.rsplit('|', 1)))
+        return dropped
+
+    def __len__(self):
+        with self.lock:
+            return len(self.memory)
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "memory_entries": len(self.memory)}
+
+
+def date_tiered(namespace, live_ttl, maxsize=200):
+    """Decorator caching ``fn(key, date_str=None)`` per key and service date.
+
+    The wrapped function always receives the normalised DD.MM.YYYY date.
+    Exceptions are not cached.
+    """
+    def decorator(fn):
+        cache = DateTieredCache(namespace, live_ttl, maxsize)
+
+        @functools.wraps(fn)
+        def wrapper(key, date_str=None):
+            cache_key = (str(key), normalize_date(date_str))
+            value = cache.get(cache_key)
+            if value is None:
+                value = fn(key, cache_key[1])
+                cache.put(cache_key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -0,0 +1,260 @@
+"""
+Planned Timetable - station boards and train routes from the imported timetable
+
+Boards for other days than today are only Infofer rendering the planned
+schedule, which ``import_timetable.py`` already stored locally.  This module
+maps the store's snapshot (see ``TimetableSnapshot``), or loads its array
+index when there is no usable snapshot, and answers boards and train routes
+for any service date without an upstream call.
+
+Rows have the same shape as the scraped ones (see
+``StationTimetableGetter.parse_infofer_html`` and ``TrainPageGetter``), with
+``is_live`` False, no delay and ``data_source`` set to ``planned``.
+Intermediate points where a train does not dwell are passing points, not
+stops, and are left off boards.
+
+A train runs on a service date when the date is inside one of its
+``CalendarTren`` periods and, when the period has a ``Zile`` string of 0/1
+flags, the flag for that day (counted from the period start) is 1.  The
+calendars are decoded at import time into one bitset of trains per day (see
+``TimetableIndex``), so checking a train or a whole board is bit tests.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from src import TimetableImporter, TimetableIndex, TimetableSnapshot
+from src.StationSearch import QUERY_ALIASES, fold
+from src.TimetableIndex import NO_TIME
+
+DAY = 86400
+
+_load_lock = threading.Lock()
+_loaded = None  # (path, file identity, PlannedTimetable)
+_listeners = []
+
+
+def _clock(service_day, seconds):
+    """Datetime of ``seconds`` after midnight of ``service_day``; ``NO_TIME`` gives None."""
+    if seconds == NO_TIME:
+        return None
+    return service_day + timedelta(seconds=seconds)
+
+
+def _service_day(service_date=None):
+    """Midnight of a DD.MM.YYYY date (default today), or None when it does not parse."""
+    try:
+        day = datetime.strptime(service_date, "%d.%m.%Y") if service_date else datetime.now()
+    except ValueError:
+        return None
+    return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class PlannedTimetable:
+    """The timetable store's array index plus name lookups.
+
+    Stations and trains are the index's dense ids (see ``TimetableIndex``).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        # Dataset version; changes whenever the imported timetable does
+        self.version = index.version
+        self.station_ids = {code: station for station, code in enumerate(index.station_codes)}
+        self.station_by_name = {}
+        for station, name in enumerate(index.station_names):
+            self.station_by_name.setdefault(fold(name), station)
+        self.trains_by_number = {}
+        for train, number in enumerate(index.train_numbers):
+            self.trains_by_number.setdefault(number, []).append(train)
+
+    def find_station(self, station_id, station_name=None):
+        """Station id for a numeric CFR code or a station name, or None."""
+        if str(station_id).isdigit() and int(station_id) in self.station_ids:
+            return self.station_ids[int(station_id)]
+        for name in (station_name, station_id):
+            if name:
+                folded = fold(name)
+                station = self.station_by_name.get(folded)
+                if station is None:
+                    station = self.station_by_name.get(QUERY_ALIASES.get(folded))
+                if station is not None:
+                    return station
+        return None
+
+    def station_name(self, station):
+        return self.index.station_names[station]
+
+    def train_label(self, train):
+        """``(number, category, operator)`` of a train."""
+        index = self.index
+        return (index.train_numbers[train], index.categories[index.train_categories[train]],
+                index.operators[index.train_operators[train]])
+
+    def runs_on(self, train, day):
+        """Whether ``train`` starts a run on the ``date`` ``day``."""
+        return self.index.runs_on(train, day)
+
+    def train_runs(self, train_id, service_date=None):
+        """Whether a train number runs on a DD.MM.YYYY date; None when the timetable does not know it."""
+        trains = self.trains_by_number.get(''.join(c for c in str(train_id) if c.isdigit()))
+        if not trains:
+            return None
+        day = _service_day(service_date)
+        if day is None:
+            return None
+        return any(self.runs_on(train, day.date()) for train in trains)
+
+    def running_train(self, train_id, service_date=None):
+        """Id of the train with this number starting a run on a DD.MM.YYYY date, or None."""
+        number = ''.join(c for c in str(train_id) if c.isdigit())
+        day = _service_day(service_date)
+        if day is None:
+            return None
+        return next((t for t in self.trains_by_number.get(number, ()) if self.runs_on(t, day.date())), None)
+
+    def board(self, station_id, station_name=None, service_date=None):
+        """Planned board rows for a DD.MM.YYYY service date, or None for an unknown station or date.
+
+        Includes trains that started the day before and reach the station
+        after midnight.
+        """
+        station = self.find_station(station_id, station_name)
+        day = _service_day(service_date)
+        if station is None or day is None:
+            return None
+        index = self.index
+
+        rows = []
+        for days_after_start in (0, 1):
+            service_day = day - timedelta(days=days_after_start)
+            minutes = days_after_start * DAY // 60
+            for call in index.running_calls(station, service_day.date(), minutes, minutes + DAY // 60):
+                rows.append(self._board_row(index.call_trains[call], index.call_stops[call], service_day, station))
+        rows.sort(key=lambda x: x.get('departure_timestamp') or x.get('arrival_timestamp') or '')
+        return rows
+
+    def _board_row(self, train, position, service_day, station):
+        index = self.index
+        number, rank, operator = self.train_label(train)
+        stops = index.stops(train)
+        stop = stops[position]
+        arrival_at = _clock(service_day, index.stop_arrivals[stop])
+        departure_at = _clock(service_day, index.stop_departures[stop])
+        is_origin = position == 0
+        is_destination = position == len(stops) - 1
+        is_stop = not is_origin and not is_destination
+        route_name = self.station_name(index.stop_stations[stops[0] if is_destination else stops[-1]])
+        station_name = self.station_name(station)
+        return {
+            "rank": rank,
+            "train_id": f"{rank}{number}",
+            "train_number": f"{rank} {number}",
+            "operator": operator,
+            "origin": route_name if is_destination else station_name,
+            "destination": route_name if (is_origin or is_stop) else station_name,
+            "is_origin": is_origin,
+            "is_stop": is_stop,
+            "is_destination": is_destination,
+            "delay": 0,
+            "arrival_time": arrival_at.strftime("%H:%M") if arrival_at else "",
+            "departure_time": departure_at.strftime("%H:%M") if departure_at else "",
+            "arrival_timestamp": arrival_at.isoformat() if arrival_at else None,
+            "departure_timestamp": departure_at.isoformat() if departure_at else None,
+            "platform": "",
+            "real_data": False,
+            "is_live": False,
+            "data_source": "planned",
+        }
+
+    def train(self, train_id, service_date=None):
+        """Planned route of a train starting on a DD.MM.YYYY date, shaped like ``get_train``; or None."""
+        number = ''.join(c for c in str(train_id) if c.isdigit())
+        day = _service_day(service_date)
+        train = self.running_train(number, service_date)
+        if day is None or train is None:
+            return None
+
+        index = self.index
+        _, category, operator = self.train_label(train)
+        stops = index.stops(train)
+        stations_data = []
+        for stop in stops:
+            arrival = index.stop_arrivals[stop]
+            departure = index.stop_departures[stop]
+            arrival_at = _clock(day, arrival)
+            departure_at = _clock(day, departure)
+            stations_data.append({
+                'station_name': self.station_name(index.stop_stations[stop]),
+                'arrival_time': arrival_at.strftime("%H:%M") if arrival_at else None,
+                'departure_time': departure_at.strftime("%H:%M") if departure_at else None,
+                'delay': 0,
+                'platform': None,
+                'dwell_minutes': (departure - arrival) // 60 if NO_TIME not in (arrival, departure) else 0,
+                'is_stop': index.is_call(stop, stops.start, stops.stop - 1),
+            })
+        return {
+            'train_number': number,
+            'stations_data': stations_data,
+            'branches': [{'label': 'Rută', 'stations_data': stations_data}],
+            'alerts': [],
+            'operator': operator,
+            'category': category,
+            'data_source': 'planned_timetable'
+        }
+
+
+def _identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def load(db_path=None):
+    """A planned timetable from the store's snapshot, else from the store itself."""
+    db_path = db_path or TimetableImporter.TIMETABLE_DB_FILE
+    index = TimetableSnapshot.load(TimetableSnapshot.snapshot_path(db_path))
+    if index is None:
+        conn = TimetableImporter.connect(db_path)
+        try:
+            index = TimetableIndex.load(conn) or TimetableIndex.build(conn)
+        finally:
+            conn.close()
+    return PlannedTimetable(index)
+
+
+def on_change(callback):
+    """Call ``callback(previous, planned)`` whenever this process switches to a new timetable."""
+    _listeners.append(callback)
+
+
+def current():
+    """The planned timetable for the current store, or None when nothing is imported.
+
+    Loaded on first use and again whenever the snapshot (or, without one,
+    the store) is replaced, which costs one ``stat`` per call.
+    """
+    global _loaded
+    path = TimetableImporter.TIMETABLE_DB_FILE
+    snapshot = TimetableSnapshot.snapshot_path(path)
+    identity = _identity(snapshot) or _identity(path)
+    if identity is None:
+        return None
+    loaded = _loaded
+    if loaded is not None and loaded[:2] == (path, identity):
+        return loaded[2]
+    with _load_lock:
+        if _loaded is None or _loaded[:2] != (path, identity):
+            print(f"Loading planned timetable from {path}...")
+            previous = _loaded[2] if _loaded else None
+            _loaded = (path, identity, load(path))
+            if previous is not None and previous.version != _loaded[2].version:
+                for callback in _listeners:
+                    try:
+                        callback(previous, _loaded[2])
+                    except Exception as e:
+                        print(f"Timetable change handler failed: {e}")
+        return _loaded[2]
@@ -1,17 +1,93 @@
 """
 Live Station Timetable Getter - IRIS Integration
 Fetches real-time station timetables with delays from appiris.infofer.ro
+
+IRIS is an ASP.NET WebForms page: the first GET for a station returns the
+board plus hidden ``__VIEWSTATE``/``__EVENTVALIDATION`` fields, and later
+refreshes post those fields back.  One ``requests`` session is shared so the
+ASP.NET session cookie survives between refreshes, and the hidden fields are
+remembered per station.  Rows are read with lxml.
 """
 
-from viewstate import ViewState
-import requests_html
-from datetime import datetime, timedelta
 import re
-from bs4 import BeautifulSoup
+import threading
+from datetime import datetime, timedelta
+
+import lxml.html
+import requests
 
 # IRIS station timetable URL
 base_url = "https://appiris.infofer.ro/SosPlcRO.aspx?gara={}"
 
+# Hidden ASP.NET form fields echoed back on a postback refresh
+POSTBACK_FIELDS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+}
+
+# requests.Session is not thread-safe; each worker thread gets its own
+_local = threading.local()
+# Status text IRIS shows for a train running on time
+ON_TIME = re.compile(r'la timp|f[aă]r[aă] [iî]nt[aâ]rziere|on time', re.I)
+
+_postback_lock = threading.Lock()
+# Hidden form fields from the last page served for each station code
+_postback_state = {}
+
+
+def _session():
+    """This thread's HTTP session, created on first use."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def _postback_fields(tree):
+    """The page's ASP.NET state fields, or None when it has no ViewState."""
+    fields = {}
+    for name in POSTBACK_FIELDS:
+        values = tree.xpath('//input[@name=$name]/@value', name=name)
+        if values:
+            fields[name] = values[0]
+    return fields if '__VIEWSTATE' in fields else None
+
+
+def fetch_station_page(station_code, timeout=20):
+    """Parsed IRIS board page for a station.
+
+    Posts the remembered ViewState back when there is one, and falls back to
+    a fresh GET when the postback fails or the state has expired.
+    """
+    url = base_url.format(station_code)
+    with _postback_lock:
+        fields = _postback_state.get(str(station_code))
+
+    response = None
+    if fields:
+        try:
+            response = _session().post(url, data={**fields, '__EVENTTARGET': '', '__EVENTARGUMENT': ''},
+                                       headers={**HEADERS, 'Referer': url}, timeout=timeout)
+        except requests.RequestException as e:
+            print(f"IRIS postback failed for station {station_code}: {e}")
+            response = None
+        if response is not None and response.status_code != 200:
+            response = None
+    if response is None:
+        response = _session().get(url, headers=HEADERS, timeout=timeout)
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code} from IRIS")
+
+    tree = lxml.html.fromstring(response.content)
+    fields = _postback_fields(tree)
+    with _postback_lock:
+        if fields:
+            _postback_state[str(station_code)] = fields
+        else:
+            _postback_state.pop(str(station_code), None)
+    return tree
+
 
 def get_live_station_timetable(station_code):
     """
@@ -23,30 +99,21 @@ def get_live_station_timetable(station_code):
     Returns:
         List of trains with live delay information
     """
-    session = requests_html.HTMLSession()
-    
     try:
-        url = base_url.format(station_code)
-        print(f"Fetching live timetable from IRIS: {url}")
-        
-        response = session.get(url, timeout=20)
-        
-        if response.status_code != 200:
-            raise Exception(f"HTTP {response.status_code} from IRIS")
-        
-        # Parse ViewState-based page
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
+        print(f"Fetching live timetable from IRIS: {base_url.format(station_code)}")
+        tree = fetch_station_page(station_code)
+
         # Extract timetable data from IRIS page
-        trains = parse_iris_station_page(soup, station_code)
+        trains = parse_iris_station_page(tree, station_code)
         
         if trains and len(trains) > 0:
             # Log delay statistics
-            delayed_count = sum(1 for t in trains if t.get('delay', 0) > 0)
+            delays = [t['delay'] for t in trains if (t.get('delay') or 0) > 0]
+            delayed_count = len(delays)
             print(f"Successfully scraped {len(trains)} trains with live data for station {station_code}")
             print(f"  - Trains with delays: {delayed_count}")
             if delayed_count > 0:
-                avg_delay = sum(t.get('delay', 0) for t in trains if t.get('delay', 0) > 0) / delayed_count
+                avg_delay = sum(delays) / delayed_count
                 print(f"  - Average delay: {avg_delay:.1f} minutes")
             return trains
         else:
@@ -58,7 +125,12 @@ def get_live_station_timetable(station_code):
         raise
 
 
-def parse_iris_station_page(soup, station_code):
+def _text(element, separator=''):
+    """Stripped text pieces of an element joined by ``separator``."""
+    return separator.join(t.strip() for t in element.itertext() if t.strip())
+
+
+def parse_iris_station_page(tree, station_code):
     """
     Parse IRIS station timetable page
     The page structure includes tables with train information
@@ -66,15 +138,12 @@ def parse_iris_station_page(soup, station_code):
     trains = []
     
     try:
-        # Look for the main data table
-        tables = soup.find_all('table')
-        
-        for table in tables:
-            rows = table.find_all('tr')
+        # Rows of every table except the first (header) row
+        for table in tree.iter('table'):
+            rows = table.xpath('.//tr')
             
-            # Skip header rows (usually first 1-2 rows)
             for row in rows[1:]:
-                cells = row.find_all(['td', 'th'])
+                cells = row.xpath('./td|./th')
                 
                 if len(cells) >= 4:  # Need at least train number, times, destination
                     train_data = parse_iris_train_row(cells, station_code)
@@ -83,11 +152,12 @@ def parse_iris_station_page(soup, station_code):
         
         # Alternative: Look for div-based layouts (newer IRIS versions)
         if not trains:
-            train_containers = soup.find_all('div', class_=re.compile(r'train|tren|arrival|departure|sosire|plecare', re.I))
-            for container in train_containers:
-                train_data = parse_iris_train_div(container, station_code)
-                if train_data:
-                    trains.append(train_data)
+            container_class = re.compile(r'train|tren|arrival|departure|sosire|plecare', re.I)
+            for container in tree.xpath('//div[@class]'):
+                if container_class.search(container.get('class', '')):
+                    train_data = parse_iris_train_div(container, station_code)
+                    if train_data:
+                        trains.append(train_data)
         
     except Exception as e:
         print(f"Error parsing IRIS station page: {e}")
@@ -109,7 +179,7 @@ def parse_iris_train_row(cells, station_code):
     """
     try:
         # Extract text from cells
-        cell_texts = [cell.get_text(strip=True) for cell in cells]
+        cell_texts = [_text(cell) for cell in cells]
         
         # Train number is usually first column
         train_number_raw = cell_texts[0] if len(cell_texts) > 0 else ""
@@ -133,7 +203,8 @@ def parse_iris_train_row(cells, station_code):
         platform = cell_texts[4] if len(cell_texts) > 4 else None
         
         # Delay/Status - Check both cell text and HTML attributes for delay info
-        delay_minutes = 0
+        # Stays None only when the row has no status at all, so matched rows keep their own
+        delay_minutes = None
         status = "La timp"
         
         # Method 1: Look for delay text in cells
@@ -144,30 +215,26 @@ def parse_iris_train_row(cells, station_code):
                 delay_minutes = int(delay_match.group(1))
                 status = f"+{delay_minutes} min"
                 break
-            
-            # Also check for standalone numbers that might be delays (be conservative)
-            if not delay_match and re.search(r'^\+?\d{1,3}$', cell_text):
-                try:
+        
+        # Also check for standalone numbers that might be delays (be conservative):
+        # only after the train, time, route and platform columns
+        if not delay_minutes:
+            for cell_text in cell_texts[5:]:
+                if re.search(r'^\+?\d{1,3}$', cell_text):
                     potential_delay = int(cell_text.replace('+', ''))
                     if 1 <= potential_delay <= 300:  # Reasonable delay range
                         delay_minutes = potential_delay
                         status = f"+{delay_minutes} min"
                         break
-                except:
-                    pass
         
         # Method 2: Check HTML attributes for delay indicators
         for cell in cells:
             # Check for CSS classes like 'delay', 'late', 'intarziere'
-            cell_class = cell.get('class', [])
-            if isinstance(cell_class, list):
-                cell_class = ' '.join(cell_class).lower()
-            else:
-                cell_class = str(cell_class).lower()
+            cell_class = cell.get('class', '').lower()
             
             if any(keyword in cell_class for keyword in ['delay', 'late', 'intarziere', 'tarziu']):
                 # This cell likely contains delay info
-                delay_text = cell.get_text(strip=True)
+                delay_text = _text(cell)
                 delay_match = re.search(r'(\d+)', delay_text)
                 if delay_match and not delay_minutes:  # Only set if not already found
                     delay_minutes = int(delay_match.group(1))
@@ -177,13 +244,17 @@ def parse_iris_train_row(cells, station_code):
             # Check for style attributes (red/orange text often indicates delays)
             style = cell.get('style', '')
             if 'color' in style and any(color in style.lower() for color in ['red', 'orange', '#ff', '#f00', '#e74c3c']):
-                delay_text = cell.get_text(strip=True)
+                delay_text = _text(cell)
                 delay_match = re.search(r'(\d+)', delay_text)
                 if delay_match and not delay_minutes:
                     delay_minutes = int(delay_match.group(1))
                     status = f"+{delay_minutes} min"
                     break
         
+        # A status cell without a delay, or an explicit on-time status, is on time
+        if delay_minutes is None and (len(cell_texts) > 5 or any(ON_TIME.search(t) for t in cell_texts)):
+            delay_minutes = 0
+
         # Check for cancelled/suppressed status
         for cell_text in cell_texts:
             if re.search(r'anulat|cancelled|supprim|suspendat', cell_text, re.I):
@@ -231,7 +302,7 @@ def parse_iris_train_row(cells, station_code):
 def parse_iris_train_div(container, station_code):
     """Parse train data from a div container (alternative layout)"""
     try:
-        text = container.get_text(separator=' ', strip=True)
+        text = _text(container, ' ')
         
         # Look for train number
         train_match = re.search(r'([A-Z\-]+)?\s*(\d+[a-z]*)', text)
@@ -247,7 +318,7 @@ def parse_iris_train_div(container, station_code):
         departure_time = times[1] if len(times) > 1 else times[0] if len(times) == 1 else None
         
         # Look for delay - multiple patterns
-        delay_minutes = 0
+        delay_minutes = None
         status = "La timp"
         
         # Pattern 1: "+15 min" or "întârziere 20 min"
@@ -257,11 +328,7 @@ def parse_iris_train_div(container, station_code):
             status = f"+{delay_minutes} min"
         
         # Pattern 2: Check HTML classes for delay indicators
-        container_class = container.get('class', [])
-        if isinstance(container_class, list):
-            container_class = ' '.join(container_class).lower()
-        else:
-            container_class = str(container_class).lower()
+        container_class = container.get('class', '').lower()
         
         if 'delay' in container_class or 'late' in container_class or 'intarziere' in container_class:
             # Extract number from text if we haven't found delay yet
@@ -271,6 +338,9 @@ def parse_iris_train_div(container, station_code):
                     delay_minutes = int(num_match.group(1))
                     status = f"+{delay_minutes} min"
         
+        if delay_minutes is None and ON_TIME.search(text):
+            delay_minutes = 0
+
         # Check for cancelled
         if re.search(r'anulat|cancelled|supprim|suspendat', text, re.I):
             status = "Anulat"
@@ -326,6 +396,47 @@ def parse_time(time_str):
     return None
 
 
+def train_number_key(train_number):
+    """Bare train number (``IR 1621`` -> ``1621``) shared by Infofer and IRIS rows."""
+    match = re.search(r'\d+', str(train_number or ''))
+    return match.group(0) if match else None
+
+
+def apply_live_delays(board, live_trains, source='iris_live'):
+    """Board rows updated with live delays, joined on train number.
+
+    ``live_trains`` are IRIS rows or rows of a scraped Infofer board.
+    Returns ``(rows, matched)``.  Matched rows are copied with the live
+    platform when the board had none; those the live row gives a delay or a
+    cancellation also get it, with ``delay_source`` set to ``source``, and
+    only they count as matched.  ``board`` itself is never modified.
+    """
+    live = {}
+    for train in live_trains:
+        key = train_number_key(train.get('train_number'))
+        if key:
+            live.setdefault(key, train)
+
+    rows, matched = [], 0
+    for row in board:
+        train = live.get(train_number_key(row.get('train_number')))
+        if train is None:
+            rows.append(row)
+            continue
+        row = dict(row)
+        if train.get('delay') == -999 or train.get('cancelled'):
+            row['cancelled'] = True
+        elif train.get('delay') is not None:
+            row['delay'] = train['delay']
+        if not row.get('platform') and train.get('platform'):
+            row['platform'] = train['platform']
+        if row.get('cancelled') or train.get('delay') is not None:
+            matched += 1
+            row['delay_source'] = source
+        rows.append(row)
+    return rows, matched
+
+
 def format_live_timetable(trains):
     """
     Format live timetable data for API response
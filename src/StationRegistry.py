@@ -0,0 +1,92 @@
+"""
+Station Registry - immutable, indexed snapshot of the station list
+
+Routes used to scan the global ``stations`` list for every lookup, and a
+reload cleared the shared name lookup in place, so concurrent requests could
+briefly see no stations at all.  A :class:`StationRegistry` is built
+completely before it is published, never changes afterwards, and is swapped
+in with a single assignment; readers call :func:`current` once and keep
+using that snapshot for the rest of the request.
+"""
+
+import itertools
+import threading
+import unicodedata
+from datetime import datetime
+from types import MappingProxyType
+
+from src import StationSlugs, StationSnapshot, config
+from src.StationSlugs import slugify
+
+_versions = itertools.count(1)
+_install_lock = threading.Lock()
+
+
+def normalize_name(name):
+    """Case- and diacritic-insensitive form of a station name."""
+    folded = unicodedata.normalize('NFKD', str(name)).encode('ASCII', 'ignore').decode('ascii')
+    return ' '.join(folded.lower().split())
+
+
+class StationRegistry:
+    """Read-only station list with ID, normalised-name and slug indexes.
+
+    The station dicts are shared with every reader and must not be modified.
+    """
+
+    def __init__(self, stations, source='demo', snapshot_version=None):
+        stations = tuple(dict(s) for s in stations if s.get("name"))
+        by_id, by_name, by_slug = {}, {}, {}
+        for station in stations:
+            by_id.setdefault(str(station.get("station_id")), station)
+            by_name.setdefault(normalize_name(station["name"]), station)
+            by_slug.setdefault(slugify(station["name"]), station)
+        self.stations = stations
+        self.by_id = MappingProxyType(by_id)
+        self.by_name = MappingProxyType(by_name)
+        self.by_slug = MappingProxyType(by_slug)
+        self.source = source
+        # Content version, shared with the snapshot file it was loaded from
+        self.snapshot_version = snapshot_version or StationSnapshot.content_version(stations)
+        self.version = next(_versions)
+        self.loaded_at = datetime.now()
+
+    def __len__(self):
+        return len(self.stations)
+
+    def get(self, station_id):
+        """Station for an ID, or None."""
+        return self.by_id.get(str(station_id))
+
+    def find_by_name(self, name):
+        """Station whose name matches ignoring case and diacritics, or given as its slug."""
+        return self.by_name.get(normalize_name(name)) or self.by_slug.get(slugify(str(name)))
+
+    def find_partial(self, name):
+        """First station whose name contains ``name`` (case and diacritics ignored), or None."""
+        needle = normalize_name(name)
+        return next((s for key, s in self.by_name.items() if needle in key), None)
+
+    def name_to_id(self):
+        """``{name: station_id}`` for code that still expects the legacy lookup dict."""
+        return {s["name"]: s["station_id"] for s in self.stations}
+
+
+_current = StationRegistry([])
+
+
+def current():
+    """The registry in use; keep the returned object for the whole lookup."""
+    return _current
+
+
+def install(stations, source, snapshot_version=None):
+    """Build a registry from ``stations`` and publish it atomically."""
+    global _current
+    with _install_lock:
+        registry = StationRegistry(stations, source, snapshot_version)
+        # Fresh dict, never cleared in place, for the legacy name lookup
+        config.global_station_list = registry.name_to_id()
+        _current = registry
+    StationSlugs.preload(registry.stations)
+    return registry
@@ -0,0 +1,172 @@
+"""
+Station Search - precomputed typeahead index over the station registry
+
+Names are diacritic- and punctuation-folded once when the index is built
+(``Cluj-Napoca`` -> ``cluj napoca``).  Lookups then use:
+
+* a sorted name array for whole-name prefix matches (bisect),
+* a sorted token array for word-prefix matches (``nord`` -> Timișoara Nord),
+* 2- and 3-gram postings for substring matches and for picking candidates
+  for typo-tolerant matching by bounded edit distance.
+
+Results are ranked exact > prefix > token prefix > substring > typo and the
+top k are taken with a heap, so latency depends on the number of matches
+rather than on the size of the station list.
+"""
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+# Relevance per match kind; typo matches lose a point per edit
+EXACT, PREFIX, TOKEN_PREFIX, SUBSTRING, TYPO = 500, 400, 300, 200, 100
+
+# Fuzzy candidates verified with edit distance, best trigram overlap first
+MAX_TYPO_CANDIDATES = 40
+
+# Folded queries whose station is listed under a longer name; the aliased
+# station ranks as an exact match
+QUERY_ALIASES = {
+    "bucuresti nord": "bucuresti nord gr a",
+}
+
+_index_lock = threading.Lock()
+_cached_index = None
+
+
+def fold(text):
+    """Lowercase ASCII form with punctuation turned into single spaces."""
+    folded = unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('ascii').lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', folded).split())
+
+
+def ngrams(text, sizes=(2, 3)):
+    """n-grams of ``text`` for each length in ``sizes``."""
+    return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+
+def typo_limit(query):
+    """Edits tolerated for a query of this length."""
+    return 1 if len(query) <= 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Edit distance counting adjacent transpositions as one edit.
+
+    Returns ``limit + 1`` as soon as the distance is known to exceed ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    """Typeahead index for one registry version."""
+
+    def __init__(self, stations, version=None):
+        self.version = version
+        self.stations = stations
+        self.names = [fold(s.get("name", "")) for s in stations]
+        self.sorted_names = sorted((name, i) for i, name in enumerate(self.names))
+        self.sorted_tokens = sorted((token, i) for i, name in enumerate(self.names) for token in name.split())
+        self.postings = {}
+        for i, name in enumerate(self.names):
+            for gram in ngrams(name):
+                self.postings.setdefault(gram, set()).add(i)
+
+    @staticmethod
+    def _prefixed(sorted_pairs, prefix):
+        """Station positions whose key starts with ``prefix``."""
+        position = bisect_left(sorted_pairs, (prefix,))
+        while position < len(sorted_pairs) and sorted_pairs[position][0].startswith(prefix):
+            yield sorted_pairs[position][1]
+            position += 1
+
+    def _substring_candidates(self, query):
+        # Trigrams narrow faster; two-letter queries only have their bigram
+        grams = ngrams(query, (3,)) or {query}
+        postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+        return (i for i in candidates if query in self.names[i])
+
+    def _typo_matches(self, query):
+        limit = typo_limit(query)
+        grams = ngrams(query, (3,))
+        # One edit (a transposition at worst) touches at most four trigrams
+        needed = max(1, len(grams) - 4 * limit)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self.postings.get(gram, ()))
+        for i, shared in overlap.most_common(MAX_TYPO_CANDIDATES):
+            if shared < needed:
+                break
+            name = self.names[i]
+            # A typo while typing: compare with the same-length start of the
+            # name and with each whole word
+            distance = min(edit_distance(query, part, limit)
+                           for part in [name[:len(query)]] + name.split())
+            if distance <= limit:
+                yield i, distance
+
+    def search(self, query, limit=10):
+        """Top ``limit`` stations for ``query`` as ``(score, station)``, best first."""
+        query = fold(query)
+        if not query:
+            return []
+
+        scores = {}
+
+        def offer(i, score):
+            if score > scores.get(i, 0):
+                scores[i] = score
+
+        alias = QUERY_ALIASES.get(query)
+        if alias:
+            for i in self._prefixed(self.sorted_names, alias):
+                if self.names[i] == alias:
+                    offer(i, EXACT)
+        for i in self._prefixed(self.sorted_names, query):
+            offer(i, EXACT if self.names[i] == query else PREFIX)
+        # Each later stage scores lower, so stop once the top k are settled
+        if len(scores) < limit:
+            for i in self._prefixed(self.sorted_tokens, query):
+                offer(i, TOKEN_PREFIX)
+        if len(scores) < limit:
+            for i in self._substring_candidates(query):
+                offer(i, SUBSTRING)
+        if len(scores) < limit and len(query) >= 3:
+            for i, distance in self._typo_matches(query):
+                offer(i, TYPO - distance)
+
+        # Best score first, then shorter and alphabetically earlier names
+        best = heapq.nsmallest(limit, scores.items(),
+                               key=lambda item: (-item[1], len(self.names[item[0]]), self.names[item[0]]))
+        return [(score, self.stations[i]) for i, score in best]
+
+
+def index_for(registry):
+    """Search index for a registry, built once per registry version."""
+    global _cached_index
+    index = _cached_index
+    if index is not None and index.version == registry.version:
+        return index
+    with _index_lock:
+        if _cached_index is None or _cached_index.version != registry.version:
+            _cached_index = SearchIndex(registry.stations, registry.version)
+        return _cached_index
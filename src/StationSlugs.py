@@ -0,0 +1,245 @@
+"""
+Station Slugs - learned Infofer station page slugs
+
+Infofer station pages live at ``/ro-RO/Statie/<slug>`` and the slug casing is
+not predictable from the station name (``Bucuresti-Nord``, ``Brasov``,
+``Ploiesti-Vest`` ...).  Guessing costs one GET per wrong variant, so every
+slug that produced a timetable is remembered per station name and station ID,
+redirects are followed to the slug Infofer actually uses, and slugs answering
+404 are not probed again for a day (a 404 can be transient).  The map is kept in a small JSON file so the
+learning survives restarts.
+
+Environment:
+  CFR_SLUG_MAP  path of the JSON file (default ``station_slugs.json``)
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+SLUG_MAP_FILE = os.environ.get('CFR_SLUG_MAP', 'station_slugs.json')
+
+# Bumped when the file layout changes; older files are ignored
+SLUG_MAP_VERSION = 1
+
+# Seconds a slug that answered 404 is skipped before it is probed again
+NOT_FOUND_TTL = 24 * 3600
+
+_lock = threading.RLock()
+_loaded = False
+_slugs = {}         # station name key -> confirmed slug
+_ids = {}           # station ID -> station name key
+_names = {}         # station ID -> display name, from the station list
+_display = {}       # station name key -> display name, from the station list
+_not_found = {}     # slug Infofer answered with 404 -> when
+_stats = {"learned_hits": 0, "guesses": 0, "learned": 0, "redirects": 0, "not_found": 0}
+
+
+def slugify(text):
+    """Convert station name to Infofer URL slug"""
+    text = text.lower()
+    replacements = {
+        'ă': 'a', 'â': 'a', 'î': 'i', 'ș': 's', 'ț': 't',
+        'ş': 's', 'ţ': 't'
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+    text = re.sub(r'[^a-z0-9]+', '-', text)
+    return text.strip('-')
+
+
+def guess_slugs(station_name):
+    """Slug variants to probe for a station nobody has resolved yet, best first."""
+    slug = slugify(station_name)
+    slugs_to_try = [slug]
+    proper_slug = '-'.join(p.capitalize() for p in slug.split('-'))
+    if proper_slug != slug:
+        slugs_to_try.insert(0, proper_slug)
+    if 'bucuresti-nord' in slug:
+        slugs_to_try.insert(0, 'Bucuresti-Nord')
+    return list(dict.fromkeys(slugs_to_try))
+
+
+def _id_key(station_id):
+    station_id = str(station_id).strip() if station_id is not None else ''
+    return station_id if station_id.isdigit() else None
+
+
+def _load():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(SLUG_MAP_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable slug map {SLUG_MAP_FILE}: {e}")
+        return
+    if not isinstance(data, dict) or data.get('version') != SLUG_MAP_VERSION:
+        print(f"Ignoring slug map {SLUG_MAP_FILE} with unknown layout")
+        return
+    _slugs.update(data.get('slugs', {}))
+    _ids.update(data.get('ids', {}))
+    not_found = data.get('not_found', {})
+    if isinstance(not_found, list):
+        # Written before 404s expired; give them a fresh day
+        not_found = dict.fromkeys(not_found, time.time())
+    _not_found.update(not_found)
+    print(f"Loaded {len(_slugs)} learned station slugs from {SLUG_MAP_FILE}")
+
+
+def _save():
+    """Write the map atomically so a crash never leaves a truncated file."""
+    data = {
+        "version": SLUG_MAP_VERSION,
+        "slugs": dict(sorted(_slugs.items())),
+        "ids": dict(sorted(_ids.items())),
+        "not_found": dict(sorted(_not_found.items())),
+    }
+    directory = os.path.dirname(os.path.abspath(SLUG_MAP_FILE))
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.station_slugs-', suffix='.json', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, SLUG_MAP_FILE)
+    except OSError as e:
+        print(f"Could not save slug map {SLUG_MAP_FILE}: {e}")
+
+
+def station_name_for_id(station_id):
+    """Display name of a station ID from the preloaded station list, or None."""
+    with _lock:
+        return _names.get(_id_key(station_id))
+
+
+def display_name(station_name):
+    """Station list spelling of a name given in any casing or slug form, or None."""
+    with _lock:
+        return _display.get(slugify(station_name))
+
+
+def learned_slug(station_name=None, station_id=None):
+    """Confirmed slug for a station, looked up by name first and then by ID."""
+    with _lock:
+        _load()
+        if station_name:
+            slug = _slugs.get(slugify(station_name))
+            if slug:
+                return slug
+        key = _ids.get(_id_key(station_id))
+        return _slugs.get(key) if key else None
+
+
+def candidates(station_name, station_id=None):
+    """Slugs to try for a station, in order.
+
+    Returns ``(slugs, learned)``.  When a confirmed slug exists it comes first
+    and the guesses after it are only reached if Infofer stopped accepting it.
+    """
+    with _lock:
+        learned = learned_slug(station_name, station_id)
+        guesses = [s for s in guess_slugs(station_name) if not _recently_not_found(s)] or guess_slugs(station_name)
+        if learned:
+            _stats["learned_hits"] += 1
+            return [learned] + [s for s in guesses if s != learned], learned
+        _stats["guesses"] += 1
+        return guesses, None
+
+
+def slug_from_url(url):
+    """Slug at the end of an Infofer ``/Statie/<slug>`` URL, or None."""
+    match = re.search(r'/Statie/([^/?#]+)', urlparse(url).path)
+    return unquote(match.group(1)) if match else None
+
+
+def record_success(station_name, station_id, slug):
+    """Remember the slug that returned a timetable for this station."""
+    with _lock:
+        _load()
+        key = slugify(station_name)
+        id_key = _id_key(station_id)
+        changed = _slugs.get(key) != slug or (id_key and _ids.get(id_key) != key) or slug in _not_found
+        if not changed:
+            return
+        _slugs[key] = slug
+        if id_key:
+            _ids[id_key] = key
+        _not_found.pop(slug, None)
+        _stats["learned"] += 1
+        print(f"Learned Infofer slug {slug} for {station_name}")
+        _save()
+
+
+def record_redirect(requested_slug, final_url):
+    """Note that Infofer redirected a slug; returns the slug it redirected to."""
+    final_slug = slug_from_url(final_url)
+    if final_slug and final_slug != requested_slug:
+        with _lock:
+            _stats["redirects"] += 1
+        print(f"Infofer redirected slug {requested_slug} to {final_slug}")
+        return final_slug
+    return requested_slug
+
+
+def _recently_not_found(slug):
+    found_at = _not_found.get(slug)
+    if found_at is None:
+        return False
+    if time.time() - found_at < NOT_FOUND_TTL:
+        return True
+    del _not_found[slug]
+    return False
+
+
+def record_not_found(slug):
+    """Skip a slug for ``NOT_FOUND_TTL`` seconds after Infofer answered 404 for it."""
+    with _lock:
+        _load()
+        _stats["not_found"] += 1
+        for key in [k for k, v in _slugs.items() if v == slug]:
+            del _slugs[key]
+        _not_found[slug] = time.time()
+        _save()
+
+
+def preload(stations):
+    """Feed the station list (dicts with ``name`` and ``station_id``).
+
+    Links every station ID to its name so ID-only lookups reuse slugs learned
+    by name, and accepts an explicit ``slug`` on a station as confirmed.
+    """
+    changed = False
+    with _lock:
+        _load()
+        for station in stations:
+            name = station.get("name")
+            id_key = _id_key(station.get("station_id"))
+            if not name:
+                continue
+            key = slugify(name)
+            _display[key] = name
+            if id_key:
+                _names[id_key] = name
+                if _ids.get(id_key) != key:
+                    _ids[id_key] = key
+                    changed = True
+            slug = station.get("slug")
+            if slug and _slugs.get(key) != slug:
+                _slugs[key] = slug
+                changed = True
+        if changed:
+            _save()
+
+
+def get_stats():
+    """Counters and map size for diagnostics."""
+    with _lock:
+        _load()
+        return {**_stats, "known_slugs": len(_slugs), "known_ids": len(_ids), "not_found_slugs": len(_not_found)}
@@ -0,0 +1,107 @@
+"""
+Station Snapshot - versioned station list kept as runtime data
+
+The app boots from this file instead of the demo list, so lookups use the
+full station list from the first request and no network call is needed.
+``extract_stations.py`` writes it from the SNTFC timetable XML, and the
+optional background refresh rewrites it when CFR's list differs.  It lives
+in the working directory, next to the other runtime data; until it exists
+the read-only seed list shipped in ``src/station_mapping.json`` is used.
+
+Layout (schema 1)::
+
+    {"schema": 1, "version": "<content hash>", "generated_at": "...",
+     "source": "sntfc-xml", "stations": [{"name": ..., "station_id": ...}, ...]}
+
+A plain JSON list of stations (the older ``extract_stations.py`` output) is
+still accepted and gets a version computed from its content.
+
+Environment:
+  CFR_STATION_SNAPSHOT  path of the snapshot (default ``station_snapshot.json``)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+
+SNAPSHOT_SCHEMA = 1
+
+SNAPSHOT_FILE = os.environ.get('CFR_STATION_SNAPSHOT', 'station_snapshot.json')
+
+# Seed list shipped with the code; read, never written
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'station_mapping.json')
+
+
+def content_version(stations):
+    """Short hash identifying a station list's content, independent of order."""
+    canonical = sorted((str(s.get("station_id")), s.get("name", "")) for s in stations)
+    encoded = json.dumps(canonical, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def load_snapshot(path=None):
+    """``(stations, meta)`` from the snapshot file, or ``(None, None)`` if missing, empty or unreadable.
+
+    Without ``path``, the runtime snapshot is tried first and then the seed list.
+    """
+    if path is None:
+        stations, meta = load_snapshot(SNAPSHOT_FILE)
+        return (stations, meta) if stations else load_snapshot(SEED_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable station snapshot {path}: {e}")
+        return None, None
+
+    if isinstance(data, list):
+        # Legacy layout: bare list of stations
+        data = {"schema": SNAPSHOT_SCHEMA, "source": "legacy", "stations": data}
+    if not isinstance(data, dict) or data.get("schema") != SNAPSHOT_SCHEMA:
+        print(f"Ignoring station snapshot {path} with unknown schema")
+        return None, None
+
+    stations = [s for s in data.get("stations", []) if isinstance(s, dict) and s.get("name") and s.get("station_id")]
+    if not stations:
+        return None, None
+    meta = {
+        "version": data.get("version") or content_version(stations),
+        "generated_at": data.get("generated_at"),
+        "source": data.get("source", "unknown"),
+    }
+    return stations, meta
+
+
+def write_snapshot(stations, source, path=None):
+    """Write ``stations`` atomically as a schema-1 snapshot; returns its version."""
+    path = path or SNAPSHOT_FILE
+    stations = sorted(stations, key=lambda s: (s.get("name", ""), str(s.get("station_id"))))
+    version = content_version(stations)
+    data = {
+        "schema": SNAPSHOT_SCHEMA,
+        "version": version,
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "source": source,
+        "stations": stations,
+    }
+    fd, tmp_path = tempfile.mkstemp(prefix='.station_snapshot-', suffix='.json',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return version
+
+
+def diff(old_stations, new_stations):
+    """Stations added, removed and renamed between two lists, keyed by station ID."""
+    old = {str(s.get("station_id")): s.get("name") for s in old_stations}
+    new = {str(s.get("station_id")): s.get("name") for s in new_stations}
+    return {
+        "added": sorted(set(new) - set(old)),
+        "removed": sorted(set(old) - set(new)),
+        "renamed": sorted(i for i in set(old) & set(new) if old[i] != new[i]),
+    }
@@ -1,24 +1,52 @@
+import os
 import requests
 from bs4 import BeautifulSoup
 import re
+import threading
+import time
 from datetime import datetime, timedelta
-from cachetools import cached, TTLCache
+
+from cachetools import TTLCache
+
+from src import StationLiveTimetableGetter, StationRegistry, StationSlugs
+from src.BoardPrefetcher import BoardPrefetcher
+from src.PersistentCache import DateTieredCache, normalize_date
+from src.StationSlugs import slugify
 
 # Infofer URLs
 INFOFER_BASE_URL = "https://mersultrenurilor.infofer.ro/ro-RO/Statie/{}"
 INFOFER_AJAX_URL = "https://mersultrenurilor.infofer.ro/ro-RO/Stations/StationsResult"
 
-def slugify(text):
-    """Convert station name to Infofer URL slug"""
-    text = text.lower()
-    replacements = {
-        'ă': 'a', 'â': 'a', 'î': 'i', 'ș': 's', 'ț': 't',
-        'ş': 's', 'ţ': 't'
-    }
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    text = re.sub(r'[^a-z0-9]+', '-', text)
-    return text.strip('-')
+# Seconds a scraped board is served from cache
+TIMETABLE_TTL = 45
+
+# Refresh hot boards this many seconds before they expire
+PREFETCH_MARGIN = 10
+
+# A full Infofer scrape of today's board is reused for this many seconds;
+# in between, an expired board only gets fresh delays from the station's IRIS
+# board (one GET instead of GET+POST plus parsing the whole board)
+BOARD_RESCRAPE_TTL = int(os.environ.get('CFR_BOARD_RESCRAPE_TTL', 600))
+IRIS_REFRESH = os.environ.get('CFR_IRIS_REFRESH', '1') != '0'
+
+# Seconds IRIS is skipped for a station after a refresh that matched nothing
+IRIS_RETRY_AFTER = 300
+
+# Cached values are (timetable, fetched_at, prefetched).  Today's boards live
+# for TIMETABLE_TTL; other dates are planned schedules kept much longer and on
+# disk (see PersistentCache).
+_timetable_cache = DateTieredCache('station_board', live_ttl=TIMETABLE_TTL, maxsize=200)
+_cache_lock = threading.Lock()
+_inflight = {}
+_cache_stats = {"hits": 0, "misses": 0, "coalesced": 0, "prefetch_hits": 0,
+                "iris_refreshes": 0, "iris_failures": 0}
+# Today's boards as last scraped from Infofer, per station key
+_scraped_boards = TTLCache(maxsize=200, ttl=BOARD_RESCRAPE_TTL)
+_iris_failed_at = {}
+# When a board would have been fetched without the prefetcher, per cache key.
+# A hit on a prefetched board after that fetch would have expired is one the
+# prefetcher gained.
+_demand_fetched_at = {}
 
 def get_station_name_by_id(station_id):
     """Map internal app numeric IDs to readable station names."""
@@ -42,12 +70,216 @@ def get_station_name_by_id(station_id):
     }
     if isinstance(station_id, str) and not station_id.isdigit():
         return station_id.replace('-', ' ').title()
+    known_name = StationSlugs.station_name_for_id(station_id)
+    if known_name:
+        return known_name
     return mapping.get(str(station_id), f"Station-{station_id}")
 
-@cached(cache=TTLCache(maxsize=100, ttl=45))
+def canonical_station(station_id, station_name=None):
+    """Resolve any station reference to ``(station_key, display_name)``.
+
+    Numeric IDs, slugs and names in any spelling of the same station share one
+    key, so every route reading the same Infofer board shares one cache entry.
+    """
+    if not station_name:
+        station_name = get_station_name_by_id(station_id)
+    display_name = StationSlugs.display_name(station_name) or station_name
+    return slugify(display_name), display_name
+
+
 def get_timetable(station_id, station_name=None, date_str=None):
-    """Main entry point for fetching station timetable"""
-    return get_infofer_timetable(station_id, station_name, date_str)
+    """Main entry point for fetching station timetable
+
+    Cached per canonical station and service date.  Concurrent misses for the
+    same board wait for a single scrape instead of each hitting Infofer.
+    """
+    station_key, display_name = canonical_station(station_id, station_name)
+    service_date = normalize_date(date_str)
+    cache_key = (station_key, service_date)
+    if service_date == normalize_date():
+        _prefetcher.record_request(station_key, display_name, station_id)
+
+    entry = _timetable_cache.get(cache_key)
+    if entry is not None:
+        _count_hit(cache_key, entry, "hits")
+        return entry[0]
+    return _fill_once(cache_key, station_id, display_name)
+
+
+def _fill_once(cache_key, station_id, display_name, prefetched=False):
+    """Fill a board unless a concurrent fill just did; one upstream fetch per board at a time.
+
+    Demand misses and prefetches share the same per-board lock, so a
+    prefetch and a request for the same board never both scrape.
+    """
+    with _cache_lock:
+        inflight = _inflight.setdefault(cache_key, threading.Lock())
+
+    with inflight:
+        entry = _timetable_cache.get(cache_key)
+        if prefetched:
+            if not _board_needs_refresh(cache_key[0]):
+                return entry[0]
+        elif entry is not None:
+            _count_hit(cache_key, entry, "coalesced")
+            return entry[0]
+        else:
+            with _cache_lock:
+                _cache_stats["misses"] += 1
+                _demand_fetched_at[cache_key] = time.time()
+        try:
+            return _fill(cache_key, station_id, display_name, prefetched)
+        finally:
+            with _cache_lock:
+                _inflight.pop(cache_key, None)
+
+
+def peek_timetable(station_id, station_name=None, date_str=None):
+    """Cached board for a station, or None; never scrapes."""
+    station_key, display_name = canonical_station(station_id, station_name)
+    cache_key = (station_key, normalize_date(date_str))
+    entry = _timetable_cache.get(cache_key)
+    if entry is None:
+        return None
+    if cache_key[1] == normalize_date():
+        _prefetcher.record_request(station_key, display_name, station_id)
+    _count_hit(cache_key, entry, "hits")
+    return entry[0]
+
+
+def is_cold(station_id, station_name=None, date_str=None):
+    """Whether a station's board is neither cached nor being fetched, and for today not scraped recently."""
+    station_key, _ = canonical_station(station_id, station_name)
+    cache_key = (station_key, normalize_date(date_str))
+    with _cache_lock:
+        if cache_key in _inflight or (cache_key[1] == normalize_date() and station_key in _scraped_boards):
+            return False
+    return _timetable_cache.get(cache_key) is None
+
+
+def fetch_in_background(station_id, station_name=None):
+    """Fetch today's board of a station on a background thread, for the requests that follow."""
+    threading.Thread(target=get_timetable, args=(station_id, station_name), daemon=True,
+                     name=f"board-{station_id}").start()
+
+
+def _count_hit(cache_key, entry, counter):
+    _, _, prefetched = entry
+    now = time.time()
+    with _cache_lock:
+        _cache_stats[counter] += 1
+        demand_fetched_at = _demand_fetched_at.get(cache_key)
+        if prefetched and (demand_fetched_at is None or now - demand_fetched_at >= TIMETABLE_TTL):
+            # Without prefetching this request would have been a miss
+            _cache_stats["prefetch_hits"] += 1
+            _demand_fetched_at[cache_key] = now
+
+
+def _fill(cache_key, station_id, display_name, prefetched=False):
+    timetable = None
+    today = cache_key[1] == normalize_date()
+    if today:
+        timetable = _refresh_from_iris(cache_key[0], station_id, display_name)
+    if timetable is None:
+        timetable = get_infofer_timetable(station_id, display_name, cache_key[1])
+        if today and timetable:
+            with _cache_lock:
+                _scraped_boards[cache_key[0]] = timetable
+    # Empty boards are usually a scrape problem; keep them off the disk
+    _timetable_cache.put(cache_key, (timetable, time.time(), prefetched), persist=bool(timetable))
+    with _cache_lock:
+        if len(_demand_fetched_at) > 2 * _timetable_cache.memory.maxsize:
+            _demand_fetched_at.clear()
+    return timetable
+
+
+def _iris_station_code(station_id, station_name):
+    """Numeric CFR code IRIS knows the station by, or None."""
+    if str(station_id).isdigit():
+        return str(station_id)
+    station = StationRegistry.current().find_by_name(station_name)
+    code = str(station.get("station_id")) if station else ""
+    return code if code.isdigit() else None
+
+
+def _refresh_from_iris(station_key, station_id, station_name):
+    """Today's last scraped board with live delays from IRIS, or None.
+
+    None means a full Infofer scrape is needed: no recent scrape, no numeric
+    station code, IRIS disabled or recently failing, or no train matched.
+    """
+    if not IRIS_REFRESH:
+        return None
+    with _cache_lock:
+        board = _scraped_boards.get(station_key)
+        failed_at = _iris_failed_at.get(station_key)
+    if not board or (failed_at and time.time() - failed_at < IRIS_RETRY_AFTER):
+        return None
+    station_code = _iris_station_code(station_id, station_name)
+    if station_code is None:
+        return None
+
+    try:
+        live_trains = StationLiveTimetableGetter.get_live_station_timetable(station_code)
+    except Exception:
+        live_trains = []
+    timetable, matched = StationLiveTimetableGetter.apply_live_delays(board, live_trains)
+    with _cache_lock:
+        if not matched:
+            _cache_stats["iris_failures"] += 1
+            _iris_failed_at[station_key] = time.time()
+            return None
+        _cache_stats["iris_refreshes"] += 1
+        _iris_failed_at.pop(station_key, None)
+    print(f"Refreshed delays for {station_name} from IRIS ({matched}/{len(board)} trains matched)")
+    return timetable
+
+
+def _board_needs_refresh(station_key):
+    entry = _timetable_cache.get((station_key, normalize_date()))
+    return entry is None or time.time() - entry[1] >= TIMETABLE_TTL - PREFETCH_MARGIN
+
+
+def _prefetch_board(station_key, station_name, station_id):
+    _fill_once((station_key, normalize_date()), station_id, station_name, prefetched=True)
+
+
+_prefetcher = BoardPrefetcher(_prefetch_board, _board_needs_refresh)
+
+
+def invalidate_boards(station_names=None, persist=True):
+    """Drop cached boards of these stations (None: all) for today and later; returns how many were dropped.
+
+    Used when a timetable update changes trains calling there.  With
+    ``persist`` the disk copies shared by all workers go too.
+    """
+    if station_names is None:
+        with _cache_lock:
+            _scraped_boards.clear()
+        return _timetable_cache.invalidate(lambda station_key, _: True, persist)
+    station_keys = {canonical_station(name, name)[0] for name in station_names}
+    with _cache_lock:
+        for station_key in station_keys:
+            _scraped_boards.pop(station_key, None)
+    return _timetable_cache.invalidate(lambda station_key, _: station_key in station_keys, persist)
+
+
+def get_cache_stats():
+    """Timetable cache counters for diagnostics."""
+    with _cache_lock:
+        lookups = _cache_stats["hits"] + _cache_stats["coalesced"] + _cache_stats["misses"]
+        served = _cache_stats["hits"] + _cache_stats["coalesced"]
+        return {
+            **_cache_stats,
+            **_timetable_cache.get_stats(),
+            "hit_rate": round(served / lookups, 3) if lookups else None,
+            "hit_rate_without_prefetch": round((served - _cache_stats["prefetch_hits"]) / lookups, 3) if lookups else None
+        }
+
+
+def get_prefetch_stats():
+    """Background prefetcher counters and hot stations."""
+    return _prefetcher.get_stats()
 
 def get_infofer_timetable(station_id, station_name=None, date_str=None):
     """
@@ -56,15 +288,8 @@ def get_infofer_timetable(station_id, station_name=None, date_str=None):
     if not station_name:
         station_name = get_station_name_by_id(station_id)
     
-    slug = slugify(station_name)
-    
-    slugs_to_try = [slug]
-    parts = slug.split('-')
-    proper_slug = '-'.join(p.capitalize() for p in parts)
-    if proper_slug != slug:
-        slugs_to_try.insert(0, proper_slug)
-    if 'bucuresti-nord' in slug:
-        slugs_to_try.insert(0, 'Bucuresti-Nord')
+    # Learned slug first; guessed variants only when nothing is known yet
+    slugs_to_try, learned = StationSlugs.candidates(station_name, station_id)
     
     session = requests.Session()
     headers = {
@@ -78,9 +303,16 @@ def get_infofer_timetable(station_id, station_name=None, date_str=None):
             print(f"Trying Infofer station page: {url}")
             
             resp = session.get(url, headers=headers, timeout=10)
+            if resp.status_code == 404:
+                print(f"Slug {s} does not exist on Infofer")
+                StationSlugs.record_not_found(s)
+                continue
             if resp.status_code != 200:
                 print(f"Slug {s} failed with status {resp.status_code}")
                 continue
+            if resp.history:
+                s = StationSlugs.record_redirect(s, resp.url)
+                url = resp.url
                 
             soup = BeautifulSoup(resp.content, 'html.parser')
             
@@ -133,7 +365,12 @@ def get_infofer_timetable(station_id, station_name=None, date_str=None):
 
             result = parse_infofer_html(res.text, station_name, requested_date)
             if result:
+                StationSlugs.record_success(station_name, station_id, s)
                 return result
+            if s == learned:
+                # A confirmed slug with no trains is a genuinely empty board
+                print(f"No trains on the board for {station_name} (slug {s})")
+                return []
             # If empty result, try next slug variant
             print(f"Empty result for slug {s}, trying next...")
             
@@ -0,0 +1,198 @@
+"""
+Timetable Diff - apply a new version of the SNTFC dataset train by train
+
+data.gov.ro republishes the whole timetable XML for every modification
+during the year.  Instead of re-importing everything, each ``<Tren>`` is
+hashed (``TimetableImporter.train_hash``) and the hashes are compared per
+train number with those stored at import, giving:
+
+* ``added``   - numbers only in the new version
+* ``removed`` - numbers only in the old version
+* ``changed`` - numbers whose trains differ (any route, time or calendar)
+
+A number can have several ``<Tren>`` elements (seasonal variants); it
+counts as changed when the set of its hashes differs.
+
+Applying the diff rewrites only the ``<Tren>`` elements whose hash is new
+or gone, in a copy of the store, then rebuilds the index and snapshot and
+swaps both in like a full import.  The
+cached boards of the stations those trains call at (before and after the
+change) and the cached pages of those trains are dropped, for today and
+later; past dates are history and stay.  The changes are recorded with the
+new snapshot, so every worker drops the same entries from memory when it
+picks the snapshot up (see ``on_timetable_change``).  Journey planner days
+are rebuilt for the new timetable in each worker on their next query.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import time
+from collections import Counter
+
+from lxml import etree
+
+from src import (StationTimetableGetter, TimetableImporter, TimetableIndex, TimetableSnapshot,
+                 TrainPageGetter)
+
+
+def _number_key(number):
+    return (0, int(number), '') if str(number).isdigit() else (1, 0, str(number))
+
+
+def xml_train_hashes(xml_path):
+    """``{number: sorted train hashes}`` of a dataset XML, streamed."""
+    hashes = {}
+    with open(xml_path, 'rb') as source:
+        for train in TimetableImporter.iter_trains(source):
+            hashes.setdefault(train.get('Numar'), []).append(TimetableImporter.train_hash(train))
+    return {number: sorted(values) for number, values in hashes.items()}
+
+
+def store_train_hashes(conn):
+    """``{number: sorted train hashes}`` of an imported store."""
+    hashes = {}
+    try:
+        for number, train_hash in conn.execute('SELECT number, hash FROM trains'):
+            hashes.setdefault(number, []).append(train_hash)
+    except sqlite3.OperationalError:
+        raise RuntimeError("The store predates per-train hashes; run a full import_timetable.py once")
+    return {number: sorted(values) for number, values in hashes.items()}
+
+
+def diff(old, new):
+    """``{"added", "removed", "changed"}`` train numbers between two hash maps."""
+    return {
+        "added": sorted(new.keys() - old.keys(), key=_number_key),
+        "removed": sorted(old.keys() - new.keys(), key=_number_key),
+        "changed": sorted((n for n in old.keys() & new.keys() if old[n] != new[n]), key=_number_key),
+    }
+
+
+def _station_names(conn):
+    """Names of the stations the trains in the ``touched`` temporary table call at."""
+    return [name for (name,) in conn.execute(
+        'SELECT DISTINCT stations.name FROM stops JOIN stations ON stations.code = stops.station '
+        'WHERE stops.train IN (SELECT id FROM touched)')]
+
+
+def apply(xml_path, db_path=None):
+    """Bring the store at ``db_path`` up to ``xml_path`` by replacing only the trains that differ.
+
+    The XML is read once: trains whose hash the store already has under the
+    same number are skipped, the others are kept serialised for insertion.
+    Returns a report: the diff, the dataset versions, the affected stations,
+    the cache entries dropped and the seconds taken.
+    """
+    db_path = db_path or TimetableImporter.TIMETABLE_DB_FILE
+    snapshot_path = TimetableSnapshot.snapshot_path(db_path)
+    started = time.time()
+
+    conn = TimetableImporter.connect(db_path)
+    try:
+        old_hashes = store_train_hashes(conn)
+        previous = TimetableSnapshot.load(snapshot_path) or TimetableIndex.load(conn) or TimetableIndex.build(conn)
+    finally:
+        conn.close()
+
+    # (number, hash) -> stored trains not yet matched by the new version
+    unmatched = Counter((number, train_hash) for number, hashes in old_hashes.items() for train_hash in hashes)
+    new_hashes, incoming = {}, []
+    with open(xml_path, 'rb') as source:
+        for train in TimetableImporter.iter_trains(source):
+            key = (train.get('Numar'), TimetableImporter.train_hash(train))
+            new_hashes.setdefault(key[0], []).append(key[1])
+            if unmatched[key] > 0:
+                unmatched[key] -= 1
+            else:
+                incoming.append(etree.tostring(train))
+    outgoing = [(key, count) for key, count in unmatched.items() if count > 0]
+
+    changes = diff(old_hashes, {number: sorted(hashes) for number, hashes in new_hashes.items()})
+    report = {**changes, "from": previous.version, "to": previous.version, "stations": [],
+              "dropped_cache_entries": 0}
+    if not incoming and not outgoing:
+        report["seconds"] = round(time.time() - started, 2)
+        return report
+
+    tmp_path = f"{db_path}.importing"
+    shutil.copyfile(db_path, tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        removed_ids = []
+        for (number, train_hash), count in outgoing:
+            removed_ids += [train_id for (train_id,) in conn.execute(
+                'SELECT id FROM trains WHERE number = ? AND hash = ? ORDER BY id LIMIT ?',
+                (number, train_hash, count))]
+        conn.execute('CREATE TEMP TABLE touched (id INTEGER PRIMARY KEY)')
+        conn.executemany('INSERT INTO touched VALUES (?)', [(train_id,) for train_id in removed_ids])
+        stations_before = _station_names(conn)
+        for table, column in (('stops', 'train'), ('calendars', 'train'), ('trains', 'id')):
+            conn.execute(f'DELETE FROM {table} WHERE {column} IN (SELECT id FROM touched)')
+
+        next_id = (conn.execute('SELECT MAX(id) FROM trains').fetchone()[0] or 0) + 1
+        conn.execute('DELETE FROM touched')
+        stations = {}
+        rows = ([], [], [])
+        for train_id, serialised in enumerate(incoming, next_id):
+            train_row, stops, calendars = TimetableImporter.rows_for_train(
+                etree.fromstring(serialised), train_id, stations)
+            rows[0].append(train_row)
+            rows[1].extend(stops)
+            rows[2].extend(calendars)
+            conn.execute('INSERT INTO touched VALUES (?)', (train_id,))
+        TimetableImporter.write_rows(conn, *rows)
+        conn.executemany('INSERT OR REPLACE INTO stations VALUES (?, ?)', stations.items())
+        conn.execute('DELETE FROM operators')
+        conn.execute('INSERT INTO operators SELECT operator, COUNT(*) FROM trains GROUP BY operator')
+        affected = sorted(set(stations_before) | set(_station_names(conn)))
+
+        index = TimetableIndex.build(conn)
+        trains = {number for (number, _), _ in outgoing} | {row[1] for row in rows[0]}
+        index.changes = {"from": previous.version, "to": index.version,
+                         "trains": sorted(trains, key=_number_key), "stations": affected}
+        TimetableIndex.save(conn, index)
+        conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+            ("source", os.path.basename(xml_path)),
+            ("updated_at", time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ("trains", str(conn.execute('SELECT COUNT(*) FROM trains').fetchone()[0])),
+            ("stops", str(conn.execute('SELECT COUNT(*) FROM stops').fetchone()[0])),
+            ("last_changes", json.dumps(index.changes, ensure_ascii=False)),
+        ])
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+    TimetableSnapshot.write(index, snapshot_path)
+
+    report.update({"to": index.version, "stations": affected,
+                   "dropped_cache_entries": invalidate(index.changes),
+                   "seconds": round(time.time() - started, 2)})
+    return report
+
+
+def invalidate(changes, persist=True):
+    """Drop the cached boards and train pages a recorded change affects; returns how many were dropped."""
+    return (StationTimetableGetter.invalidate_boards(changes["stations"], persist)
+            + TrainPageGetter.invalidate_trains(changes["trains"], persist))
+
+
+def on_timetable_change(previous, planned):
+    """``PlannedTimetable.on_change`` handler: drop what the new timetable makes stale in memory.
+
+    The disk copies were already dropped by whoever applied the change.
+    When this worker skipped a version, or the new one is a full import, it
+    cannot know what changed and drops every cached board and train page for
+    today and later.
+    """
+    changes = planned.index.changes
+    if changes and changes.get("from") == previous.version:
+        dropped = invalidate(changes, persist=False)
+    else:
+        dropped = (StationTimetableGetter.invalidate_boards(None, persist=False)
+                   + TrainPageGetter.invalidate_trains(None, persist=False))
+    print(f"Timetable {previous.version} -> {planned.version}: dropped {dropped} cached entries")
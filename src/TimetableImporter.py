@@ -0,0 +1,289 @@
+"""
+Timetable Importer - streams the SNTFC timetable XML into a local SQLite store
+
+The data.gov.ro dataset (``trenuri-2025-2026_sntfc.xml``) is a few hundred MB
+of ``<Tren>`` elements, each with its ``<ElementTrasa>`` route segments and
+``<CalendarTren>`` running periods.  It is read with ``iterparse`` one train
+at a time and every finished train is cleared from the tree, so memory stays
+flat whatever the size of the file.
+
+Tables::
+
+    stations  (code, name)
+    operators (code, trains)
+    trains    (id, number, category, operator, hash)
+    stops     (train, seq, station, arrival, departure, distance, stop_type)
+    calendars (train, start_date, end_date, days)
+    arrays    typed-array indexes over the above (see ``TimetableIndex``)
+
+The same indexes are also written as a memory-mapped snapshot next to the
+store (see ``TimetableSnapshot``), which is what the app serves from.
+
+Stop times are seconds after midnight of the service day and keep counting
+past 86400 for trains running over midnight; ``arrival`` is NULL at the
+origin and ``departure`` at the destination.  ``distance`` is the running
+total of the segments' ``Km`` attribute, in the feed's units.  ``hash`` is a
+digest of the train's canonical XML, used to find changed trains when a new
+version of the dataset comes out (see ``TimetableDiff``).
+
+The store is built in a temporary file next to the target and swapped in
+when complete, so readers never see a half-written import.
+
+Environment:
+  CFR_TIMETABLE_DB  path of the SQLite store (default ``timetable.db``)
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+from lxml import etree
+
+from src import TimetableIndex, TimetableSnapshot
+
+TIMETABLE_DB_FILE = os.environ.get('CFR_TIMETABLE_DB', 'timetable.db')
+
+DEFAULT_XML_FILE = 'trenuri-2025-2026_sntfc.xml'
+
+# Trains written per executemany batch
+BATCH_TRAINS = 500
+
+SCHEMA = '''
+    CREATE TABLE stations (
+        code INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    );
+    CREATE TABLE operators (
+        code TEXT PRIMARY KEY,
+        trains INTEGER NOT NULL
+    );
+    CREATE TABLE trains (
+        id INTEGER PRIMARY KEY,
+        number TEXT NOT NULL,
+        category TEXT,
+        operator TEXT,
+        hash TEXT
+    );
+    CREATE TABLE stops (
+        train INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        station INTEGER NOT NULL,
+        arrival INTEGER,
+        departure INTEGER,
+        distance INTEGER,
+        stop_type TEXT,
+        PRIMARY KEY (train, seq)
+    ) WITHOUT ROWID;
+    CREATE TABLE calendars (
+        train INTEGER NOT NULL,
+        start_date TEXT,
+        end_date TEXT,
+        days TEXT
+    );
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+'''
+
+# Built after the bulk load, which is faster than maintaining them per row
+INDEXES = '''
+    CREATE INDEX idx_trains_number ON trains (number);
+    CREATE INDEX idx_stops_station ON stops (station, departure);
+    CREATE INDEX idx_calendars_train ON calendars (train);
+'''
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _iso_date(value):
+    """``YYYYMMDD`` as ``YYYY-MM-DD``; other values unchanged."""
+    if value and len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+def train_stops(segments):
+    """Stops ``(station, name, arrival, departure, distance, stop_type)`` from route segments.
+
+    Each segment runs from its origin station (leaving at ``OraP``) to its
+    destination (arriving at ``OraS``), so a stop's departure comes from the
+    segment starting there and its arrival from the segment ending there.
+    Times that go backwards are moved to the next day.
+    """
+    segments = sorted(segments, key=lambda s: _int(s.get('Secventa')) or 0)
+    stops = []
+    distance = 0
+    last_time = None
+
+    def monotonic(seconds):
+        nonlocal last_time
+        if seconds is None:
+            return None
+        while last_time is not None and seconds < last_time:
+            seconds += 86400
+        last_time = seconds
+        return seconds
+
+    for position, segment in enumerate(segments):
+        departure = monotonic(_int(segment.get('OraP')))
+        if position == 0:
+            stops.append([_int(segment.get('CodStaOrigine')), segment.get('DenStaOrigine'),
+                          None, departure, 0, segment.get('TipOprire')])
+        else:
+            stops[-1][3] = departure
+        distance += _int(segment.get('Km')) or 0
+        arrival = monotonic(_int(segment.get('OraS')))
+        stops.append([_int(segment.get('CodStaDest')), segment.get('DenStaDestinatie'),
+                      arrival, None, distance, segment.get('TipOprire')])
+    return [tuple(stop) for stop in stops if stop[0] is not None]
+
+
+def train_hash(train):
+    """Digest of a ``<Tren>`` element's canonical XML; equal trains have equal hashes."""
+    return hashlib.sha1(etree.tostring(train, method='c14n', with_tail=False)).hexdigest()
+
+
+def iter_trains(source):
+    """``<Tren>`` elements of an open XML file, each cleared once the caller moves on."""
+    for _, train in etree.iterparse(source, events=('end',), tag='Tren'):
+        yield train
+        # Drop the finished train and the siblings already processed
+        train.clear()
+        while train.getprevious() is not None:
+            del train.getparent()[0]
+
+
+def rows_for_train(train, train_id, stations):
+    """Rows of the ``trains``, ``stops`` and ``calendars`` tables for one ``<Tren>``.
+
+    Station names seen on the route are added to ``stations``.
+    """
+    train_row = (train_id, train.get('Numar'), train.get('CategorieTren'), train.get('Operator'),
+                 train_hash(train))
+    stop_rows = []
+    for seq, (code, name, arrival, departure, distance, stop_type) in enumerate(
+            train_stops(train.iter('ElementTrasa'))):
+        if name and code not in stations:
+            stations[code] = name.strip()
+        stop_rows.append((train_id, seq, code, arrival, departure, distance, stop_type))
+    calendar_rows = [(train_id, _iso_date(calendar.get('DataStart')), _iso_date(calendar.get('DataStop')),
+                      calendar.get('Zile'))
+                     for calendar in train.iter('CalendarTren')]
+    return train_row, stop_rows, calendar_rows
+
+
+def write_rows(conn, train_rows, stop_rows, calendar_rows):
+    conn.executemany('INSERT INTO trains VALUES (?, ?, ?, ?, ?)', train_rows)
+    conn.executemany('INSERT INTO stops VALUES (?, ?, ?, ?, ?, ?, ?)', stop_rows)
+    conn.executemany('INSERT INTO calendars VALUES (?, ?, ?, ?)', calendar_rows)
+
+
+def _create_store(path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def import_timetable(xml_path=DEFAULT_XML_FILE, db_path=None, progress_every=1000):
+    """Stream ``xml_path`` into a fresh SQLite store at ``db_path``.
+
+    Prints progress every ``progress_every`` trains and returns the import
+    counters (trains, stops, stations, operators, calendars, seconds,
+    bytes).
+    """
+    db_path = db_path or TIMETABLE_DB_FILE
+    tmp_path = f"{db_path}.importing"
+    conn = _create_store(tmp_path)
+
+    stations = {}
+    operators = {}
+    counts = {"trains": 0, "stops": 0, "calendars": 0}
+    train_rows, stop_rows, calendar_rows = [], [], []
+    total_bytes = os.path.getsize(xml_path)
+    started = time.time()
+
+    def flush():
+        write_rows(conn, train_rows, stop_rows, calendar_rows)
+        train_rows.clear()
+        stop_rows.clear()
+        calendar_rows.clear()
+
+    print(f"Importing {xml_path} ({total_bytes / 1e6:.0f} MB) into {db_path}...")
+    try:
+        with open(xml_path, 'rb') as source:
+            for train in iter_trains(source):
+                train_row, stops, calendars = rows_for_train(train, counts["trains"] + 1, stations)
+                train_rows.append(train_row)
+                stop_rows.extend(stops)
+                calendar_rows.extend(calendars)
+                operators[train_row[3]] = operators.get(train_row[3], 0) + 1
+                counts["trains"] += 1
+                counts["stops"] += len(stops)
+                counts["calendars"] += len(calendars)
+
+                if len(train_rows) >= BATCH_TRAINS:
+                    flush()
+                if progress_every and counts["trains"] % progress_every == 0:
+                    elapsed = time.time() - started
+                    read = source.tell()
+                    print(f"  {counts['trains']} trains, {counts['stops']} stops, "
+                          f"{read / total_bytes:.0%} read, {counts['trains'] / elapsed:.0f} trains/s, "
+                          f"{read / 1e6 / elapsed:.1f} MB/s")
+        flush()
+
+        conn.executemany('INSERT INTO stations VALUES (?, ?)', stations.items())
+        conn.executemany('INSERT INTO operators VALUES (?, ?)', operators.items())
+        conn.executescript(INDEXES)
+        index = TimetableIndex.build(conn)
+        TimetableIndex.save(conn, index)
+        elapsed = time.time() - started
+        conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ("source", os.path.basename(xml_path)),
+            ("imported_at", time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ("trains", str(counts["trains"])),
+            ("stops", str(counts["stops"])),
+        ])
+        conn.commit()
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+    TimetableSnapshot.write(index, TimetableSnapshot.snapshot_path(db_path))
+
+    counts.update({"stations": len(stations), "operators": len(operators),
+                   "seconds": round(elapsed, 2), "bytes": total_bytes})
+    print(f"Imported {counts['trains']} trains, {counts['stops']} stops, {len(stations)} stations "
+          f"and {len(operators)} operators in {elapsed:.1f}s ({total_bytes / 1e6 / elapsed:.1f} MB/s)")
+    return counts
+
+
+def write_snapshot(db_path=None):
+    """(Re)write the snapshot of an existing store; returns its dataset version."""
+    db_path = db_path or TIMETABLE_DB_FILE
+    conn = connect(db_path)
+    try:
+        index = TimetableIndex.load(conn) or TimetableIndex.build(conn)
+    finally:
+        conn.close()
+    return TimetableSnapshot.write(index, TimetableSnapshot.snapshot_path(db_path))
+
+
+def connect(db_path=None):
+    """Read-only connection to an imported store."""
+    db_path = db_path or TIMETABLE_DB_FILE
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No timetable store at {db_path}; run import_timetable.py first")
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, check_same_thread=False)
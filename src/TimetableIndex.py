@@ -0,0 +1,333 @@
+"""
+Timetable Index - typed-array indexes over the imported timetable
+
+Built once at import time and stored in the timetable store, so loading is a
+handful of byte copies instead of a Python object per stop:
+
+* the stops of train ``t`` are positions ``stop_offsets[t]`` to
+  ``stop_offsets[t + 1]`` of the ``stop_*`` arrays (station, arrival,
+  departure, distance), in route order;
+* the calls at station ``s`` are positions ``call_offsets[s]`` to
+  ``call_offsets[s + 1]`` of the ``call_*`` arrays (minute, train, stop
+  position), sorted by service minute, so a time window is two bisects.
+  Passing points where a train does not dwell are not calls.
+* ``running_days`` is one bitset of trains per day of the timetable year
+  (``calendar_span`` holds the first day's ordinal and the number of days),
+  bit ``t`` of day ``d`` set when train ``t`` starts a run on ``d``.  A day's
+  trains are one contiguous slice, so "does train t run on date D" is one
+  bit test and "which trains run on D" is a single integer.
+
+Stations, trains, categories and operators are dense integer ids into small
+string tables.  Operators are stored by the display name the scraped boards
+use (``OPERATOR_NAMES``), not the dataset's numeric code.  Times are seconds after midnight of the train's service day
+(``NO_TIME`` for the origin's arrival and the destination's departure);
+call minutes are whole minutes of the departure, or of the arrival at the
+destination.  The arrays hold machine integers, not Python objects; workers
+normally map them from the binary snapshot (see ``TimetableSnapshot``), and
+any sequence type with the same typecode works in their place.
+"""
+
+import hashlib
+import json
+import sqlite3
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+NO_TIME = -1
+
+# Array name -> typecode
+ARRAYS = {
+    'station_codes': 'i',
+    'train_ids': 'I',
+    'train_categories': 'H',
+    'train_operators': 'H',
+    'stop_offsets': 'I',
+    'stop_stations': 'I',
+    'stop_arrivals': 'i',
+    'stop_departures': 'i',
+    'stop_distances': 'i',
+    'call_offsets': 'I',
+    'call_minutes': 'i',
+    'call_trains': 'I',
+    'call_stops': 'H',
+    'calendar_span': 'i',
+    'running_days': 'B',
+}
+
+STRINGS = ('station_names', 'train_numbers', 'categories', 'operators')
+
+# Operator code in the dataset -> name as shown on Infofer's boards
+OPERATOR_NAMES = {
+    '1335': 'CFR Călători',
+    '1183': 'Regio Călători',
+    '1266': 'Transferoviar',
+    '1512': 'Softrans',
+    '1617': 'Astra Trans Carpatic',
+}
+
+
+def operator_name(code):
+    """Display name of a dataset operator code; unknown codes are kept as they are."""
+    return OPERATOR_NAMES.get(str(code), code) if code else code
+
+
+class TimetableIndex:
+    """Typed arrays and string tables; see the module docstring for the layout."""
+
+    def __init__(self, tables):
+        for name in ARRAYS:
+            setattr(self, name, tables[name])
+        for name in STRINGS:
+            setattr(self, name, tables[name])
+        # Dataset version, when known (see content_version)
+        self.version = None
+        # What the incremental update that produced this index changed, if
+        # one did (see TimetableDiff)
+        self.changes = None
+
+    @property
+    def station_count(self):
+        return len(self.station_codes)
+
+    @property
+    def train_count(self):
+        return len(self.train_numbers)
+
+    def stops(self, train):
+        """Positions of a train's stops in the ``stop_*`` arrays, in route order."""
+        return range(self.stop_offsets[train], self.stop_offsets[train + 1])
+
+    def calls(self, station, start_minute=None, end_minute=None):
+        """Positions in the ``call_*`` arrays of calls at ``station`` in ``[start_minute, end_minute)``."""
+        lo, hi = self.call_offsets[station], self.call_offsets[station + 1]
+        if start_minute is not None:
+            lo = bisect_left(self.call_minutes, start_minute, lo, hi)
+        if end_minute is not None:
+            hi = bisect_left(self.call_minutes, end_minute, lo, hi)
+        return range(lo, hi)
+
+    def is_call(self, stop, first, last):
+        """Whether the stop at position ``stop`` of a train spanning ``first..last`` is a call."""
+        return stop in (first, last) or self.stop_arrivals[stop] != self.stop_departures[stop]
+
+    @property
+    def train_bytes(self):
+        """Length of one day's bitset in ``running_days``."""
+        return (self.train_count + 7) // 8
+
+    def day_bits(self, day):
+        """The bitset of trains starting a run on the ``date`` ``day``, or None outside the timetable year."""
+        first_day, day_count = self.calendar_span
+        offset = day.toordinal() - first_day
+        if not 0 <= offset < day_count:
+            return None
+        size = self.train_bytes
+        return memoryview(self.running_days)[offset * size:(offset + 1) * size]
+
+    def runs_on(self, train, day):
+        """Whether ``train`` starts a run on the ``date`` ``day``."""
+        offset = day.toordinal() - self.calendar_span[0]
+        if not 0 <= offset < self.calendar_span[1]:
+            return False
+        return bool(self.running_days[offset * self.train_bytes + (train >> 3)] >> (train & 7) & 1)
+
+    def trains_on(self, day):
+        """Trains starting a run on ``day`` as an integer mask, bit ``t`` for train ``t``."""
+        bits = self.day_bits(day)
+        return int.from_bytes(bits, 'little') if bits is not None else 0
+
+    def station_trains(self, station):
+        """Trains calling at ``station`` as an integer mask."""
+        mask = bytearray(self.train_bytes)
+        for call in self.calls(station):
+            train = self.call_trains[call]
+            mask[train >> 3] |= 1 << (train & 7)
+        return int.from_bytes(mask, 'little')
+
+    def running_calls(self, station, day, start_minute=None, end_minute=None):
+        """Like :meth:`calls`, keeping only calls of trains that start a run on ``day``."""
+        bits = self.day_bits(day)
+        if bits is None:
+            return []
+        trains = self.call_trains
+        return [call for call in self.calls(station, start_minute, end_minute)
+                if bits[trains[call] >> 3] >> (trains[call] & 7) & 1]
+
+
+def mask_members(mask):
+    """Set bit positions of an integer mask, in increasing order."""
+    members = []
+    position = 0
+    for byte in mask.to_bytes((mask.bit_length() + 7) // 8, 'little'):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    members.append(position + bit)
+        position += 8
+    return members
+
+
+def _interner(strings):
+    ids = {}
+
+    def intern(value):
+        value = value or ''
+        if value not in ids:
+            ids[value] = len(strings)
+            strings.append(value)
+        return ids[value]
+    return intern
+
+
+def build(conn):
+    """Build the index from the store's tables."""
+    tables = {name: array(code) for name, code in ARRAYS.items()}
+    tables.update({name: [] for name in STRINGS})
+
+    station_ids = {}
+    for code, name in conn.execute('SELECT code, name FROM stations ORDER BY code'):
+        station_ids[code] = len(tables['station_codes'])
+        tables['station_codes'].append(code)
+        tables['station_names'].append(name)
+
+    category_id = _interner(tables['categories'])
+    operator_id = _interner(tables['operators'])
+    train_ids = {}
+    for train, number, category, operator in conn.execute(
+            'SELECT id, number, category, operator FROM trains ORDER BY id'):
+        train_ids[train] = len(tables['train_numbers'])
+        tables['train_ids'].append(train)
+        tables['train_numbers'].append(str(number))
+        tables['train_categories'].append(category_id(category or 'R'))
+        tables['train_operators'].append(operator_id(operator_name(operator)))
+
+    offsets = [0] * (len(train_ids) + 1)
+    for train, station, arrival, departure, distance in conn.execute(
+            'SELECT train, station, arrival, departure, distance FROM stops ORDER BY train, seq'):
+        if station not in station_ids:
+            station_ids[station] = len(tables['station_codes'])
+            tables['station_codes'].append(station)
+            tables['station_names'].append(str(station))
+        offsets[train_ids[train] + 1] += 1
+        tables['stop_stations'].append(station_ids[station])
+        tables['stop_arrivals'].append(NO_TIME if arrival is None else arrival)
+        tables['stop_departures'].append(NO_TIME if departure is None else departure)
+        tables['stop_distances'].append(distance or 0)
+    for train in range(len(train_ids)):
+        offsets[train + 1] += offsets[train]
+    tables['stop_offsets'].extend(offsets)
+
+    index = TimetableIndex(tables)
+    calls = [[] for _ in range(index.station_count)]
+    for train in range(index.train_count):
+        stops = index.stops(train)
+        for stop in stops:
+            if index.is_call(stop, stops.start, stops.stop - 1):
+                departure = index.stop_departures[stop]
+                seconds = departure if departure != NO_TIME else index.stop_arrivals[stop]
+                calls[index.stop_stations[stop]].append((seconds // 60, train, stop - stops.start))
+    index.call_offsets.append(0)
+    for station_calls in calls:
+        station_calls.sort()
+        for minute, train, stop in station_calls:
+            index.call_minutes.append(minute)
+            index.call_trains.append(train)
+            index.call_stops.append(stop)
+        index.call_offsets.append(len(index.call_minutes))
+
+    _build_running_days(conn, index, train_ids)
+    index.version = content_version(index)
+    return index
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_running_days(conn, index, train_ids):
+    """Fill ``calendar_span`` and ``running_days`` from the ``calendars`` table.
+
+    A train runs on a day inside one of its periods when the period has no
+    ``Zile`` flags, or the flag for that day (counted from the period start)
+    is 1.  Each train's days become one integer over the year; trains with
+    the same days are then added to each day's bitset together, since most
+    share a handful of patterns.
+    """
+    periods = []
+    for train_id, start, end, days in conn.execute('SELECT train, start_date, end_date, days FROM calendars'):
+        start, end = _parse_date(start), _parse_date(end)
+        if train_id in train_ids and start and end and start <= end:
+            periods.append((train_ids[train_id], start.toordinal(), end.toordinal(), days))
+    if not periods:
+        index.calendar_span.extend((0, 0))
+        return
+    first_day = min(p[1] for p in periods)
+    day_count = max(p[2] for p in periods) - first_day + 1
+
+    train_days = {}
+    for train, start, end, days in periods:
+        length = end - start + 1
+        if days and not set(days) - {'0', '1'}:
+            # Flag i is day start + i; days past the flags do not run
+            pattern = int(days[:length][::-1], 2)
+        else:
+            pattern = (1 << length) - 1
+        train_days[train] = train_days.get(train, 0) | pattern << (start - first_day)
+
+    patterns = {}
+    for train, pattern in train_days.items():
+        patterns[pattern] = patterns.get(pattern, 0) | 1 << train
+    day_masks = [0] * day_count
+    for pattern, trains in patterns.items():
+        for day in mask_members(pattern):
+            day_masks[day] |= trains
+
+    size = index.train_bytes
+    index.calendar_span.extend((first_day, day_count))
+    for mask in day_masks:
+        index.running_days.frombytes(mask.to_bytes(size, 'little'))
+
+
+def content_version(index):
+    """Short hash of the index contents; equal indexes have equal versions."""
+    digest = hashlib.sha256()
+    for name in ARRAYS:
+        digest.update(getattr(index, name).tobytes())
+    for name in STRINGS:
+        digest.update(json.dumps(list(getattr(index, name)), ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def save(conn, index):
+    """Store the index in the ``arrays`` table of an open store."""
+    conn.execute('CREATE TABLE IF NOT EXISTS arrays (name TEXT PRIMARY KEY, typecode TEXT, data BLOB)')
+    rows = [(name, code, getattr(index, name).tobytes()) for name, code in ARRAYS.items()]
+    rows += [(name, 'json', json.dumps(list(getattr(index, name)), ensure_ascii=False).encode('utf-8'))
+             for name in STRINGS]
+    conn.executemany('INSERT OR REPLACE INTO arrays VALUES (?, ?, ?)', rows)
+
+
+def load(conn):
+    """The index stored with the store, or None when the store predates it."""
+    try:
+        rows = conn.execute('SELECT name, typecode, data FROM arrays').fetchall()
+    except sqlite3.OperationalError:
+        return None
+    tables = {}
+    for name, code, data in rows:
+        if code == 'json':
+            tables[name] = json.loads(data)
+        else:
+            tables[name] = array(code)
+            tables[name].frombytes(data)
+    if any(name not in tables for name in list(ARRAYS) + list(STRINGS)):
+        return None
+    index = TimetableIndex(tables)
+    index.version = content_version(index)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'last_changes'").fetchone()
+    index.changes = json.loads(row[0]) if row else None
+    return index
@@ -0,0 +1,175 @@
+"""
+Timetable Snapshot - memory-mapped binary form of the timetable index
+
+Loading the index from the SQLite store still copies every array into each
+worker.  The importer also writes the index as a binary snapshot next to the
+store (``timetable.snapshot`` for ``timetable.db``), which workers map
+read-only: the arrays are typed views straight onto the mapping and strings
+are decoded from a string table on access, so opening a snapshot parses
+nothing but a small JSON header, and all workers on a host share the same
+page-cache pages instead of holding private copies.
+
+Layout::
+
+    magic  b"CFRTTSNP"
+    uint32 format version, uint32 header length      (little-endian)
+    header JSON: dataset version, last incremental changes, byte order,
+           and per array or string table its typecode / offsets
+           into the file
+    data   each array 8-byte aligned; a string table is an ``I`` array
+           of count + 1 offsets into one UTF-8 blob
+
+Arrays are in the writer's native byte order; a snapshot from another byte
+order or format version is ignored and the store is read instead.
+
+A new snapshot is written to a temporary file and renamed over the old one.
+Workers check the file on each lookup (see ``PlannedTimetable.current``) and
+map the new one; the old mapping stays valid for requests still using it.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from src import TimetableIndex
+
+MAGIC = b"CFRTTSNP"
+FORMAT_VERSION = 1
+
+_PREAMBLE = struct.Struct('<II')
+_ALIGN = 8
+
+
+def snapshot_path(db_path):
+    """Snapshot file that belongs to a store."""
+    return os.path.splitext(db_path)[0] + '.snapshot'
+
+
+class StringTable:
+    """Read-only sequence of strings decoded on access from a snapshot's string table."""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return str(self._blob[self._offsets[position]:self._offsets[position + 1]], 'utf-8')
+
+    def __iter__(self):
+        return (self[position] for position in range(len(self)))
+
+
+def _itemsize(code):
+    return array(code).itemsize
+
+
+def _padding(size):
+    return -size % _ALIGN
+
+
+def write(index, path):
+    """Write ``index`` as a snapshot at ``path``, atomically replacing any older one.
+
+    Returns the dataset version stored in it.
+    """
+    version = index.version or TimetableIndex.content_version(index)
+    sections = []
+    for name, code in TimetableIndex.ARRAYS.items():
+        sections.append((name, code, getattr(index, name).tobytes()))
+    for name in TimetableIndex.STRINGS:
+        encoded = [value.encode('utf-8') for value in getattr(index, name)]
+        offsets = [0]
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value))
+        sections.append((name, 'offsets', struct.pack(f'={len(offsets)}I', *offsets)))
+        sections.append((name, 'blob', b''.join(encoded)))
+
+    # Offsets depend on the header length, which depends on the offsets;
+    # repeat the layout until the header length settles
+    def header_for(start):
+        header = {"dataset": version, "changes": index.changes, "byteorder": sys.byteorder,
+                  "arrays": {}, "strings": {}}
+        position = start
+        for name, kind, data in sections:
+            if kind == 'blob':
+                header["strings"][name].append([position, len(data)])
+            elif kind == 'offsets':
+                header["strings"][name] = [[position, len(data) // 4]]
+            else:
+                header["arrays"][name] = [kind, position, len(data) // _itemsize(kind)]
+            position += len(data) + _padding(len(data))
+        return json.dumps(header, sort_keys=True).encode('utf-8')
+
+    start = 0
+    while True:
+        header = header_for(start)
+        data_start = len(MAGIC) + _PREAMBLE.size + len(header)
+        data_start += _padding(data_start)
+        if data_start == start:
+            break
+        start = data_start
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out:
+            out.write(MAGIC)
+            out.write(_PREAMBLE.pack(FORMAT_VERSION, len(header)))
+            out.write(header)
+            out.write(b'\0' * (start - out.tell()))
+            for _, _, data in sections:
+                out.write(data)
+                out.write(b'\0' * _padding(len(data)))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return version
+
+
+def load(path):
+    """Map the snapshot at ``path`` as a :class:`TimetableIndex`, or None when it is missing or unusable."""
+    try:
+        with open(path, 'rb') as source:
+            mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    view = memoryview(mapping)
+    preamble_end = len(MAGIC) + _PREAMBLE.size
+    if len(view) < preamble_end or view[:len(MAGIC)] != MAGIC:
+        print(f"Ignoring {path}: not a timetable snapshot")
+        return None
+    format_version, header_length = _PREAMBLE.unpack(view[len(MAGIC):preamble_end])
+    header = json.loads(str(view[preamble_end:preamble_end + header_length], 'utf-8'))
+    if format_version != FORMAT_VERSION or header.get("byteorder") != sys.byteorder:
+        print(f"Ignoring {path}: snapshot format {format_version}/{header.get('byteorder')} "
+              f"is not {FORMAT_VERSION}/{sys.byteorder}")
+        return None
+
+    tables = {}
+    for name, code in TimetableIndex.ARRAYS.items():
+        stored_code, position, length = header["arrays"][name]
+        if stored_code != code:
+            return None
+        size = length * _itemsize(code)
+        tables[name] = view[position:position + size].cast(code)
+    for name in TimetableIndex.STRINGS:
+        (offsets_at, count), (blob_at, blob_length) = header["strings"][name]
+        offsets = view[offsets_at:offsets_at + count * 4].cast('I')
+        tables[name] = StringTable(offsets, view[blob_at:blob_at + blob_length])
+
+    index = TimetableIndex.TimetableIndex(tables)
+    index.version = header["dataset"]
+    index.changes = header.get("changes")
+    return index
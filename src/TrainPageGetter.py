@@ -1,9 +1,9 @@
-from src import config
+from src import DelayProjection, PlannedTimetable, StationRegistry
 import requests
 from datetime import datetime, timedelta
 import re
 from bs4 import BeautifulSoup
-from cachetools import cached, TTLCache
+from src.PersistentCache import date_tiered, normalize_date
 
 # Updated to use the working mersultrenurilor site
 base_url = "https://mersultrenurilor.infofer.ro/ro-RO/Tren/{}"
@@ -12,9 +12,8 @@ cfr_base_url = "https://bilete.cfrcalatori.ro/ro-RO/Tren/{}"
 
 
 def get_station_id_by_name(name):
-    if name in config.global_station_list:
-        return config.global_station_list[name]
-    return None
+    station = StationRegistry.current().find_by_name(name)
+    return station["station_id"] if station else None
 
 
 def clean_train_number(train_id):
@@ -25,23 +24,60 @@ def clean_train_number(train_id):
     return train_id.strip().replace(' ', '')
 
 
-def get_train(train_id):
+def get_train(train_id, date_str=None):
     """
     Get real train information.  By default we attempt to fetch from the
     CFR Călători ticketing site first, falling back to the legacy
     mersultrenurilor.infofer.ro (Infofer) if anything goes wrong.  The
     newer source provides train composition and service icons which the
     old site does not expose.
+
+    ``date_str`` selects the service date (defaults to today); results for
+    other days are cached much longer, see ``PersistentCache``.  Delays the
+    page does not show are projected from the last shown one, see
+    :func:`project_delays`.
     """
     try:
-        return get_cfr_train_data(train_id)
+        train_data = get_cfr_train_data(train_id, date_str)
     except Exception as e:
         # forward compatibility: if CFR site is down or the format changes
         print(f"CFR Calatori fetch failed ({e}), falling back to Infofer")
-        return get_real_train_data(train_id)
+        train_data = get_real_train_data(train_id, date_str)
+    return project_delays(train_id, train_data, date_str)
+
+def peek_train(train_id, date_str=None):
+    """Cached train data from either source, or None; never scrapes."""
+    cache_key = (str(train_id), normalize_date(date_str))
+    train_data = get_cfr_train_data.cache.get(cache_key) or get_real_train_data.cache.get(cache_key)
+    return project_delays(train_id, train_data, date_str) if train_data else None
 
-@cached(cache=TTLCache(maxsize=200, ttl=30))
-def get_real_train_data(train_id):
+def project_delays(train_id, train_data, date_str=None):
+    """Train data with carried-forward delays replaced by projections from the planned timetable.
+
+    The cached page is not modified.  Unchanged when there is no timetable,
+    it does not know the train on that date, or the data has no stops.
+    """
+    planned = PlannedTimetable.current()
+    if planned is None or not train_data or 'stations_data' not in train_data:
+        return train_data
+    train = planned.running_train(train_id, normalize_date(date_str))
+    if train is None:
+        return train_data
+    branches = [{**branch, 'stations_data': DelayProjection.project_stops(planned, train, branch['stations_data'])}
+                for branch in train_data.get('branches', [])]
+    stations_data = DelayProjection.project_stops(planned, train, train_data['stations_data'])
+    return {**train_data, 'stations_data': stations_data, **({'branches': branches} if branches else {})}
+
+def invalidate_trains(train_numbers=None, persist=True):
+    """Drop cached pages of these train numbers (None: all) for today and later; returns how many were dropped."""
+    numbers = None if train_numbers is None else {str(number) for number in train_numbers}
+
+    def match(train_id, _):
+        return numbers is None or clean_train_number(train_id) in numbers
+    return sum(fetch.cache.invalidate(match, persist) for fetch in (get_cfr_train_data, get_real_train_data))
+
+@date_tiered('train_infofer', live_ttl=30, maxsize=200)
+def get_real_train_data(train_id, date_str=None):
     """
     Get real train data from mersultrenurilor.infofer.ro with live delays
     Uses AJAX to get actual train data with delay information
@@ -75,7 +111,9 @@ def get_real_train_data(train_id):
         form_data['IsReCaptchaFailed'] = 'False'
         
         # Ensure date is set (Infofer requires this)
-        if not form_data.get('Date'):
+        if date_str:
+            form_data['Date'] = date_str
+        elif not form_data.get('Date'):
             form_data['Date'] = datetime.now().strftime("%d.%m.%Y")
         
         # Step 2: POST to get actual train data via AJAX
@@ -139,12 +177,16 @@ def get_real_train_data(train_id):
                             parsed_delay = int(delay_match.group(1).replace('+', ''))
 
                 # Intelligent delay propagation
+                # Delays not shown on the page are carried forward here and
+                # replaced by projections in get_train (see DelayProjection)
+                delay_observed = parsed_delay is not None
                 if parsed_delay is not None:
                     if parsed_delay > 0:
                         last_known_delay = parsed_delay
                     else:
                         if last_known_delay > 15:
                             parsed_delay = last_known_delay
+                            delay_observed = False
                         else:
                             last_known_delay = 0
                 else:
@@ -183,6 +225,7 @@ def get_real_train_data(train_id):
                     'arrival_time': arrival_time,
                     'departure_time': departure_time,
                     'delay': delay_minutes,
+                    'delay_observed': delay_observed,
                     'platform': platform,
                     'dwell_minutes': dwell_minutes,
                     'is_stop': is_stop
@@ -306,8 +349,8 @@ def get_real_train_data(train_id):
         raise
 
 
-@cached(cache=TTLCache(maxsize=200, ttl=30))
-def get_cfr_train_data(train_id):
+@date_tiered('train_cfr', live_ttl=30, maxsize=200)
+def get_cfr_train_data(train_id, date_str=None):
     """Fetch train details from the CFR Călători ticketing site.
 
     This implementation mirrors :func:`get_real_train_data` but adapts to
@@ -337,7 +380,9 @@ def get_cfr_train_data(train_id):
         # always include these flags to avoid JS redirect behavior
         form_data.setdefault('IsSearchWanted', 'True')
         form_data.setdefault('IsReCaptchaFailed', 'False')
-        if not form_data.get('Date'):
+        if date_str:
+            form_data['Date'] = date_str
+        elif not form_data.get('Date'):
             form_data['Date'] = datetime.now().strftime("%d.%m.%Y")
 
         result_url = "https://bilete.cfrcalatori.ro/ro-RO/Trains/TrainsResult"
@@ -384,12 +429,16 @@ def get_cfr_train_data(train_id):
                     delay_match = re.search(r'(?:întârzier\w*|intarzier\w*|estimat\w*)\s*(?:estimată)?\s*:?\s*([+\-]?\d+)\s*min', full_text)
                     if delay_match:
                         parsed_delay = int(delay_match.group(1).replace('+', ''))
+            # Delays not shown on the page are carried forward here and
+            # replaced by projections in get_train (see DelayProjection)
+            delay_observed = parsed_delay is not None
             if parsed_delay is not None:
                 if parsed_delay > 0:
                     last_known_delay = parsed_delay
                 else:
                     if last_known_delay > 15:
                         parsed_delay = last_known_delay
+                        delay_observed = False
                     else:
                         last_known_delay = 0
             else:
@@ -423,6 +472,7 @@ def get_cfr_train_data(train_id):
                 'arrival_time': arrival_time,
                 'departure_time': departure_time,
                 'delay': delay_minutes,
+                'delay_observed': delay_observed,
                 'platform': platform,
                 'dwell_minutes': dwell_minutes,
                 'is_stop': is_stop
@@ -0,0 +1,127 @@
+"""
+Train Snapshots - versioned train payloads for delta polling
+
+Each time a train payload is served it is recorded here.  When its content
+differs from the previous snapshot it receives a new, monotonically increasing
+version.  A client that already holds version N can then ask for only the stop
+fields that changed since N instead of the whole payload.
+"""
+
+import copy
+import itertools
+import threading
+import time
+from collections import deque
+from cachetools import LRUCache
+
+# Snapshots kept per train; older cursors get a full resync
+HISTORY_SIZE = 20
+
+# Seeded from the clock so versions keep increasing across restarts
+_versions = itertools.count(int(time.time() * 1000))
+_history = LRUCache(maxsize=500)
+_lock = threading.Lock()
+
+# Keys that vary per request and must not bump the version
+VOLATILE_KEYS = ('train_number', 'data_source', 'version', 'status', 'since')
+
+
+def _content(payload):
+    # A deep copy: cached payloads can be changed in place later, which must
+    # not rewrite the history deltas are computed against
+    return copy.deepcopy({k: v for k, v in payload.items() if k not in VOLATILE_KEYS})
+
+
+def record(train_key, payload):
+    """Store ``payload`` for ``train_key`` and return its version number."""
+    content = _content(payload)
+    with _lock:
+        snapshots = _history.get(train_key)
+        if snapshots is None:
+            snapshots = deque(maxlen=HISTORY_SIZE)
+            _history[train_key] = snapshots
+        if snapshots and snapshots[-1][1] == content:
+            return snapshots[-1][0]
+        version = next(_versions)
+        snapshots.append((version, content))
+        return version
+
+
+def _find(train_key, version):
+    with _lock:
+        snapshots = _history.get(train_key)
+        if not snapshots:
+            return None
+        for snap_version, content in snapshots:
+            if snap_version == version:
+                return content
+    return None
+
+
+def _same_route(old_stops, new_stops):
+    """True when both stop lists describe the same stations in the same order."""
+    if len(old_stops) != len(new_stops):
+        return False
+    return all(a.get('station_name') == b.get('station_name') for a, b in zip(old_stops, new_stops))
+
+
+def diff_stops(old_stops, new_stops):
+    """Per-stop field changes between two stop lists with the same route."""
+    changes = []
+    for index, (old, new) in enumerate(zip(old_stops, new_stops)):
+        fields = {k: v for k, v in new.items() if old.get(k) != v}
+        fields.update({k: None for k in old if k not in new})
+        if fields:
+            changes.append({'index': index, **fields})
+    return changes
+
+
+def build_delta(train_key, since, payload, version):
+    """Answer a ``?since=<version>`` poll for the current ``payload``.
+
+    Returns a small ``unchanged`` or ``delta`` document when possible and
+    falls back to the full payload marked ``resync`` when the cursor is
+    unknown (too old, from another worker or before a restart) or the route
+    itself changed.
+    """
+    if since == version:
+        return {'train_number': payload.get('train_number'), 'version': version,
+                'since': since, 'status': 'unchanged'}
+
+    old = _find(train_key, since)
+    new = _content(payload)
+    if old is not None and _same_route(old.get('stops', []), new.get('stops', [])):
+        old_branches = old.get('branches', [])
+        new_branches = new.get('branches', [])
+        branch_changes = []
+        if len(old_branches) == len(new_branches) and all(
+                _same_route(a['stations_data'], b['stations_data'])
+                for a, b in zip(old_branches, new_branches)):
+            for b_index, (a, b) in enumerate(zip(old_branches, new_branches)):
+                for change in diff_stops(a['stations_data'], b['stations_data']):
+                    branch_changes.append({'branch': b_index, **change})
+            # Labels or other branch metadata changed: ship branches whole
+            if any({k: v for k, v in a.items() if k != 'stations_data'} !=
+                   {k: v for k, v in b.items() if k != 'stations_data'}
+                   for a, b in zip(old_branches, new_branches)):
+                branch_changes = None
+        else:
+            branch_changes = None
+
+        if branch_changes is not None:
+            # 'stations' and 'branches' mirror 'stops'; clients apply the same changes
+            skip = {'stops', 'stations', 'branches'}
+            replaced = {k: v for k, v in new.items() if k not in skip and old.get(k) != v}
+            delta = {
+                'train_number': payload.get('train_number'),
+                'version': version,
+                'since': since,
+                'status': 'delta',
+                'stops': diff_stops(old['stops'], new['stops']),
+                'branches': branch_changes,
+            }
+            if replaced:
+                delta['replace'] = replaced
+            return delta
+
+    return {**payload, 'version': version, 'since': since, 'status': 'resync'}